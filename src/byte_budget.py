@@ -0,0 +1,82 @@
+"""
+Async byte budget for in-flight transfers.
+
+Concurrency limits count transfers, not bytes: eight 20 MB images cost as
+much as thousands of thumbnails. A ByteBudget admits a transfer only once
+its expected size fits in what is left of a fixed total, so the bytes held
+between download and upload stay bounded while small transfers keep
+flowing.
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+
+class ByteBudget:
+    """
+    A total of `total` bytes shared by concurrent transfers.
+
+    A reservation larger than the whole budget is capped at `total`, so it
+    still runs (alone) instead of waiting forever. Waiters are admitted as
+    soon as their reservation fits, not in arrival order, so a large
+    transfer waiting for room doesn't hold up small ones behind it.
+
+    Args:
+        total: Bytes that may be reserved at once
+    """
+
+    def __init__(self, total: int):
+        if total <= 0:
+            raise ValueError(f"total must be positive, got {total}")
+        self.total = total
+        self.in_use = 0
+        # Most bytes reserved at once, for diagnostics
+        self.peak = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self, nbytes: int) -> int:
+        """
+        Wait until `nbytes` fit in the budget and reserve them.
+
+        Returns:
+            Bytes actually reserved (capped at `total`); pass this to release()
+        """
+        nbytes = min(max(nbytes, 0), self.total)
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.in_use + nbytes <= self.total)
+            self.in_use += nbytes
+            self.peak = max(self.peak, self.in_use)
+        return nbytes
+
+    def try_acquire(self, nbytes: int) -> int | None:
+        """
+        Reserve `nbytes` only if they fit right now.
+
+        Returns:
+            Bytes reserved (capped at `total`), or None if they don't fit
+        """
+        nbytes = min(max(nbytes, 0), self.total)
+        if self.in_use + nbytes > self.total:
+            return None
+        self.in_use += nbytes
+        self.peak = max(self.peak, self.in_use)
+        return nbytes
+
+    async def release(self, nbytes: int):
+        """
+        Return a reservation made by acquire().
+        """
+        async with self._condition:
+            self.in_use -= nbytes
+            self._condition.notify_all()
+
+    @asynccontextmanager
+    async def reserve(self, nbytes: int) -> AsyncIterator[int]:
+        """
+        Hold a reservation of `nbytes` for the duration of the block.
+        """
+        reserved = await self.acquire(nbytes)
+        try:
+            yield reserved
+        finally:
+            await self.release(reserved)
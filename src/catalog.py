@@ -0,0 +1,207 @@
+"""
+Feed source catalog.
+
+Sources are declared in a TOML (or JSON) file instead of code: each one names
+its feed URL, parser kind, XML namespaces, element paths, image-extraction
+rules, refresh interval and priority. Anything a source leaves out comes from
+the defaults of its kind, so a typical entry is just a URL.
+
+A source can also expand into several feeds through `variants`, e.g. one
+entry with `url = ".../nyt/{variant}.xml"` and a list of NYT sections.
+"""
+import json
+import os
+import tomllib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SOURCE_CATALOG_PATH = os.getenv('SOURCE_CATALOG_PATH', str(Path(__file__).with_name('sources.toml')))
+
+DEFAULT_REFRESH_INTERVAL = 300.0
+
+# Namespaces used by the supported feed formats
+ATOM_NS = {'atom': 'http://www.w3.org/2005/Atom',
+           'media': 'http://search.yahoo.com/mrss/'}
+
+RSS_NS = {'media': 'http://search.yahoo.com/mrss/',
+          'content': 'http://purl.org/rss/1.0/modules/content/',
+          'dc': 'http://purl.org/dc/elements/1.1/'}
+
+
+@dataclass(slots=True)
+class ImageRule:
+    """
+    Where to look for an item's image: the `attr` attribute of the first
+    `tag` child, optionally only if its `type` starts with `type_prefix`.
+    """
+    tag: str
+    attr: str = 'url'
+    type_prefix: str | None = None
+
+
+# Per-kind defaults. `item` is the path of item elements below the root,
+# the other paths are relative to an item; `link_attr` reads the link from
+# an attribute (Atom) instead of the element text (RSS).
+KIND_DEFAULTS = {
+    'rss': {
+        'namespaces': RSS_NS,
+        'item': './/item',
+        'title': 'title',
+        'link': 'link',
+        'link_attr': None,
+        'published': 'pubDate',
+        'image_rules': [
+            ImageRule('media:thumbnail'),
+            ImageRule('media:content'),
+            ImageRule('enclosure', type_prefix='image/'),
+        ],
+    },
+    'atom': {
+        'namespaces': ATOM_NS,
+        'item': 'atom:entry',
+        'title': 'atom:title',
+        'link': 'atom:link',
+        'link_attr': 'href',
+        'published': 'atom:published',
+        'image_rules': [
+            ImageRule('media:thumbnail'),
+            ImageRule('media:content'),
+        ],
+    },
+}
+
+
+@dataclass(slots=True)
+class SourceSpec:
+    """
+    Declaration of one feed source.
+    """
+    name: str
+    url: str
+    kind: str = 'rss'
+    namespaces: dict[str, str] = field(default_factory=dict)
+    item: str = ''
+    title: str = ''
+    link: str = ''
+    link_attr: str | None = None
+    published: str = ''
+    image_rules: list[ImageRule] = field(default_factory=list)
+    refresh_interval: float = DEFAULT_REFRESH_INTERVAL
+    priority: int = 0
+    enabled: bool = True
+
+    @classmethod
+    def from_config(cls, name: str, config: dict, defaults: dict | None = None) -> 'SourceSpec':
+        """
+        Build a spec from a catalog entry, filling gaps from the kind defaults.
+
+        Args:
+            name: Source name
+            config: The source's table from the catalog
+            defaults: Catalog-wide `[defaults]` table
+
+        Returns:
+            SourceSpec
+
+        Raises:
+            ValueError: If the kind is unknown or the url is missing
+        """
+        config = {**(defaults or {}), **config}
+        kind = config.get('kind', 'rss')
+        if kind not in KIND_DEFAULTS:
+            raise ValueError(f"Source {name!r}: unknown kind {kind!r} (expected one of {', '.join(KIND_DEFAULTS)})")
+        if not config.get('url'):
+            raise ValueError(f"Source {name!r}: missing url")
+        base = KIND_DEFAULTS[kind]
+
+        if 'image_rules' in config:
+            image_rules = [
+                ImageRule(rule) if isinstance(rule, str) else ImageRule(**rule)
+                for rule in config['image_rules']
+            ]
+        else:
+            image_rules = list(base['image_rules'])
+
+        paths = config.get('paths', {})
+        return cls(
+            name=name,
+            url=config['url'],
+            kind=kind,
+            namespaces={**base['namespaces'], **config.get('namespaces', {})},
+            item=paths.get('item', base['item']),
+            title=paths.get('title', base['title']),
+            link=paths.get('link', base['link']),
+            link_attr=paths.get('link_attr', base['link_attr']),
+            published=paths.get('published', base['published']),
+            image_rules=image_rules,
+            refresh_interval=float(config.get('refresh', DEFAULT_REFRESH_INTERVAL)),
+            priority=int(config.get('priority', 0)),
+            enabled=bool(config.get('enabled', True))
+        )
+
+
+def parse_catalog(data: dict) -> dict[str, SourceSpec]:
+    """
+    Build source specs from a parsed catalog document.
+
+    Args:
+        data: Document with a `sources` table and an optional `defaults` table
+
+    Returns:
+        {source name: SourceSpec}, in declaration order
+    """
+    defaults = data.get('defaults', {})
+    catalog = {}
+    for name, config in data.get('sources', {}).items():
+        variants = config.get('variants')
+        if not variants:
+            catalog[name] = SourceSpec.from_config(name, config, defaults)
+            continue
+
+        # One feed per variant, e.g. nytimes-asiapacific for {variant} = AsiaPacific
+        template = {key: value for key, value in config.items() if key != 'variants'}
+        for variant in variants:
+            variant_name = f"{name}-{variant.lower()}"
+            variant_config = {**template, 'url': template['url'].format(variant=variant)}
+            catalog[variant_name] = SourceSpec.from_config(variant_name, variant_config, defaults)
+    return catalog
+
+
+def load_catalog(path: str | Path = SOURCE_CATALOG_PATH) -> dict[str, SourceSpec]:
+    """
+    Load a source catalog from a TOML or JSON file.
+
+    Args:
+        path: Catalog file; `.json` files are read as JSON, anything else as TOML
+
+    Returns:
+        {source name: SourceSpec}, in declaration order
+    """
+    path = Path(path)
+    if path.suffix == '.json':
+        data = json.loads(path.read_text(encoding='utf-8'))
+    else:
+        with path.open('rb') as f:
+            data = tomllib.load(f)
+    return parse_catalog(data)
+
+
+# Catalog loaded from SOURCE_CATALOG_PATH, on first use
+_default_catalog: dict[str, SourceSpec] | None = None
+
+
+def get_catalog() -> dict[str, SourceSpec]:
+    global _default_catalog
+    if _default_catalog is None:
+        _default_catalog = load_catalog()
+    return _default_catalog
+
+
+def resolve_source(source: str) -> SourceSpec:
+    """
+    Spec for a source name, falling back to a plain RSS source if it isn't catalogued.
+    """
+    spec = get_catalog().get(source)
+    if spec is None:
+        spec = SourceSpec.from_config(source, {'url': 'about:blank'})
+    return spec
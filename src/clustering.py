@@ -0,0 +1,257 @@
+"""
+Incremental near-duplicate headline clustering.
+
+The same story often shows up in several feeds under slightly different
+titles. Each title is turned into character shingles, summarised with a
+MinHash signature, and matched against existing clusters through LSH
+buckets, so a new item is only compared with a handful of candidates instead
+of the whole history.
+
+Signatures use one-permutation hashing with rotation densification: every
+shingle is hashed once and lands in one of NUM_PERM bins, which keeps the
+cost linear in the title length instead of NUM_PERM passes per title.
+"""
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from models import TrendItem
+
+# MinHash / LSH parameters: BANDS * ROWS must equal NUM_PERM. With 16 bands of
+# 4 rows, pairs above ~0.5 Jaccard similarity collide with high probability.
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+SIMILARITY_THRESHOLD = 0.5
+SHINGLE_SIZE = 4
+
+_MASK64 = (1 << 64) - 1
+_GOLDEN64 = 0x9E3779B97F4A7C15
+# Offset added per bin step when densifying, larger than any real bin value
+_DENSIFY_STEP = 1 << 58
+
+_NON_WORD = re.compile(r'[^\w]+')
+
+
+def shingles(title: str, size: int = SHINGLE_SIZE) -> set[int]:
+    """
+    Hashed character shingles of a normalised title.
+
+    Args:
+        title: Headline text
+        size: Shingle length in characters
+
+    Returns:
+        Set of 32-bit shingle hashes
+    """
+    text = ' '.join(_NON_WORD.sub(' ', (title or '').lower()).split())
+    if len(text) <= size:
+        return {zlib.crc32(text.encode('utf-8'))} if text else set()
+    return {zlib.crc32(text[i:i + size].encode('utf-8')) for i in range(len(text) - size + 1)}
+
+
+@dataclass(slots=True)
+class Cluster:
+    """
+    A group of near-duplicate headlines.
+    """
+    cluster_id: int
+    representative: TrendItem
+    signature: tuple[int, ...]
+    size: int = 1
+    sources: set[str] = field(default_factory=set)
+    # Number of ingest batches (fetches) the story showed up in, once per batch
+    appearances: int = 0
+
+    @property
+    def source_count(self) -> int:
+        return len(self.sources)
+
+
+class HeadlineClusterer:
+    """
+    Incrementally groups near-duplicate headlines with MinHash + LSH.
+
+    Args:
+        num_perm: Number of MinHash permutations
+        bands: Number of LSH bands (num_perm must be divisible by bands)
+        threshold: Estimated Jaccard similarity needed to join a cluster
+        seed: Salt mixed into the shingle hashes
+    """
+
+    def __init__(
+        self,
+        num_perm: int = NUM_PERM,
+        bands: int = LSH_BANDS,
+        threshold: float = SIMILARITY_THRESHOLD,
+        seed: int = 1
+    ):
+        if num_perm % bands:
+            raise ValueError(f"num_perm ({num_perm}) must be divisible by bands ({bands})")
+        self.num_perm = num_perm
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+
+        self.salt = (seed * _GOLDEN64) & _MASK64
+
+        self.clusters: dict[int, Cluster] = {}
+        self._buckets: dict[tuple[int, tuple[int, ...]], list[int]] = {}
+        self._item_clusters: dict[tuple[str, str], int] = {}
+        self._next_id = 0
+
+    def __len__(self) -> int:
+        return len(self.clusters)
+
+    def signature(self, title: str) -> tuple[int, ...]:
+        """
+        MinHash signature of a title (one-permutation hashing).
+        """
+        num_perm = self.num_perm
+        salt = self.salt
+        bins: list[int | None] = [None] * num_perm
+
+        for h in shingles(title):
+            x = ((h ^ salt) * _GOLDEN64) & _MASK64
+            x ^= x >> 29
+            index, value = x % num_perm, x // num_perm
+            current = bins[index]
+            if current is None or value < current:
+                bins[index] = value
+
+        filled = [i for i, value in enumerate(bins) if value is not None]
+        if not filled:
+            return (0,) * num_perm
+        if len(filled) == num_perm:
+            return tuple(bins)
+
+        # Rotation densification: an empty bin borrows the next filled bin to
+        # its right, offset by the distance so borrowed values stay distinct
+        signature = list(bins)
+        for i in range(num_perm):
+            if bins[i] is not None:
+                continue
+            distance = 1
+            while bins[(i + distance) % num_perm] is None:
+                distance += 1
+            signature[i] = bins[(i + distance) % num_perm] + distance * _DENSIFY_STEP
+        return tuple(signature)
+
+    def _band_keys(self, signature: tuple[int, ...]):
+        rows = self.rows
+        for band in range(self.bands):
+            yield band, signature[band * rows:(band + 1) * rows]
+
+    @staticmethod
+    def similarity(sig_a: tuple[int, ...], sig_b: tuple[int, ...]) -> float:
+        """
+        Estimated Jaccard similarity of two signatures.
+        """
+        return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+    def cluster_of(self, item: TrendItem) -> Cluster | None:
+        """
+        Cluster an already ingested item belongs to.
+        """
+        cluster_id = self._item_clusters.get(item.key)
+        return self.clusters.get(cluster_id) if cluster_id is not None else None
+
+    def add(self, item: TrendItem) -> Cluster:
+        """
+        Cluster a single item, as a batch of its own.
+
+        Args:
+            item: Trend item to cluster
+
+        Returns:
+            The cluster the item belongs to
+        """
+        return self.add_many([item])[0]
+
+    def add_many(self, items: Iterable[TrendItem]) -> list[Cluster]:
+        """
+        Cluster one fetched batch of items.
+
+        Every cluster the batch touches gains one appearance, however many
+        of its items the batch holds, so a story counts once per fetch it
+        shows up in.
+
+        Args:
+            items: Items from one fetch
+
+        Returns:
+            The cluster of each item, in order
+        """
+        clusters = [self._assign(item) for item in items]
+        for cluster in {cluster.cluster_id: cluster for cluster in clusters}.values():
+            cluster.appearances += 1
+        return clusters
+
+    def _assign(self, item: TrendItem) -> Cluster:
+        """
+        Assign an item to its best matching cluster, or start a new one.
+
+        A known item (same TrendItem.key: source and url, or source and
+        title for link-less items) keeps its cluster and isn't counted as
+        a new member.
+        """
+        key = item.key
+        cluster_id = self._item_clusters.get(key)
+        if cluster_id is not None:
+            return self.clusters[cluster_id]
+
+        signature = self.signature(item.title)
+        band_keys = list(self._band_keys(signature))
+
+        # Candidates are clusters sharing at least one band bucket
+        best, best_score = None, self.threshold
+        checked = set()
+        for band_key in band_keys:
+            for candidate_id in self._buckets.get(band_key, ()):
+                if candidate_id in checked:
+                    continue
+                checked.add(candidate_id)
+                score = self.similarity(signature, self.clusters[candidate_id].signature)
+                if score >= best_score:
+                    best, best_score = self.clusters[candidate_id], score
+
+        if best is None:
+            best = Cluster(
+                cluster_id=self._next_id,
+                representative=item,
+                signature=signature,
+                sources={item.source}
+            )
+            self.clusters[best.cluster_id] = best
+            self._next_id += 1
+
+            # Only representatives are bucketed; members are scored against them
+            for band_key in band_keys:
+                self._buckets.setdefault(band_key, []).append(best.cluster_id)
+        else:
+            best.size += 1
+            best.sources.add(item.source)
+
+        self._item_clusters[key] = best.cluster_id
+        return best
+
+    def representatives(self, items: Iterable[TrendItem]) -> list[tuple[TrendItem, Cluster]]:
+        """
+        Collapse `items` to one entry per cluster, keeping their order.
+
+        Items not ingested yet are added first. The entry keeps the first
+        item of each cluster seen in `items`.
+
+        Returns:
+            List of (item, cluster) pairs
+        """
+        result = []
+        emitted = set()
+        for item in items:
+            cluster = self.cluster_of(item) or self.add(item)
+            if cluster.cluster_id in emitted:
+                continue
+            emitted.add(cluster.cluster_id)
+            result.append((item, cluster))
+        return result
@@ -0,0 +1,168 @@
+"""
+Conditional-GET cache for RSS/Atom feeds.
+
+Stores each feed's validators (ETag / Last-Modified) together with its parsed
+items, so a 304 response can be answered without re-parsing, and a fresh
+entry (younger than the source's TTL) can be answered without any request.
+
+Entries are rows of a SQLite table, one per feed URL, mirrored in memory for
+lookups. Updating a feed rewrites only its own row, on a background writer
+thread, so storing a refreshed feed never blocks the event loop. Entries not
+refreshed for FEED_CACHE_MAX_AGE seconds (e.g. sources since removed from
+the catalog) are pruned when the cache is opened.
+"""
+import json
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from models import TrendItem
+from sqlite_writer import SQLiteWriter
+
+load_dotenv()
+
+FEED_CACHE_PATH = os.getenv(
+    "FEED_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "feed_cache.db")
+)
+# Entries not refreshed for this long are dropped on load
+FEED_CACHE_MAX_AGE = float(os.getenv("FEED_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+class FeedCache:
+    """
+    URL-keyed feed cache, persisted in SQLite.
+
+    Each entry looks like:
+        {"etag": str | None, "last_modified": str | None, "fetched_at": float}
+
+    Items are stored as JSON only for persistence; `items()` hands out
+    TrendItem records, decoded once per entry.
+
+    Args:
+        path: SQLite database file (None or ':memory:' for a throwaway cache)
+        max_age: Seconds after which an entry that wasn't refreshed is pruned
+    """
+
+    def __init__(self, path: str | None = FEED_CACHE_PATH, max_age: float = FEED_CACHE_MAX_AGE):
+        path = path or ':memory:'
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_age = max_age
+        self.entries: dict[str, dict] = {}
+        self._items: dict[str, list[TrendItem]] = {}
+        # Item JSON loaded from disk, decoded on first use
+        self._raw_items: dict[str, str] = {}
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        # All writes go through one thread, in submission order
+        self._writer = SQLiteWriter(self.conn, 'feed-cache')
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS feed_entries ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " fetched_at REAL NOT NULL,"
+            " items TEXT NOT NULL)"
+        )
+        self.load()
+
+    def load(self):
+        """
+        Prune stale entries, then load the rest from disk.
+        """
+        self.flush()
+        with self.conn:
+            self.conn.execute("DELETE FROM feed_entries WHERE fetched_at < ?", (time.time() - self.max_age,))
+        self.entries = {}
+        self._items = {}
+        self._raw_items = {}
+        for url, etag, last_modified, fetched_at, items in self.conn.execute(
+            "SELECT url, etag, last_modified, fetched_at, items FROM feed_entries"
+        ):
+            self.entries[url] = {'etag': etag, 'last_modified': last_modified, 'fetched_at': fetched_at}
+            self._raw_items[url] = items
+
+    def _save_entry(self, url: str, entry: dict, items: list[TrendItem]):
+        # Runs on the writer thread
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO feed_entries (url, etag, last_modified, fetched_at, items)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (url, entry['etag'], entry['last_modified'], entry['fetched_at'],
+                 json.dumps([item.to_dict() for item in items], ensure_ascii=False))
+            )
+
+    def flush(self):
+        """
+        Wait until every write submitted so far has reached the database.
+        """
+        self._writer.flush()
+
+    def get(self, url: str) -> dict | None:
+        return self.entries.get(url)
+
+    def items(self, url: str) -> list[TrendItem]:
+        """
+        Cached items of `url` as TrendItem records (empty if not cached).
+        """
+        items = self._items.get(url)
+        if items is None:
+            raw = self._raw_items.pop(url, None)
+            items = [TrendItem.from_dict(d) for d in json.loads(raw)] if raw else []
+            self._items[url] = items
+        return items
+
+    def is_fresh(self, url: str, ttl: float | None) -> bool:
+        """
+        Check whether the cached entry is younger than `ttl` seconds.
+        """
+        entry = self.entries.get(url)
+        if entry is None or not ttl:
+            return False
+        return time.time() - entry['fetched_at'] < ttl
+
+    def conditional_headers(self, url: str) -> dict[str, str]:
+        """
+        Build If-None-Match / If-Modified-Since headers from stored validators.
+        """
+        entry = self.entries.get(url)
+        headers = {}
+        if entry is None:
+            return headers
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, url: str, items: list[TrendItem], etag: str | None, last_modified: str | None):
+        """
+        Store freshly parsed items together with the response validators.
+
+        Memory is updated at once; the row is written in the background.
+        """
+        entry = {'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time()}
+        self.entries[url] = entry
+        self._items[url] = items
+        self._raw_items.pop(url, None)
+        self._writer.submit(self._save_entry, url, dict(entry), list(items))
+
+    def touch(self, url: str) -> list[TrendItem]:
+        """
+        Mark a cached entry as revalidated (after a 304) and return its items.
+        """
+        entry = self.entries[url]
+        entry['fetched_at'] = time.time()
+        self._writer.execute("UPDATE feed_entries SET fetched_at = ? WHERE url = ?", (entry['fetched_at'], url))
+        return self.items(url)
+
+    def close(self):
+        """
+        Finish pending writes and close the database.
+        """
+        self._writer.close()
+        self.conn.close()
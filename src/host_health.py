@@ -0,0 +1,164 @@
+"""
+Per-host circuit breaker for outbound fetches.
+
+A host that keeps failing (down, timing out, rate-limiting) is skipped for a
+cool-down instead of costing a full timeout on every call. The cool-down
+doubles each time the circuit re-opens, is jittered so sources sharing a
+host don't retry in lockstep, and is never shorter than a `Retry-After` the
+server asked for. Once it expires, a single probe request is let through:
+success closes the circuit, failure re-opens it.
+"""
+import os
+import random
+import time
+from dataclasses import dataclass
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Consecutive failures before a host's circuit opens
+CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "3"))
+# First cool-down in seconds, doubled on every re-open up to the maximum
+CIRCUIT_BASE_COOLDOWN = float(os.getenv("CIRCUIT_BASE_COOLDOWN", "30"))
+CIRCUIT_MAX_COOLDOWN = float(os.getenv("CIRCUIT_MAX_COOLDOWN", "1800"))
+# Cool-downs are randomised by +/- this fraction
+CIRCUIT_JITTER = 0.2
+
+
+class CircuitOpenError(Exception):
+    """
+    Raised instead of sending a request to a host whose circuit is open.
+    """
+
+    def __init__(self, host: str, retry_in: float):
+        super().__init__(f"Circuit open for {host}, retry in {retry_in:.0f}s")
+        self.host = host
+        self.retry_in = retry_in
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """
+    Parse a Retry-After header (delay in seconds or an HTTP date).
+
+    Returns:
+        Seconds to wait, or None if the header is missing or invalid
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+@dataclass
+class HostState:
+    failures: int = 0  # consecutive failures
+    opens: int = 0  # consecutive times the circuit opened without a success in between
+    open_until: float = 0.0  # monotonic time the cool-down ends
+    probing: bool = False  # a half-open probe is in flight
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower()
+
+
+class HostHealth:
+    """
+    Tracks failures per host and decides whether a request may be sent.
+
+    Args:
+        failure_threshold: Consecutive failures that open the circuit
+        base_cooldown: First cool-down in seconds
+        max_cooldown: Upper bound for the doubled cool-down
+        jitter: Random +/- fraction applied to every cool-down
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = CIRCUIT_FAILURE_THRESHOLD,
+        base_cooldown: float = CIRCUIT_BASE_COOLDOWN,
+        max_cooldown: float = CIRCUIT_MAX_COOLDOWN,
+        jitter: float = CIRCUIT_JITTER
+    ):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.jitter = jitter
+        self.hosts: dict[str, HostState] = {}
+
+    def check(self, url: str):
+        """
+        Allow a request to `url`, or raise if its host is cooling down.
+
+        After the cool-down, one probe request is allowed; others keep being
+        rejected until it reports back.
+
+        Raises:
+            CircuitOpenError: If the host's circuit is open
+        """
+        host = host_of(url)
+        state = self.hosts.get(host)
+        if state is None or state.opens == 0:
+            return
+
+        remaining = state.open_until - time.monotonic()
+        if remaining > 0 or state.probing:
+            raise CircuitOpenError(host, max(remaining, 0.0))
+        state.probing = True
+
+    def record_success(self, url: str):
+        self.hosts.pop(host_of(url), None)
+
+    def release(self, url: str):
+        """
+        Forget an in-flight probe that was cancelled before it finished.
+        """
+        state = self.hosts.get(host_of(url))
+        if state is not None:
+            state.probing = False
+
+    def record_failure(self, url: str, retry_after: float | None = None):
+        """
+        Count a failed request; opens the circuit once the threshold is reached.
+
+        Args:
+            url: The request URL
+            retry_after: Delay the server asked for (429/503 Retry-After);
+                opens the circuit right away for at least that long
+        """
+        state = self.hosts.setdefault(host_of(url), HostState())
+        state.failures += 1
+        if state.open_until > time.monotonic() and not state.probing:
+            return  # already cooling down, e.g. a request that was in flight when it opened
+        if state.probing or retry_after is not None or state.failures >= self.failure_threshold:
+            self._open(state, retry_after)
+
+    def _open(self, state: HostState, retry_after: float | None):
+        cooldown = min(self.base_cooldown * 2 ** state.opens, self.max_cooldown)
+        cooldown *= random.uniform(1 - self.jitter, 1 + self.jitter)
+        if retry_after is not None:
+            cooldown = max(cooldown, retry_after)
+        state.opens += 1
+        state.open_until = time.monotonic() + cooldown
+        state.probing = False
+
+    def open_hosts(self) -> dict[str, float]:
+        """
+        Hosts currently being skipped.
+
+        Returns:
+            {host: seconds until the next probe is allowed}
+        """
+        now = time.monotonic()
+        return {
+            host: round(max(state.open_until - now, 0.0), 1)
+            for host, state in self.hosts.items()
+            if state.opens and (state.open_until > now or state.probing)
+        }
@@ -0,0 +1,245 @@
+"""
+Process-wide pooled httpx clients shared by the MCP tools and the main loop.
+
+Every outbound call (RSS feeds, image downloads, Feishu APIs) borrows a client
+from here instead of opening its own, so TCP+TLS connections are kept alive
+and reused across calls. One client is kept per host, which gives each host
+its own keep-alive pool and connection limits.
+
+Image URLs come from arbitrary hosts, so the number of clients is capped:
+clients idle for HTTP_CLIENT_IDLE_TIMEOUT, or least recently used beyond
+HTTP_MAX_CLIENTS, are evicted and closed once requests they may still be
+serving have had HTTP_CLIENT_CLOSE_GRACE seconds to finish.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from urllib.parse import urlparse
+
+import httpx
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Connection limits applied to every per-host pool
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "20"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+
+# Most per-host clients kept at once, and seconds unused after which a client is evicted
+HTTP_MAX_CLIENTS = int(os.getenv("HTTP_MAX_CLIENTS", "64"))
+HTTP_CLIENT_IDLE_TIMEOUT = float(os.getenv("HTTP_CLIENT_IDLE_TIMEOUT", "300"))
+# Seconds an evicted client stays open for requests already using it
+HTTP_CLIENT_CLOSE_GRACE = float(os.getenv("HTTP_CLIENT_CLOSE_GRACE", "120"))
+
+# HTTP/2 is only used for the Feishu Open API host, and only if `h2` is installed
+# (the `http2` extra)
+FEISHU_HOST = "open.feishu.cn"
+FEISHU_HTTP2 = os.getenv("FEISHU_HTTP2", "false").lower() in ("1", "true", "yes")
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+@dataclass
+class PooledClient:
+    client: httpx.AsyncClient
+    loop: asyncio.AbstractEventLoop
+    last_used: float  # monotonic time
+
+
+class HttpClientManager:
+    """
+    Keeps one pooled httpx.AsyncClient per host, up to `max_clients`.
+
+    Clients are bound to the event loop they were created on. Each loop's
+    clients are closed when the loop shuts down (asyncio.run finalises
+    async generators before closing the loop), and a client requested from
+    a different loop is replaced by a fresh one after closing the old one.
+
+    Args:
+        max_connections: Connection limit of each per-host pool
+        max_keepalive_connections: Idle connections kept per host
+        keepalive_expiry: Seconds an idle connection is kept
+        http2_hosts: Hosts spoken to over HTTP/2 (if h2 is installed)
+        max_clients: Most clients kept; the least recently used is evicted beyond it
+        idle_timeout: Seconds unused after which a client is evicted
+        close_grace: Seconds an evicted client stays open before it is closed
+    """
+
+    def __init__(
+        self,
+        max_connections: int = HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections: int = HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = HTTP_KEEPALIVE_EXPIRY,
+        http2_hosts: set[str] | None = None,
+        max_clients: int = HTTP_MAX_CLIENTS,
+        idle_timeout: float = HTTP_CLIENT_IDLE_TIMEOUT,
+        close_grace: float = HTTP_CLIENT_CLOSE_GRACE
+    ):
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry
+        )
+        if http2_hosts is None:
+            http2_hosts = {FEISHU_HOST} if FEISHU_HTTP2 else set()
+        self.http2_hosts = http2_hosts
+        self.max_clients = max_clients
+        self.idle_timeout = idle_timeout
+        self.close_grace = close_grace
+        # Least recently used first
+        self._clients: OrderedDict[str, PooledClient] = OrderedDict()
+        # Evicted clients waiting out their grace period, by the task closing them
+        self._closing: dict[asyncio.Task, PooledClient] = {}
+        # Async generators whose finalisation closes a loop's clients, per loop
+        self._shutdown_hooks: dict[asyncio.AbstractEventLoop, object] = {}
+        # Number of clients evicted, for diagnostics
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def get(self, url: str) -> httpx.AsyncClient:
+        """
+        Get the shared client for the host of `url`.
+
+        Args:
+            url: Any URL on the target host
+
+        Returns:
+            A pooled httpx.AsyncClient (do not close it yourself)
+        """
+        host = urlparse(url).netloc.lower()
+        loop = asyncio.get_running_loop()
+        now = time.monotonic()
+
+        entry = self._clients.get(host)
+        if entry is not None and not entry.client.is_closed and entry.loop is loop:
+            entry.last_used = now
+            self._clients.move_to_end(host)
+            self._evict(now)
+            return entry.client
+        if entry is not None:
+            del self._clients[host]
+            self._retire(entry, grace=0)
+
+        self._watch_loop(loop)
+        use_http2 = HTTP2_AVAILABLE and urlparse(url).hostname in self.http2_hosts
+        client = httpx.AsyncClient(limits=self.limits, http2=use_http2)
+        self._clients[host] = PooledClient(client, loop, now)
+        self._evict(now)
+        return client
+
+    def _evict(self, now: float):
+        """
+        Drop the least recently used clients beyond `max_clients` or idle for `idle_timeout`.
+        """
+        while self._clients:
+            host, entry = next(iter(self._clients.items()))
+            if len(self._clients) <= self.max_clients and now - entry.last_used < self.idle_timeout:
+                break
+            del self._clients[host]
+            self.evictions += 1
+            self._retire(entry, self.close_grace)
+
+    def _retire(self, entry: PooledClient, grace: float):
+        """
+        Close a client that is no longer handed out, after `grace` seconds.
+        """
+        if entry.client.is_closed or entry.loop.is_closed():
+            # A closed loop's clients were closed by its shutdown hook
+            return
+        if entry.loop is not asyncio.get_running_loop():
+            # Still running in another thread: close it there
+            asyncio.run_coroutine_threadsafe(entry.client.aclose(), entry.loop)
+            return
+        task = entry.loop.create_task(self._close_later(entry.client, grace))
+        self._closing[task] = entry
+        task.add_done_callback(self._forget_closed)
+
+    def _forget_closed(self, task: asyncio.Task):
+        # A task cancelled by loop shutdown leaves its client to the shutdown hook
+        entry = self._closing.get(task)
+        if entry is not None and entry.client.is_closed:
+            del self._closing[task]
+
+    @staticmethod
+    async def _close_later(client: httpx.AsyncClient, grace: float):
+        if grace > 0:
+            await asyncio.sleep(grace)
+        await client.aclose()
+
+    def _watch_loop(self, loop: asyncio.AbstractEventLoop):
+        """
+        Close the clients of `loop` when it shuts down, while it can still await them.
+        """
+        if loop in self._shutdown_hooks:
+            return
+
+        async def until_shutdown():
+            try:
+                yield
+            finally:
+                self._shutdown_hooks.pop(loop, None)
+                await self._close_loop_clients(loop)
+
+        # Started generators are finalised by loop.shutdown_asyncgens()
+        hook = until_shutdown()
+        self._shutdown_hooks[loop] = hook
+
+        async def start():
+            await hook.__anext__()
+
+        loop.create_task(start())
+
+    async def _close_loop_clients(self, loop: asyncio.AbstractEventLoop):
+        """
+        Close the pooled and evicted clients of `loop`, cutting grace periods short.
+        """
+        entries = []
+        for host, entry in list(self._clients.items()):
+            if entry.loop is loop:
+                del self._clients[host]
+                entries.append(entry)
+        for task, entry in list(self._closing.items()):
+            if entry.loop is loop:
+                del self._closing[task]
+                task.cancel()
+                entries.append(entry)
+        for entry in entries:
+            if not entry.client.is_closed:
+                await entry.client.aclose()
+
+    async def aclose(self):
+        """
+        Close every pooled client, evicted ones included. Safe to call more than once.
+        """
+        await self._close_loop_clients(asyncio.get_running_loop())
+        # Clients of loops running in other threads are closed there
+        for entry in self._clients.values():
+            self._retire(entry, grace=0)
+        self._clients.clear()
+
+
+# Shared by utils, the MCP tools and main()
+http_clients = HttpClientManager()
+
+
+def get_http_client(url: str) -> httpx.AsyncClient:
+    """
+    Get the process-wide pooled client for the host of `url`.
+    """
+    return http_clients.get(url)
+
+
+async def close_http_clients():
+    """
+    Close all pooled clients. Call once when main() exits.
+    """
+    await http_clients.aclose()
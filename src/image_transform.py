@@ -0,0 +1,168 @@
+"""
+Optional downscale/re-encode step between image download and upload.
+
+Bitable attachments only need a preview-sized copy, while feed images are
+often multi-megabyte originals. When enabled (IMAGE_TRANSFORM=true) and
+Pillow is installed, images are shrunk to IMAGE_TRANSFORM_MAX_DIM on their
+longest side and re-encoded, in a process pool so decoding and encoding
+don't block the event loop. Spooled downloads are passed to the workers by
+path, so a large original is never read into (or pickled from) the parent
+process. Pillow comes with the `pillow` extra; without it the step is a
+no-op, with a one-time warning if it was enabled.
+"""
+import asyncio
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from typing import Callable, TypeVar
+
+from dotenv import load_dotenv
+
+from process_pool import new_process_pool
+
+load_dotenv()
+
+IMAGE_TRANSFORM = os.getenv("IMAGE_TRANSFORM", "false").lower() in ("1", "true", "yes")
+# Longest side of the transformed image, in pixels
+IMAGE_TRANSFORM_MAX_DIM = int(os.getenv("IMAGE_TRANSFORM_MAX_DIM", "1280"))
+# Output format ('jpeg' or 'webp') and encoder quality (1-100)
+IMAGE_TRANSFORM_FORMAT = os.getenv("IMAGE_TRANSFORM_FORMAT", "jpeg").lower()
+IMAGE_TRANSFORM_QUALITY = int(os.getenv("IMAGE_TRANSFORM_QUALITY", "80"))
+# Images smaller than this are uploaded as they are
+IMAGE_TRANSFORM_MIN_BYTES = int(os.getenv("IMAGE_TRANSFORM_MIN_BYTES", str(200 * 1024)))
+IMAGE_TRANSFORM_WORKERS = int(os.getenv("IMAGE_TRANSFORM_WORKERS", str(min(4, os.cpu_count() or 1))))
+
+try:
+    from PIL import Image, ImageOps
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# File extension of each output format
+FORMAT_EXTENSIONS = {'jpeg': 'jpg', 'webp': 'webp'}
+
+# Worker processes shared by all CPU-bound image work (transforms, perceptual hashes)
+_executor: ProcessPoolExecutor | None = None
+# Features already warned about running without Pillow
+_pillow_warnings: set[str] = set()
+
+T = TypeVar('T')
+
+
+def require_pillow(feature: str) -> bool:
+    """
+    Check that Pillow is installed for an enabled feature, warning once per feature if not.
+
+    Args:
+        feature: Name of the setting that enabled the feature, e.g. 'IMAGE_TRANSFORM'
+    """
+    if not PIL_AVAILABLE and feature not in _pillow_warnings:
+        _pillow_warnings.add(feature)
+        print(f"Warning: {feature} is enabled but Pillow is not installed (install the 'pillow' extra); skipping")
+    return PIL_AVAILABLE
+
+
+def transform_enabled() -> bool:
+    return IMAGE_TRANSFORM and require_pillow('IMAGE_TRANSFORM')
+
+
+def source_size(source: bytes | str) -> int:
+    """
+    Size of an encoded image given as bytes or as a file path.
+    """
+    return len(source) if isinstance(source, bytes) else os.path.getsize(source)
+
+
+def open_image(source: bytes | str) -> 'Image.Image':
+    """
+    Open an encoded image given as bytes or as a file path (read lazily from disk).
+    """
+    return Image.open(BytesIO(source) if isinstance(source, bytes) else source)
+
+
+def shrink_image(source: bytes | str, max_dim: int, fmt: str, quality: int) -> bytes | None:
+    """
+    Downscale and re-encode an image (runs in a worker process).
+
+    Args:
+        source: Encoded image, or the path of a file holding it
+        max_dim: Longest side of the output, in pixels
+        fmt: Output format, 'jpeg' or 'webp'
+        quality: Encoder quality (1-100)
+
+    Returns:
+        The re-encoded image, or None if it wouldn't be smaller (or the
+        image is animated, which a still re-encode would break)
+    """
+    with open_image(source) as image:
+        if getattr(image, 'n_frames', 1) > 1:
+            return None
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((max_dim, max_dim), Image.LANCZOS)
+
+        if fmt == 'jpeg' and image.mode != 'RGB':
+            # JPEG has no alpha: flatten transparency onto white
+            rgba = image.convert('RGBA')
+            image = Image.new('RGB', rgba.size, (255, 255, 255))
+            image.paste(rgba, mask=rgba.getchannel('A'))
+        elif image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+
+        out = BytesIO()
+        image.save(out, format=fmt.upper(), quality=quality, optimize=True)
+
+    result = out.getvalue()
+    return result if len(result) < source_size(source) else None
+
+
+async def run_in_image_pool(func: Callable[..., T], *args) -> T:
+    """
+    Run a CPU-bound image function in the shared worker process pool.
+    """
+    global _executor
+    if _executor is None:
+        _executor = new_process_pool(IMAGE_TRANSFORM_WORKERS)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def transform_image(
+    source: bytes | str,
+    max_dim: int = None,
+    fmt: str = None,
+    quality: int = None
+) -> tuple[bytes, str] | None:
+    """
+    Shrink an image in the process pool, if transforms are enabled.
+
+    Args:
+        source: Encoded image, or the path of a file holding it
+        max_dim: Longest side in pixels (default IMAGE_TRANSFORM_MAX_DIM)
+        fmt: 'jpeg' or 'webp' (default IMAGE_TRANSFORM_FORMAT)
+        quality: Encoder quality (default IMAGE_TRANSFORM_QUALITY)
+
+    Returns:
+        Tuple of (smaller re-encoded image, its file extension), or None to
+        upload the original (disabled, Pillow missing, image small already,
+        or nothing gained)
+    """
+    if not transform_enabled() or source_size(source) < IMAGE_TRANSFORM_MIN_BYTES:
+        return None
+
+    fmt = fmt or IMAGE_TRANSFORM_FORMAT
+    result = await run_in_image_pool(
+        shrink_image, source, max_dim or IMAGE_TRANSFORM_MAX_DIM, fmt, quality or IMAGE_TRANSFORM_QUALITY
+    )
+    if result is None:
+        return None
+    return result, FORMAT_EXTENSIONS[fmt]
+
+
+def shutdown_transform_pool():
+    """
+    Stop the image worker pool (call on application shutdown).
+    """
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
@@ -1,7 +1,10 @@
+import asyncio
 import json
 from dotenv import load_dotenv
 from claude_agent_sdk import create_sdk_mcp_server, tool
-from utils import download_and_upload_image
+from byte_budget import ByteBudget
+from perceptual_index import dedup_enabled
+from utils import download_and_upload_file, download_and_upload_image, perceptual_index, upload_cache, url_token_cache
 from typing import Any
 import os
 
@@ -10,6 +13,11 @@ load_dotenv()
 FEISHU_APP_ID = os.getenv("APP_ID")
 FEISHU_SECRET_KEY = os.getenv("APP_SECRET")
 
+# Maximum number of images downloaded at the same time
+IMAGE_DOWNLOAD_CONCURRENCY = int(os.getenv("IMAGE_DOWNLOAD_CONCURRENCY", "8"))
+# Maximum bytes of images held between download and upload at the same time
+IMAGE_TRANSFER_BYTE_BUDGET = int(os.getenv("IMAGE_TRANSFER_BYTE_BUDGET", str(64 * 1024 * 1024)))
+
 lark_server = {
     "command": "lark-mcp",
     "args": [
@@ -22,72 +30,128 @@ lark_server = {
     ]
 }
 
-@tool("upload_images_to_lark", "Download url image to native and then upload to lark to get file token", {"urls": [str], "app_token": str})
-async def upload_images_to_lark(args: dict[str: Any]):
-    urls_input = args.get('urls')
-    app_token = args.get('app_token', 'WJ47bnLAfaoRFGsPreucdSoknXd')  # Default to the app_token from spark.md
-    url_token_dict = {}
-
-    try:
-        # Handle multiple input formats for urls parameter
-        if isinstance(urls_input, str):
-            # Try JSON array format first: '["url1", "url2"]'
-            if urls_input.strip().startswith('['):
-                try:
-                    urls = json.loads(urls_input)
-                except json.JSONDecodeError:
-                    # If JSON parsing fails, fall through to comma-split
-                    urls = None
-            else:
+def parse_urls(urls_input: Any) -> list[str]:
+    """
+    Normalise the `urls` tool argument (list, JSON array string, comma-separated or single URL).
+
+    Returns:
+        Distinct non-empty URLs, in input order
+
+    Raises:
+        ValueError: If no valid URL is left
+    """
+    # Handle multiple input formats for urls parameter
+    if isinstance(urls_input, str):
+        # Try JSON array format first: '["url1", "url2"]'
+        if urls_input.strip().startswith('['):
+            try:
+                urls = json.loads(urls_input)
+            except json.JSONDecodeError:
+                # If JSON parsing fails, fall through to comma-split
                 urls = None
-
-            # If not JSON, try comma-separated format: 'url1,url2,url3'
-            if urls is None:
-                if ',' in urls_input:
-                    urls = [u.strip() for u in urls_input.split(',') if u.strip()]
-                else:
-                    # Single URL string
-                    urls = [urls_input.strip()] if urls_input.strip() else []
-
-        elif isinstance(urls_input, list):
-            urls = urls_input
         else:
-            raise ValueError(f"Invalid urls parameter type: {type(urls_input)}. Expected list or string.")
-
-        # Validate that urls is now a list
-        if not isinstance(urls, list):
-            raise ValueError(f"After parsing, urls is not a list: {type(urls)}")
+            urls = None
 
-        # Validate URLs are non-empty strings
-        valid_urls = []
-        for url in urls:
-            if isinstance(url, str) and url.strip():
-                valid_urls.append(url.strip())
+        # If not JSON, try comma-separated format: 'url1,url2,url3'
+        if urls is None:
+            if ',' in urls_input:
+                urls = [u.strip() for u in urls_input.split(',') if u.strip()]
             else:
-                print(f"Warning: Skipping invalid URL: {url}")
+                # Single URL string
+                urls = [urls_input.strip()] if urls_input.strip() else []
+
+    elif isinstance(urls_input, list):
+        urls = urls_input
+    else:
+        raise ValueError(f"Invalid urls parameter type: {type(urls_input)}. Expected list or string.")
+
+    # Validate that urls is now a list
+    if not isinstance(urls, list):
+        raise ValueError(f"After parsing, urls is not a list: {type(urls)}")
+
+    # Validate URLs are non-empty strings
+    valid_urls = []
+    for url in urls:
+        if isinstance(url, str) and url.strip():
+            valid_urls.append(url.strip())
+        else:
+            print(f"Warning: Skipping invalid URL: {url}")
+
+    if not valid_urls:
+        raise ValueError("No valid URLs provided")
+
+    # Same URL listed twice is only processed once
+    return list(dict.fromkeys(valid_urls))
+
+
+async def transfer_urls(urls: list[str], app_token: str, transfer) -> dict[str, str | None]:
+    """
+    Run `transfer` (download_and_upload_image or download_and_upload_file) over a batch of URLs.
+
+    Returns:
+        file_token (or None on failure) per URL, in input order
+    """
+    # Download in parallel (bounded by the semaphore and the byte budget);
+    # uploads are paced by the upload_all rate limiter, so the batch takes
+    # about len / QPS seconds
+    download_semaphore = asyncio.Semaphore(IMAGE_DOWNLOAD_CONCURRENCY)
+    byte_budget = ByteBudget(IMAGE_TRANSFER_BYTE_BUDGET)
+    tokens = await asyncio.gather(*(
+        transfer(
+            url,
+            app_token,
+            download_semaphore=download_semaphore,
+            byte_budget=byte_budget
+        )
+        for url in urls
+    ))
+
+    # Results keep the input order
+    url_token_dict = {}
+    for i, (url, token) in enumerate(zip(urls, tokens), 1):
+        url_token_dict[url] = token
+        if token:
+            print(f"[{i}/{len(urls)}] ✓ Success: {token}")
+        else:
+            print(f"[{i}/{len(urls)}] ✗ Failed (returned None): {url[:80]}")
+
+    # Summary
+    success_count = sum(1 for v in url_token_dict.values() if v is not None)
+    print(f"\nSummary: {success_count}/{len(urls)} uploaded successfully")
+    url_stats = url_token_cache.stats()
+    stats = upload_cache.stats()
+    print(f"URL cache: {url_stats['hits']} hits, {url_stats['misses']} misses; "
+          f"upload cache: {stats['hits']} hits, {stats['misses']} misses")
+    print(f"Peak bytes in flight: {byte_budget.peak} of {byte_budget.total}")
+    return url_token_dict
+
+
+def error_result(message: str) -> dict:
+    import traceback
+    error_details = traceback.format_exc()
+    error_msg = f"{message}\n\nDetails:\n{error_details}"
+    print(error_msg)  # Print to console for debugging
+    return {
+        "content": [{
+            "type": "text",
+            "text": error_msg
+        }]
+    }
 
-        if not valid_urls:
-            raise ValueError("No valid URLs provided")
 
-        print(f"Processing {len(valid_urls)} image URLs...")
+@tool("upload_images_to_lark", "Download url image to native and then upload to lark to get file token", {"urls": [str], "app_token": str})
+async def upload_images_to_lark(args: dict[str: Any]):
+    urls_input = args.get('urls')
+    app_token = args.get('app_token', 'WJ47bnLAfaoRFGsPreucdSoknXd')  # Default to the app_token from spark.md
 
-        # Process each URL
-        for i, url in enumerate(valid_urls, 1):
-            print(f"[{i}/{len(valid_urls)}] Uploading: {url[:80]}...")
-            token = await download_and_upload_image(
-                image_url=url,
-                app_token=app_token
-            )
-            url_token_dict[url] = token
-
-            if token:
-                print(f"  ✓ Success: {token}")
-            else:
-                print(f"  ✗ Failed (returned None)")
+    try:
+        valid_urls = parse_urls(urls_input)
+        print(f"Processing {len(valid_urls)} image URLs...")
 
-        # Summary
-        success_count = sum(1 for v in url_token_dict.values() if v is not None)
-        print(f"\nSummary: {success_count}/{len(valid_urls)} images uploaded successfully")
+        url_token_dict = await transfer_urls(valid_urls, app_token, download_and_upload_image)
+        if dedup_enabled():
+            phash_stats = perceptual_index.stats()
+            print(f"Near-duplicate index: {phash_stats['hits']} hits, {phash_stats['entries']} images")
 
         return {
             "content": [{
@@ -96,19 +160,30 @@ async def upload_images_to_lark(args: dict[str: Any]):
             }]
         }
     except Exception as e:
-        import traceback
-        error_details = traceback.format_exc()
-        error_msg = f"Error uploading image to lark: {str(e)}\n\nDetails:\n{error_details}"
-        print(error_msg)  # Print to console for debugging
+        return error_result(f"Error uploading image to lark: {str(e)}")
+
+
+@tool("upload_files_to_lark", "Download url videos (or large images, up to 1 GB) and upload them to lark as file attachments to get file tokens", {"urls": [str], "app_token": str})
+async def upload_files_to_lark(args: dict[str: Any]):
+    urls_input = args.get('urls')
+    app_token = args.get('app_token', 'WJ47bnLAfaoRFGsPreucdSoknXd')  # Default to the app_token from spark.md
+
+    try:
+        valid_urls = parse_urls(urls_input)
+        print(f"Processing {len(valid_urls)} file URLs...")
+
+        url_token_dict = await transfer_urls(valid_urls, app_token, download_and_upload_file)
         return {
             "content": [{
                 "type": "text",
-                "text": error_msg
+                "text": json.dumps(url_token_dict, indent=2)
             }]
         }
+    except Exception as e:
+        return error_result(f"Error uploading file to lark: {str(e)}")
 
 custom_lark_server = create_sdk_mcp_server(
     name = "custom-lark-mcp",
     version = "1.0.0",
-    tools = [upload_images_to_lark]
+    tools = [upload_images_to_lark, upload_files_to_lark]
 )
\ No newline at end of file
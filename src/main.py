@@ -1,8 +1,12 @@
 from claude_agent_sdk import ClaudeAgentOptions, ClaudeSDKClient, query, create_sdk_mcp_server
 from cli_tools import parse_and_print_message, parser, print_rich_message, get_user_input
 from rich.console import Console
-from topic import topic_server
+from topic import topic_server, prefetcher
 from lark import lark_server, custom_lark_server
+from http_client import close_http_clients
+from image_transform import shutdown_transform_pool
+from utils import shutdown_parse_pools, tenant_tokens
+import asyncio
 import os
 from dotenv import load_dotenv
 import prompt
@@ -65,24 +69,40 @@ async def main():
             "mcp__lark-mcp__wiki_v2_space_getNode",              # 获取知识库空间节点信息
 
             # Lark custom
-            "mcp__enhanced-lark-mcp__upload_images_to_lark"
+            "mcp__enhanced-lark-mcp__upload_images_to_lark",
+            "mcp__enhanced-lark-mcp__upload_files_to_lark"       # 上传视频等文件附件 (超过 20MB 分片上传)
 
             # Other tools
             # "WebFetch"  # 从网页抓取内容
         ]
     )
 
-    async with ClaudeSDKClient(options) as client:
-        while True:
-            user_input = get_user_input(console)
-            parse_and_print_message(user_input, console)
-
-            if user_input == "quit":
-                break
-                
-            await client.query(user_input)
-            async for message in client.receive_response():
-                parse_and_print_message(message, console)
+    try:
+        async with ClaudeSDKClient(options) as client:
+            # 后台刷新 RSS 快照, 工具调用时不用再等网络
+            prefetcher.start()
+
+            while True:
+                # 在线程里等输入, 让后台预取任务继续跑
+                user_input = await asyncio.to_thread(get_user_input, console)
+                parse_and_print_message(user_input, console)
+
+                if user_input == "quit":
+                    break
+                    
+                await client.query(user_input)
+                async for message in client.receive_response():
+                    parse_and_print_message(message, console)
+    finally:
+        await prefetcher.stop()
+        # 停止 tenant_access_token 的后台刷新
+        await tenant_tokens.aclose()
+        # 关闭共享的 HTTP 连接池
+        await close_http_clients()
+        # 关闭 feed 解析的线程/进程池
+        shutdown_parse_pools()
+        # 关闭图片压缩的进程池
+        shutdown_transform_pool()
     
     goodbye_message = "GG-Bond: See u next time!"
     print_rich_message('system', goodbye_message, console)
@@ -0,0 +1,196 @@
+"""
+Compact trend records.
+
+`TrendItem` is the slotted per-item record every feed parser produces.
+`TrendBatch` stores many items column by column (one list per field, sources
+interned into a small integer array), which is what the trend index and the
+history keep in memory. Items are only turned into dicts / JSON at the tool
+boundary.
+"""
+import hashlib
+import re
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Iterable
+
+# Stored in the timestamp column for items without a parseable date
+NO_TIMESTAMP = float('nan')
+
+
+def parse_published(published: str | None) -> float | None:
+    """
+    Parse a feed timestamp (RFC 822 pubDate or ISO 8601) into epoch seconds.
+
+    Args:
+        published: Raw timestamp string from the feed
+
+    Returns:
+        Epoch seconds, or None if the string is empty or unparseable
+    """
+    if not published:
+        return None
+    published = published.strip()
+
+    try:
+        dt = parsedate_to_datetime(published)
+    except (TypeError, ValueError):
+        try:
+            dt = datetime.fromisoformat(published.replace('Z', '+00:00'))
+        except ValueError:
+            return None
+
+    # Feeds without a zone are assumed to be UTC
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return dt.timestamp()
+
+
+def title_hash(title: str) -> str:
+    """
+    Hash a headline after normalising case, punctuation and whitespace.
+
+    Args:
+        title: Headline text
+
+    Returns:
+        Hex digest identifying the normalised title
+    """
+    normalised = ' '.join(re.sub(r'[^\w\s]', ' ', (title or '').lower()).split())
+    return hashlib.sha1(normalised.encode('utf-8')).hexdigest()
+
+
+@dataclass(slots=True)
+class TrendItem:
+    """
+    One headline from a feed.
+    """
+    title: str
+    url: str
+    published: str
+    image_url: str
+    source: str
+    # `published` normalised to epoch seconds once at parse time (None if unparseable)
+    published_ts: float | None = None
+
+    @property
+    def key(self) -> tuple[str, str]:
+        """
+        Identity of the item within its source: its link, or its title hash if it has no link.
+
+        Feeds such as hot lists often leave the link empty, and keying those
+        on the empty string would make every such item of a source one item.
+        """
+        url = (self.url or '').strip()
+        return (self.source, url) if url else (self.source, 'title:' + title_hash(self.title))
+
+    def to_dict(self) -> dict:
+        return {
+            'title': self.title,
+            'url': self.url,
+            'published': self.published,
+            'published_ts': self.published_ts,
+            'image_url': self.image_url,
+            'source': self.source
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "TrendItem":
+        published = data.get('published') or ''
+        published_ts = data.get('published_ts')
+        if published_ts is None:
+            published_ts = parse_published(published)
+        return cls(
+            title=data.get('title') or '',
+            url=data.get('url') or '',
+            published=published,
+            image_url=data.get('image_url') or '',
+            source=data.get('source') or '',
+            published_ts=published_ts
+        )
+
+
+class TrendBatch:
+    """
+    Columnar container of trend items.
+
+    Each field is stored as its own column (publish times as a float array,
+    NaN when unknown); `source` is interned into a
+    table of names plus an unsigned short array of codes, and each source
+    keeps its own position array, so per-source filtering never touches
+    the other rows.
+    """
+
+    __slots__ = (
+        'titles', 'urls', 'published', 'published_ts', 'image_urls',
+        'source_codes', 'source_names', '_source_lookup', '_source_positions'
+    )
+
+    def __init__(self, items: Iterable[TrendItem] = ()):
+        self.titles: list[str] = []
+        self.urls: list[str] = []
+        self.published: list[str] = []
+        self.published_ts = array('d')
+        self.image_urls: list[str] = []
+        self.source_codes = array('H')
+        self.source_names: list[str] = []
+        self._source_lookup: dict[str, int] = {}
+        # Positions per source code, kept up to date on append
+        self._source_positions: list[array] = []
+        self.extend(items)
+
+    def __len__(self) -> int:
+        return len(self.titles)
+
+    def source_code(self, source: str) -> int | None:
+        """
+        Interned code of a source name, or None if no item has that source.
+        """
+        return self._source_lookup.get(source)
+
+    def append(self, item: TrendItem):
+        code = self._source_lookup.get(item.source)
+        if code is None:
+            code = len(self.source_names)
+            self.source_names.append(item.source)
+            self._source_lookup[item.source] = code
+            self._source_positions.append(array('I'))
+        self._source_positions[code].append(len(self.titles))
+
+        self.titles.append(item.title)
+        self.urls.append(item.url)
+        self.published.append(item.published)
+        self.published_ts.append(NO_TIMESTAMP if item.published_ts is None else item.published_ts)
+        self.image_urls.append(item.image_url)
+        self.source_codes.append(code)
+
+    def extend(self, items: Iterable[TrendItem]):
+        for item in items:
+            self.append(item)
+
+    def row(self, pos: int) -> TrendItem:
+        """
+        Materialise the item at `pos`.
+        """
+        timestamp = self.published_ts[pos]  # NaN marks a missing date
+        return TrendItem(
+            title=self.titles[pos],
+            url=self.urls[pos],
+            published=self.published[pos],
+            image_url=self.image_urls[pos],
+            source=self.source_names[self.source_codes[pos]],
+            published_ts=None if timestamp != timestamp else timestamp
+        )
+
+    def take(self, positions: Iterable[int]) -> list[TrendItem]:
+        return [self.row(pos) for pos in positions]
+
+    def positions_for_source(self, source: str) -> list[int]:
+        """
+        Positions of all items from `source`, in stored order.
+        """
+        code = self._source_lookup.get(source)
+        if code is None:
+            return []
+        return list(self._source_positions[code])
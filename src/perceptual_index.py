@@ -0,0 +1,190 @@
+"""
+Perceptual-hash deduplication of uploaded images.
+
+The same photo often shows up in several articles at a different crop,
+size or compression level, so its bytes (and UploadCache key) differ. A
+difference hash (dHash) of a small grayscale thumbnail barely changes under
+those edits: two images whose 64-bit hashes differ in at most
+IMAGE_PHASH_MAX_DISTANCE bits are treated as the same picture, and the
+second one reuses the first one's file_token.
+
+dHash sees the whole frame, so it only tolerates light crops: trimming a few
+percent off the edges moves a handful of bits, but a tighter crop, a
+different aspect ratio or a letterboxed/padded copy shifts every sampled
+pixel and is not recognised as the same picture.
+
+Hashes are computed in the shared image worker pool (a spooled download is
+read there from its file, not pickled over) and need Pillow (the `pillow`
+extra). When dedup is disabled (the default, IMAGE_PHASH_DEDUP=true enables
+it) or Pillow is missing, no hash is computed and nothing is deduplicated;
+enabling it without Pillow prints a one-time warning.
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from image_transform import PIL_AVAILABLE, open_image, require_pillow, run_in_image_pool
+from sqlite_writer import SQLiteWriter
+from upload_cache import UPLOAD_CACHE_PATH
+
+load_dotenv()
+
+IMAGE_PHASH_DEDUP = os.getenv("IMAGE_PHASH_DEDUP", "false").lower() in ("1", "true", "yes")
+# Largest Hamming distance (out of 64 bits) at which two images count as the same
+IMAGE_PHASH_MAX_DISTANCE = int(os.getenv("IMAGE_PHASH_MAX_DISTANCE", "6"))
+
+# dHash compares neighbouring pixels of a (HASH_SIZE + 1) x HASH_SIZE thumbnail
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+if PIL_AVAILABLE:
+    from PIL import Image
+
+
+def dedup_enabled() -> bool:
+    return IMAGE_PHASH_DEDUP and require_pillow('IMAGE_PHASH_DEDUP')
+
+
+def dhash(source: bytes | str) -> int:
+    """
+    64-bit difference hash of an image (runs in a worker process).
+
+    Each bit says whether a pixel of the grayscale thumbnail is brighter
+    than its right-hand neighbour. Robust to rescaling and recompression
+    and to crops of a few percent, not to larger crops or padding.
+
+    Args:
+        source: Encoded image, or the path of a file holding it
+
+    Raises:
+        OSError: If Pillow can't decode the image
+    """
+    with open_image(source) as image:
+        # JPEGs are decoded at a reduced scale, which is much faster for large photos
+        image.draft('L', (HASH_SIZE * 8, HASH_SIZE * 8))
+        pixels = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.BILINEAR).tobytes()
+
+    bits = 0
+    for row in range(HASH_SIZE):
+        offset = row * (HASH_SIZE + 1)
+        for col in range(HASH_SIZE):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+    return bits
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+async def perceptual_hash(source: bytes | str) -> int | None:
+    """
+    dHash of an image (bytes or file path), or None if dedup is disabled or the image can't be decoded.
+    """
+    if not dedup_enabled():
+        return None
+    try:
+        return await run_in_image_pool(dhash, source)
+    except Exception as e:
+        print(f"Perceptual hash failed, skipping near-duplicate check: {e}")
+        return None
+
+
+class PerceptualIndex:
+    """
+    file_tokens by perceptual hash and upload target, with near-match lookup.
+
+    Hashes are split into `max_distance + 1` bands. Two hashes within
+    `max_distance` bits of each other agree on at least one whole band
+    (pigeonhole), so a lookup only compares against entries sharing a band
+    instead of scanning the whole history.
+
+    Args:
+        path: SQLite database file (':memory:' for a throwaway index)
+        max_distance: Largest Hamming distance that counts as a match
+    """
+
+    def __init__(self, path: str = UPLOAD_CACHE_PATH, max_distance: int = IMAGE_PHASH_MAX_DISTANCE):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.max_distance = max_distance
+        # (shift, mask) of each band
+        band_count = min(max_distance + 1, HASH_BITS)
+        edges = [HASH_BITS * i // band_count for i in range(band_count + 1)]
+        self.bands = [(start, (1 << (end - start)) - 1) for start, end in zip(edges, edges[1:])]
+        self._buckets: dict[tuple[str, str, int, int], list[tuple[int, str]]] = {}
+        self.entries = 0
+        self.hits = 0
+        self.misses = 0
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS image_hashes ("
+            " dhash TEXT NOT NULL,"
+            " app_token TEXT NOT NULL,"
+            " parent_type TEXT NOT NULL,"
+            " file_token TEXT NOT NULL,"
+            " added_at REAL NOT NULL,"
+            " PRIMARY KEY (dhash, app_token, parent_type))"
+        )
+        for hex_hash, app_token, parent_type, file_token in self.conn.execute(
+            "SELECT dhash, app_token, parent_type, file_token FROM image_hashes"
+        ):
+            self._index(int(hex_hash, 16), app_token, parent_type, file_token)
+        self._writer = SQLiteWriter(self.conn, 'perceptual-index')
+
+    def _index(self, phash: int, app_token: str, parent_type: str, file_token: str):
+        for band, (shift, mask) in enumerate(self.bands):
+            key = (app_token, parent_type, band, (phash >> shift) & mask)
+            self._buckets.setdefault(key, []).append((phash, file_token))
+        self.entries += 1
+
+    def find(self, phash: int, app_token: str, parent_type: str) -> str | None:
+        """
+        The file_token of the closest indexed image within `max_distance`, counting the hit or miss.
+
+        Args:
+            phash: dHash of the image
+            app_token: Base the image is going to
+            parent_type: Upload point type
+
+        Returns:
+            file_token, or None if no near-duplicate was uploaded there
+        """
+        best = None
+        best_distance = self.max_distance + 1
+        for band, (shift, mask) in enumerate(self.bands):
+            for other, file_token in self._buckets.get((app_token, parent_type, band, (phash >> shift) & mask), ()):
+                distance = hamming_distance(phash, other)
+                if distance < best_distance:
+                    best, best_distance = file_token, distance
+
+        if best is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return best
+
+    def add(self, phash: int, app_token: str, parent_type: str, file_token: str):
+        """
+        Index an uploaded image, in memory at once and on disk in the background.
+        """
+        self._index(phash, app_token, parent_type, file_token)
+        self._writer.execute(
+            "INSERT OR REPLACE INTO image_hashes"
+            " (dhash, app_token, parent_type, file_token, added_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (f"{phash:016x}", app_token, parent_type, file_token, time.time())
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": self.entries}
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        self.conn.close()
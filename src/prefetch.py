@@ -0,0 +1,198 @@
+"""
+Background feed prefetcher.
+
+Refreshes each feed source on its own interval from a background scheduler and
+keeps the latest result in memory, so tool handlers can answer from the
+snapshot instead of waiting on the network.
+
+A single scheduler task keeps a heap of next refresh times, so hundreds of
+sources cost one timer rather than one sleeping task each. At most
+`max_concurrency` fetches run at once; when sources queue up, higher
+priorities go first.
+"""
+import asyncio
+import heapq
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable
+
+
+@dataclass
+class SourceSnapshot:
+    """
+    Latest known state of one source.
+    """
+    items: list = field(default_factory=list)
+    fetched_at: float | None = None  # time of the last successful fetch
+    error: str | None = None  # error of the last attempt, if it failed
+
+
+class FeedPrefetcher:
+    """
+    Periodically refreshes every source into an in-memory snapshot.
+
+    Args:
+        sources: {source name: feed url}
+        fetch: Coroutine function fetching one source, called as fetch(source, url)
+        intervals: {source name: refresh interval in seconds}
+        default_interval: Interval for sources missing from `intervals`
+        on_refresh: Optional callback called as on_refresh(source, items)
+            after every successful refresh
+        priorities: {source name: priority}, higher is fetched first (default 0)
+        max_concurrency: Maximum number of fetches in flight
+    """
+
+    def __init__(
+        self,
+        sources: dict[str, str],
+        fetch: Callable[[str, str], Awaitable[list]],
+        intervals: dict[str, float] | None = None,
+        default_interval: float = 300.0,
+        on_refresh: Callable[[str, list], None] | None = None,
+        priorities: dict[str, int] | None = None,
+        max_concurrency: int = 5
+    ):
+        self.sources = sources
+        self.fetch = fetch
+        self.intervals = intervals or {}
+        self.default_interval = default_interval
+        self.on_refresh = on_refresh
+        self.priorities = priorities or {}
+        self.max_concurrency = max(1, max_concurrency)
+        self.snapshots: dict[str, SourceSnapshot] = {}
+        # Bumped on every successful refresh, so readers can cache derived data
+        self.version = 0
+        self._scheduler: asyncio.Task | None = None
+        self._in_flight: set[asyncio.Task] = set()
+        # (due time, source) of every source not currently being fetched
+        self._schedule: list[tuple[float, str]] = []
+        self._wakeup: asyncio.Event | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._scheduler is not None and not self._scheduler.done()
+
+    def start(self):
+        """
+        Start the refresh scheduler on the running event loop. Every source is due immediately.
+        """
+        if self.running:
+            return
+        now = time.monotonic()
+        self._schedule = [(now, source) for source in self.sources]
+        heapq.heapify(self._schedule)
+        self._wakeup = asyncio.Event()
+        self._scheduler = asyncio.create_task(self._run(), name="prefetch:scheduler")
+
+    async def stop(self):
+        """
+        Cancel the scheduler and in-flight fetches and wait for them to finish.
+        """
+        tasks = list(self._in_flight)
+        if self._scheduler is not None:
+            tasks.append(self._scheduler)
+        self._scheduler = None
+        self._in_flight.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def refresh(self, source: str, url: str):
+        """
+        Fetch one source now and update its snapshot. Failures keep the previous items.
+        """
+        snapshot = self.snapshots.setdefault(source, SourceSnapshot())
+        try:
+            items = await self.fetch(source, url)
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            snapshot.error = "Timed out"
+        except Exception as e:
+            snapshot.error = f"{type(e).__name__}: {e}"
+        else:
+            snapshot.items = items
+            snapshot.fetched_at = time.time()
+            snapshot.error = None
+            self.version += 1
+            if self.on_refresh is not None:
+                self.on_refresh(source, items)
+
+    async def _run(self):
+        """
+        Start due sources, highest priority first, as fetch slots free up.
+        """
+        ready: list[tuple[int, float, str]] = []
+        while True:
+            now = time.monotonic()
+            while self._schedule and self._schedule[0][0] <= now:
+                due, source = heapq.heappop(self._schedule)
+                heapq.heappush(ready, (-self.priorities.get(source, 0), due, source))
+
+            if ready and len(self._in_flight) < self.max_concurrency:
+                _, _, source = heapq.heappop(ready)
+                task = asyncio.create_task(self._refresh_and_reschedule(source), name=f"prefetch:{source}")
+                self._in_flight.add(task)
+                continue
+
+            # Sleep until the next source is due or a running fetch finishes
+            timeout = None
+            if self._schedule and not ready:
+                timeout = max(self._schedule[0][0] - now, 0.0)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh_and_reschedule(self, source: str):
+        try:
+            await self.refresh(source, self.sources[source])
+        finally:
+            self._in_flight.discard(asyncio.current_task())
+            interval = self.intervals.get(source, self.default_interval)
+            heapq.heappush(self._schedule, (time.monotonic() + interval, source))
+            self._wakeup.set()
+
+    def has_snapshot(self) -> bool:
+        """
+        Whether at least one source has been fetched successfully.
+        """
+        return any(s.fetched_at is not None for s in self.snapshots.values())
+
+    def status(self) -> tuple[dict[str, str], float | None]:
+        """
+        Report source health without copying any items.
+
+        Returns:
+            Tuple of ({source: error} for failed or not-yet-fetched sources,
+            age in seconds of the oldest source snapshot)
+        """
+        now = time.time()
+        errors = {}
+        ages = []
+        for source in self.sources:
+            snapshot = self.snapshots.get(source)
+            if snapshot is None or snapshot.fetched_at is None:
+                errors[source] = snapshot.error if snapshot and snapshot.error else "Not fetched yet"
+                continue
+            if snapshot.error:
+                errors[source] = snapshot.error
+            ages.append(now - snapshot.fetched_at)
+        return errors, max(ages) if ages else None
+
+    def snapshot(self) -> tuple[list, dict[str, str], float | None]:
+        """
+        Read the latest snapshot without touching the network.
+
+        Returns:
+            Tuple of (items from all sources, {source: error} for failed or
+            not-yet-fetched sources, age in seconds of the oldest source snapshot)
+        """
+        items = []
+        for source in self.sources:
+            snapshot = self.snapshots.get(source)
+            if snapshot is not None and snapshot.fetched_at is not None:
+                items.extend(snapshot.items)
+        errors, age = self.status()
+        return items, errors, age
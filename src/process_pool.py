@@ -0,0 +1,32 @@
+"""
+Worker process pools for CPU-bound work (feed parsing, image transforms and hashes).
+
+Workers are not forked from the application process: by the time a pool is
+first used it already runs other threads (the feed cache writer, the input
+reader thread), and a child forked from a multi-threaded process can
+deadlock on a lock one of those threads held. Pools start their workers from
+a fork server instead. It is started once, imports the main module and the
+worker modules, and forks every worker from that single-threaded state, so
+workers neither inherit foreign locks nor re-import the application
+themselves. Platforms without a fork server (Windows) spawn workers.
+
+Functions run in a pool should live in modules with no import-time side
+effects (no databases opened, no threads started).
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+# Modules that define the functions run in worker processes
+WORKER_MODULES = ['extractors', 'image_transform', 'perceptual_index']
+
+
+def new_process_pool(max_workers: int) -> ProcessPoolExecutor:
+    """
+    Create a process pool whose workers come from the fork server (spawned where there is none).
+    """
+    if 'forkserver' not in multiprocessing.get_all_start_methods():
+        return ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context('spawn'))
+    context = multiprocessing.get_context('forkserver')
+    # Only takes effect before the fork server has started
+    context.set_forkserver_preload(['__main__', *WORKER_MODULES])
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
@@ -0,0 +1,137 @@
+"""
+Incremental hotness ranking over headline clusters.
+
+A cluster's hotness combines how recent its newest item is (exponential
+decay with a configurable half-life), how many sources carry the story and
+how many distinct items cover it:
+
+    hotness(t) = weight * exp(-decay * (t - newest_ts))
+
+Because every cluster decays at the same rate, the ranking only depends on
+the time-independent key `log(weight) + decay * newest_ts`. Updating a
+cluster therefore touches only that cluster's key, and top-k is served from
+a heap with lazily discarded stale entries instead of rescoring history.
+"""
+import heapq
+import math
+import time
+from typing import Callable
+
+from clustering import Cluster
+from models import TrendItem
+
+# Hotness halves every RANK_HALF_LIFE_HOURS without new coverage
+RANK_HALF_LIFE_HOURS = 6.0
+# Extra weight per additional source carrying the story
+RANK_SOURCE_WEIGHT = 1.0
+# Extra weight per log-appearance (fetches the story showed up in)
+RANK_APPEARANCE_WEIGHT = 0.5
+
+
+class TrendRanker:
+    """
+    Keeps a hotness key per cluster and answers top-k queries.
+
+    Args:
+        half_life_hours: Time for a story's hotness to halve
+        source_weight: Weight added per extra source
+        appearance_weight: Weight added per log(appearances)
+    """
+
+    def __init__(
+        self,
+        half_life_hours: float = RANK_HALF_LIFE_HOURS,
+        source_weight: float = RANK_SOURCE_WEIGHT,
+        appearance_weight: float = RANK_APPEARANCE_WEIGHT
+    ):
+        self.decay = math.log(2) / (half_life_hours * 3600)
+        self.source_weight = source_weight
+        self.appearance_weight = appearance_weight
+
+        self.clusters: dict[int, Cluster] = {}
+        self.newest_ts: dict[int, float] = {}
+        self._keys: dict[int, float] = {}
+        self._heap: list[tuple[float, int]] = []
+        # First time each undated item (by TrendItem.key) was ingested
+        self.first_seen: dict[tuple[str, str], float] = {}
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def weight(self, cluster: Cluster) -> float:
+        return (
+            (1 + self.source_weight * (cluster.source_count - 1))
+            * (1 + self.appearance_weight * math.log(cluster.appearances))
+        )
+
+    def update(self, cluster: Cluster, item: TrendItem):
+        """
+        Re-key a cluster after `item` was added to it (or reappeared).
+
+        Args:
+            cluster: Cluster the item was assigned to
+            item: The ingested item; undated items count as published when
+                first ingested, so repeat fetches don't keep them fresh
+        """
+        cluster_id = cluster.cluster_id
+        if item.published_ts is not None:
+            published_ts = item.published_ts
+        else:
+            published_ts = self.first_seen.setdefault(item.key, time.time())
+        newest_ts = max(self.newest_ts.get(cluster_id, published_ts), published_ts)
+
+        self.clusters[cluster_id] = cluster
+        self.newest_ts[cluster_id] = newest_ts
+
+        key = math.log(self.weight(cluster)) + self.decay * newest_ts
+        self._keys[cluster_id] = key
+        heapq.heappush(self._heap, (-key, cluster_id))
+
+        # Drop stale heap entries once they outnumber the live ones
+        if len(self._heap) > 2 * len(self._keys) + 64:
+            self._heap = [(-k, cid) for cid, k in self._keys.items()]
+            heapq.heapify(self._heap)
+
+    def hotness(self, cluster_id: int, now: float | None = None) -> float:
+        """
+        Current hotness of a cluster.
+        """
+        now = time.time() if now is None else now
+        return math.exp(self._keys[cluster_id] - self.decay * now)
+
+    def top(
+        self,
+        k: int,
+        predicate: Callable[[Cluster], bool] | None = None,
+        now: float | None = None
+    ) -> list[tuple[Cluster, float]]:
+        """
+        The `k` hottest clusters, optionally restricted by `predicate`.
+
+        Args:
+            k: Number of clusters to return
+            predicate: Optional filter applied to candidate clusters
+            now: Reference time for the reported hotness
+
+        Returns:
+            List of (cluster, hotness) pairs, hottest first
+        """
+        now = time.time() if now is None else now
+        result = []
+        popped = []
+        emitted = set()
+
+        while self._heap and len(result) < k:
+            neg_key, cluster_id = heapq.heappop(self._heap)
+            if self._keys.get(cluster_id) != -neg_key or cluster_id in emitted:
+                continue  # stale entry, a newer one exists
+            popped.append((neg_key, cluster_id))
+            emitted.add(cluster_id)
+
+            cluster = self.clusters[cluster_id]
+            if predicate is None or predicate(cluster):
+                result.append((cluster, math.exp(-neg_key - self.decay * now)))
+
+        for entry in popped:
+            heapq.heappush(self._heap, entry)
+        return result
@@ -0,0 +1,46 @@
+"""
+Async token-bucket rate limiter.
+
+Used to pace calls to Feishu Open APIs that have a documented per-app QPS
+limit, so a burst of concurrent uploads is spread out instead of being
+rejected by the server.
+"""
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second, holding at most `capacity`.
+
+    Waiters are served in arrival order.
+
+    Args:
+        rate: Tokens added per second (the sustained calls-per-second limit)
+        capacity: Maximum burst size (default 1: calls are evenly spaced)
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        if rate <= 0:
+            raise ValueError(f"rate must be positive, got {rate}")
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """
+        Wait until `tokens` are available and take them.
+        """
+        async with self._lock:
+            self._refill()
+            while self.tokens < tokens:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= tokens
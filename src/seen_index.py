@@ -0,0 +1,133 @@
+"""
+Persistent index of trend items that have already been returned to the agent.
+
+Items are keyed by canonical URL and by a normalised title hash, so the same
+story is recognised even when a feed rewrites its link. An empty link or title
+is no key at all (it would match every other item missing it). The index is
+backed by SQLite and mirrored into in-memory sets for O(1) lookups; new
+entries are written to disk on a background thread.
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from models import TrendItem, title_hash
+from sqlite_writer import SQLiteWriter
+from utils import canonicalize_url
+
+load_dotenv()
+
+SEEN_INDEX_PATH = os.getenv(
+    "SEEN_INDEX_PATH",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "seen_items.db")
+)
+
+# Hash of a title that normalises to nothing (empty, or only punctuation)
+EMPTY_TITLE_HASH = title_hash('')
+
+
+class SeenIndex:
+    """
+    Set of seen trend items, persisted in SQLite.
+
+    An item counts as seen if either its canonical URL or its title hash has
+    been recorded before. Items without a link are stored with a NULL url and
+    items without a title with an empty title_hash; neither is ever matched.
+    """
+
+    def __init__(self, path: str = SEEN_INDEX_PATH):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS seen_items ("
+            " url TEXT PRIMARY KEY,"
+            " title_hash TEXT NOT NULL,"
+            " seen_at REAL NOT NULL)"
+        )
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_seen_title_hash ON seen_items (title_hash)"
+        )
+
+        self.urls: set[str] = set()
+        self.title_hashes: set[str] = set()
+        for url, t_hash in self.conn.execute("SELECT url, title_hash FROM seen_items"):
+            if url:
+                self.urls.add(url)
+            if t_hash and t_hash != EMPTY_TITLE_HASH:
+                self.title_hashes.add(t_hash)
+        self._writer = SQLiteWriter(self.conn, 'seen-index')
+
+    @staticmethod
+    def _keys(item: TrendItem) -> tuple[str | None, str | None]:
+        """
+        Canonical URL and title hash of an item, None for an empty link or title.
+        """
+        url = canonicalize_url(item.url) if (item.url or '').strip() else None
+        t_hash = title_hash(item.title)
+        return url, (t_hash if t_hash != EMPTY_TITLE_HASH else None)
+
+    def is_seen(self, item: TrendItem) -> bool:
+        url, t_hash = self._keys(item)
+        return url in self.urls or t_hash in self.title_hashes
+
+    def filter_new(self, items: list[TrendItem]) -> list[TrendItem]:
+        """
+        Keep only items that have not been seen, dropping duplicates within `items` too.
+
+        Args:
+            items: Trend items to filter
+
+        Returns:
+            Items not present in the index, in their original order
+        """
+        new_items = []
+        batch_urls = set()
+        batch_hashes = set()
+        for item in items:
+            url, t_hash = self._keys(item)
+            if url in self.urls or t_hash in self.title_hashes:
+                continue
+            if url in batch_urls or t_hash in batch_hashes:
+                continue
+            if url is not None:
+                batch_urls.add(url)
+            if t_hash is not None:
+                batch_hashes.add(t_hash)
+            new_items.append(item)
+        return new_items
+
+    def mark_seen(self, items: list[TrendItem]):
+        """
+        Record items as seen, in memory at once and on disk in the background.
+
+        Args:
+            items: Trend items that were returned to the agent
+        """
+        now = time.time()
+        rows = []
+        for item in items:
+            url, t_hash = self._keys(item)
+            if url is None and t_hash is None:
+                continue
+            if url is not None:
+                self.urls.add(url)
+            if t_hash is not None:
+                self.title_hashes.add(t_hash)
+            # SQLite allows any number of NULLs in the url key
+            rows.append((url, t_hash or '', now))
+
+        self._writer.executemany(
+            "INSERT OR IGNORE INTO seen_items (url, title_hash, seen_at) VALUES (?, ?, ?)",
+            rows
+        )
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        self.conn.close()
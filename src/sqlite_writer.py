@@ -0,0 +1,75 @@
+"""
+Background writes for the SQLite-backed stores.
+
+Every store (feed cache, upload caches, seen index, perceptual index) keeps
+its data mirrored in memory and only writes to SQLite to persist it, so a
+lookup never touches the database. `SQLiteWriter` moves those writes onto
+one background thread per store, run in submission order, so recording an
+upload or a seen item never blocks the event loop on a commit.
+"""
+import sqlite3
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Iterable
+
+
+class SQLiteWriter:
+    """
+    Runs the writes of one SQLite connection on a background thread.
+
+    The connection must be opened with check_same_thread=False, and once
+    the writer is in use the owner should only read from it after flush().
+
+    Args:
+        conn: Connection the writes go to
+        name: Thread name prefix, also used in error messages
+    """
+
+    def __init__(self, conn: sqlite3.Connection, name: str):
+        self.conn = conn
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._pending: Future | None = None
+
+    def submit(self, func: Callable, *args):
+        """
+        Run `func(*args)` on the writer thread, after every write submitted before it.
+        """
+        self._pending = self._executor.submit(func, *args)
+        self._pending.add_done_callback(self._report_error)
+
+    def execute(self, sql: str, params: tuple = ()):
+        """
+        Execute and commit one statement in the background.
+        """
+        self.submit(self._execute, sql, params)
+
+    def executemany(self, sql: str, rows: Iterable[tuple]):
+        """
+        Execute and commit one statement per row in the background, in one transaction.
+        """
+        self.submit(self._executemany, sql, list(rows))
+
+    def _execute(self, sql: str, params: tuple):
+        with self.conn:
+            self.conn.execute(sql, params)
+
+    def _executemany(self, sql: str, rows: list[tuple]):
+        with self.conn:
+            self.conn.executemany(sql, rows)
+
+    def _report_error(self, future: Future):
+        if future.exception() is not None:
+            print(f"Warning: {self.name} write failed: {future.exception()}")
+
+    def flush(self):
+        """
+        Wait until every write submitted so far has reached the database.
+        """
+        if self._pending is not None:
+            self._pending.exception()
+
+    def close(self):
+        """
+        Finish pending writes and stop the thread (the connection stays open).
+        """
+        self._executor.shutdown(wait=True)
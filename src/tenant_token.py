@@ -0,0 +1,139 @@
+"""
+Cached Feishu tenant_access_token per app.
+
+A tenant_access_token is valid for `expire` seconds (usually two hours), so
+there is no need to request one per API call. Tokens are cached per APP_ID,
+refreshed in the background shortly before they expire, and concurrent
+callers that find no valid token share a single in-flight request.
+"""
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Refresh this many seconds before the token expires
+TENANT_TOKEN_REFRESH_MARGIN = float(os.getenv("TENANT_TOKEN_REFRESH_MARGIN", "300"))
+# A cached token with less than this many seconds left is not handed out any more
+TENANT_TOKEN_MIN_TTL = 30.0
+
+
+@dataclass
+class CachedToken:
+    token: str
+    expires_at: float  # monotonic time
+
+
+class TenantTokenManager:
+    """
+    Caches tenant_access_tokens per app and refreshes them ahead of expiry.
+
+    Args:
+        fetch: Coroutine function requesting a new token, called as
+            fetch(app_id, app_secret) and returning (token, expire seconds)
+        refresh_margin: Seconds before expiry at which the background refresh runs
+        min_ttl: A cached token with less time left than this is not handed out
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[[str, str], Awaitable[tuple[str, float]]],
+        refresh_margin: float = TENANT_TOKEN_REFRESH_MARGIN,
+        min_ttl: float = TENANT_TOKEN_MIN_TTL
+    ):
+        self.fetch = fetch
+        self.refresh_margin = refresh_margin
+        self.min_ttl = min_ttl
+        self.tokens: dict[str, CachedToken] = {}
+        self.secrets: dict[str, str] = {}
+        # Number of token requests actually sent, for diagnostics
+        self.requests = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._refresh_tasks: dict[str, asyncio.Task] = {}
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _bind_loop(self):
+        # Tasks from a previous event loop (e.g. an earlier asyncio.run) can't be awaited
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._inflight.clear()
+            self._refresh_tasks.clear()
+            self._loop = loop
+
+    async def get(self, app_id: str, app_secret: str) -> str:
+        """
+        A valid token for the app, from the cache or a (shared) new request.
+
+        Args:
+            app_id: Feishu app ID
+            app_secret: Feishu app secret
+
+        Returns:
+            tenant_access_token string
+        """
+        self._bind_loop()
+        self.secrets[app_id] = app_secret
+
+        cached = self.tokens.get(app_id)
+        if cached is not None and cached.expires_at - time.monotonic() > self.min_ttl:
+            return cached.token
+
+        return await self._refresh(app_id)
+
+    async def _refresh(self, app_id: str) -> str:
+        """
+        Request a new token, joining the in-flight request if there is one.
+        """
+        task = self._inflight.get(app_id)
+        if task is None:
+            task = self._inflight[app_id] = asyncio.create_task(self._request(app_id))
+        # Shield so one cancelled caller doesn't cancel the request for everyone
+        return await asyncio.shield(task)
+
+    async def _request(self, app_id: str) -> str:
+        try:
+            self.requests += 1
+            token, expire = await self.fetch(app_id, self.secrets[app_id])
+            self.tokens[app_id] = CachedToken(token, time.monotonic() + expire)
+            self._schedule_refresh(app_id, expire)
+            return token
+        finally:
+            self._inflight.pop(app_id, None)
+
+    def _schedule_refresh(self, app_id: str, expire: float):
+        previous = self._refresh_tasks.pop(app_id, None)
+        if previous is not None:
+            previous.cancel()
+        # Short-lived tokens are refreshed half-way instead of in a tight loop
+        delay = max(expire - self.refresh_margin, expire / 2)
+        self._refresh_tasks[app_id] = asyncio.create_task(self._refresh_later(app_id, delay))
+
+    async def _refresh_later(self, app_id: str, delay: float):
+        await asyncio.sleep(delay)
+        try:
+            await self._refresh(app_id)
+        except Exception as e:
+            # Keep the current token; get() requests a new one once it runs out
+            print(f"Background tenant_access_token refresh failed for {app_id}: {e}")
+
+    def invalidate(self, app_id: str):
+        """
+        Drop a cached token the API rejected, so the next get() requests a new one.
+        """
+        self.tokens.pop(app_id, None)
+
+    async def aclose(self):
+        """
+        Cancel background refreshes. Safe to call more than once.
+        """
+        tasks = list(self._refresh_tasks.values()) + list(self._inflight.values())
+        self._refresh_tasks.clear()
+        self._inflight.clear()
+        for task in tasks:
+            task.cancel()
+        if self._loop is asyncio.get_running_loop():
+            await asyncio.gather(*tasks, return_exceptions=True)
@@ -1,49 +1,403 @@
+import asyncio
+import time
 import json, requests, xml.etree.ElementTree as ET
 from claude_agent_sdk import create_sdk_mcp_server, tool
+from catalog import DEFAULT_REFRESH_INTERVAL, get_catalog
+from clustering import HeadlineClusterer
+from feed_cache import FeedCache
+from host_health import CircuitOpenError, HostHealth, parse_retry_after
+from prefetch import FeedPrefetcher
+from ranking import TrendRanker
+from seen_index import SeenIndex
+from trends import TrendIndex, TrendTimeline, title_matches, tokenize
 from utils import parse_feeds
 from typing import Any
+from models import TrendItem, parse_published
+import httpx
 
-# https://www.nytimes.com/rss 里面有各个国家的
-RSS_DICT = {
-    # "raddit": "https://www.reddit.com/r/worldnews/.rss", # raddit/worldnews
-    # "google": "https://news.google.com/rss?hl=en-SG&gl=SG&ceid=SG:en", # sg first as a test kinda serious
-    # "tiktok": "https://www.thesun.co.uk/topic/tiktok/feed/",  # pass
-    # "zhihu": "https://rsshub.app/zhihu/hot",  # pass
-    "nytimes": "https://rss.nytimes.com/services/xml/rss/nyt/World.xml"
-}
+# 源目录 (sources.toml): 每个源的 URL, 解析类型, 图片规则, 刷新间隔和优先级
+SOURCE_CATALOG = get_catalog()
+RSS_DICT = {name: spec.url for name, spec in SOURCE_CATALOG.items() if spec.enabled}
+
+# 每个源的缓存有效期(秒), 有效期内直接返回缓存, 不发请求
+RSS_TTL = {name: spec.refresh_interval for name, spec in SOURCE_CATALOG.items()}
+RSS_DEFAULT_TTL = DEFAULT_REFRESH_INTERVAL
+RSS_PRIORITY = {name: spec.priority for name, spec in SOURCE_CATALOG.items()}
+
+# 共享的 feed 缓存 (ETag / Last-Modified), 持久化到磁盘
+feed_cache = FeedCache()
+
+# 已返回过的条目索引 (按规范化 URL + 标题哈希), 用于 only_new
+seen_index = SeenIndex()
+
+# 工具默认/最大返回条数
+RSS_DEFAULT_LIMIT = 5
+RSS_MAX_LIMIT = 50
+
+# 并发抓取配置: 同时请求的源数量上限, 以及单个源的超时时间(秒)
+RSS_CONCURRENCY = 5
+RSS_SOURCE_TIMEOUT = 10.0
+
+# 按 host 统计失败次数, 连续失败后熔断一段时间, 期间直接跳过不再等超时
+host_health = HostHealth()
+
+
+def _is_host_failure(error: Exception) -> bool:
+    """
+    Whether an error says the host is unhealthy (unreachable, timing out,
+    5xx or 429), rather than just one bad feed on it (404, invalid XML).
+    """
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status == 429 or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError))
+
+
+def _retry_after(error: Exception) -> float | None:
+    """
+    Retry-After of a 429/503 response, if the error carries one.
+    """
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (429, 503):
+        return parse_retry_after(error.response.headers.get('retry-after'))
+    return None
+
+
+async def _parse_source(source: str, url: str, timeout: float = RSS_SOURCE_TIMEOUT) -> list[TrendItem]:
+    """
+    Fetch and parse a single RSS source with the shared cache and a timeout.
 
+    Raises:
+        CircuitOpenError: If the source's host is cooling down after repeated failures
+            and no fresh cached copy of the feed is available
+    """
+    ttl = RSS_TTL.get(source, RSS_DEFAULT_TTL)
+    # 缓存仍新鲜时无需请求, 即使该主机正处于熔断冷却期
+    if feed_cache.is_fresh(url, ttl):
+        return list(feed_cache.items(url))
+    host_health.check(url)
+    try:
+        # 分页、排名和时间线都需要每个源的全部条目, 所以整体下载解析, 不做流式截断
+        items = await asyncio.wait_for(
+            parse_feeds(
+                url,
+                source,
+                cache=feed_cache,
+                ttl=ttl,
+                spec=SOURCE_CATALOG.get(source)
+            ),
+            timeout=timeout
+        )
+    except asyncio.CancelledError:
+        host_health.release(url)
+        raise
+    except Exception as e:
+        if _is_host_failure(e):
+            host_health.record_failure(url, _retry_after(e))
+        else:
+            host_health.release(url)
+        raise
+    host_health.record_success(url)
+    return items
+
+
+async def _fetch_source(
+    source: str,
+    url: str,
+    semaphore: asyncio.Semaphore,
+    timeout: float
+) -> list[TrendItem]:
+    """
+    Fetch a single RSS source, bounded by the shared semaphore and a timeout.
+    """
+    async with semaphore:
+        return await _parse_source(source, url, timeout)
+
+
+# 跨源合并的历史时间线 (按发布时间排序), 用于 "最新 N 条" / "最近几小时" 查询
+trend_timeline = TrendTimeline()
+
+# 跨源近似重复标题聚类 (MinHash + LSH), 增量更新
+headline_clusters = HeadlineClusterer()
+
+# 聚类热度排名 (时间衰减 + 源数量 + 重复出现次数), 增量更新
+trend_ranker = TrendRanker()
+
+
+def _ingest_trends(items: list[TrendItem]):
+    """
+    Feed freshly fetched items into the history timeline, the clusterer and the ranker.
+    """
+    trend_timeline.insert_many(items)
+    for cluster, item in zip(headline_clusters.add_many(items), items):
+        trend_ranker.update(cluster, item)
+
+# 后台预取: 每个源按自己的刷新间隔更新内存快照, 排队时优先级高的先抓, 工具直接读快照
+prefetcher = FeedPrefetcher(
+    RSS_DICT,
+    fetch=_parse_source,
+    intervals=RSS_TTL,
+    default_interval=RSS_DEFAULT_TTL,
+    on_refresh=lambda source, items: _ingest_trends(items),
+    priorities=RSS_PRIORITY,
+    max_concurrency=RSS_CONCURRENCY
+)
+
+
+async def _fetch_trends_from_rss(
+    concurrency: int = RSS_CONCURRENCY,
+    timeout: float = RSS_SOURCE_TIMEOUT
+) -> tuple[list[TrendItem], dict[str, str]]:
+    """
+    Fetch every source in RSS_DICT concurrently and collect partial results.
+
+    Args:
+        concurrency: Maximum number of sources fetched at the same time
+        timeout: Per-source timeout in seconds
+
+    Returns:
+        Tuple of (trends from all healthy sources, {source: error message} for failed ones)
+    """
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+    sources = list(RSS_DICT.items())
+
+    results = await asyncio.gather(
+        *(_fetch_source(source, url, semaphore, timeout) for source, url in sources),
+        return_exceptions=True
+    )
 
-async def _fetch_trends_from_rss():
     trends = []
-    for source, url in RSS_DICT.items():
-        items = await parse_feeds(url, source)
+    errors = {}
+    for (source, url), result in zip(sources, results):
+        if isinstance(result, BaseException):
+            if isinstance(result, asyncio.TimeoutError):
+                errors[source] = f"Timed out after {timeout}s"
+            elif isinstance(result, CircuitOpenError):
+                errors[source] = f"Skipped: {result}"
+            else:
+                errors[source] = f"{type(result).__name__}: {result}"
+            continue
+
+        trends.extend(result)
+    return trends, errors
+
+
+# 工具参数 (JSON Schema 形式, 这样参数都是可选的)
+FETCH_TRENDS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "limit": {
+            "type": "integer",
+            "description": f"Maximum number of trends to return (default {RSS_DEFAULT_LIMIT}, max {RSS_MAX_LIMIT})."
+        },
+        "offset": {
+            "type": "integer",
+            "description": "Number of matching trends to skip; pass the previous next_offset to page through results."
+        },
+        "source": {
+            "type": "string",
+            "description": f"Only return trends from this source. Available: {', '.join(RSS_DICT)}."
+        },
+        "since": {
+            "type": "string",
+            "description": "Only return trends published at or after this time (ISO 8601, e.g. 2025-10-20T08:00:00Z)."
+        },
+        "since_hours": {
+            "type": "number",
+            "description": "Only return trends published in the last N hours."
+        },
+        "order": {
+            "type": "string",
+            "enum": ["feed", "newest"],
+            "description": "'feed' keeps feed order for the latest fetch; 'newest' returns the newest trends across all sources, including earlier fetches."
+        },
+        "keyword": {
+            "type": "string",
+            "description": "Only return trends whose title contains every word of this keyword (case-insensitive)."
+        },
+        "cluster": {
+            "type": "boolean",
+            "description": "Collapse near-duplicate headlines from different sources into one trend with its source_count."
+        },
+        "only_new": {
+            "type": "boolean",
+            "description": "Only return trends that were not returned by any previous call."
+        },
+        "rank": {
+            "type": "boolean",
+            "description": "Return the hottest stories across all fetches (recency, number of sources and number of fetches it reappeared in), one per cluster, hottest first."
+        }
+    }
+}
+
+# 快照对应的索引, 只在预取版本变化时重建
+_snapshot_index: tuple[int, TrendIndex] | None = None
+
 
-        for item in items:
-            trends.append(item)
-    return trends
+def _get_snapshot_index() -> TrendIndex:
+    """
+    Index over the prefetcher snapshot, rebuilt only when the snapshot changed.
+    """
+    global _snapshot_index
+    if _snapshot_index is None or _snapshot_index[0] != prefetcher.version:
+        items, _, _ = prefetcher.snapshot()
+        _snapshot_index = (prefetcher.version, TrendIndex(items))
+    return _snapshot_index[1]
 
 
-@tool("fetch_trends_from_rss", "Fetching heated topics from selected rss source.", {})
+def _parse_since(since: Any) -> float | None:
+    """
+    Parse the `since` argument (ISO 8601 / RFC 822 string or epoch seconds).
+    """
+    if since is None or since == '':
+        return None
+    if isinstance(since, (int, float)):
+        return float(since)
+    timestamp = parse_published(str(since))
+    if timestamp is None:
+        raise ValueError(f"Invalid since value: {since!r}. Expected ISO 8601, e.g. 2025-10-20T08:00:00Z")
+    return timestamp
+
+
+def _trend_payload(trend: TrendItem, with_cluster: bool, hotness: float | None = None) -> dict:
+    """
+    Serialise a trend for the tool result, with cluster stats if requested.
+    """
+    payload = trend.to_dict()
+    if with_cluster:
+        headline_cluster = headline_clusters.cluster_of(trend)
+        if headline_cluster is not None:
+            payload['source_count'] = headline_cluster.source_count
+            payload['cluster_size'] = headline_cluster.size
+            payload['appearances'] = headline_cluster.appearances
+    if hotness is not None:
+        # 有效数字而不是小数位, 旧新闻的热度可能非常小
+        payload['hotness'] = float(f"{hotness:.4g}")
+    return payload
+
+
+def _ranked_trends(
+    count: int,
+    source: str | None,
+    since: float | None,
+    keyword: str | None,
+    only_new: bool
+) -> list[tuple[TrendItem, float]]:
+    """
+    The `count` hottest clusters matching the filters, as (representative, hotness).
+    """
+    words = tokenize(keyword) if keyword and keyword.strip() else None
+
+    def matches(headline_cluster) -> bool:
+        item = headline_cluster.representative
+        if source and source not in headline_cluster.sources:
+            return False
+        if since is not None and trend_ranker.newest_ts[headline_cluster.cluster_id] < since:
+            return False
+        if words and not title_matches(item.title, words):
+            return False
+        return not (only_new and seen_index.is_seen(item))
+
+    return [
+        (headline_cluster.representative, hotness)
+        for headline_cluster, hotness in trend_ranker.top(count, matches)
+    ]
+
+
+@tool("fetch_trends_from_rss", "Fetching heated topics from selected rss source.", FETCH_TRENDS_SCHEMA)
 async def fetch_trends_from_rss(args: dict[str: Any]):
     try:
-        all_trends = await _fetch_trends_from_rss()
-        print(f"DEBUG: Fetched {len(all_trends)} trends")  # 调试信息
+        limit = min(max(int(args.get('limit') or RSS_DEFAULT_LIMIT), 1), RSS_MAX_LIMIT)
+        offset = max(int(args.get('offset') or 0), 0)
+        source = args.get('source') or None
+        since = _parse_since(args.get('since'))
+        if args.get('since_hours'):
+            since = max(since or 0.0, time.time() - float(args['since_hours']) * 3600)
+        order = args.get('order') or 'feed'
+        keyword = args.get('keyword') or None
+        only_new = bool(args.get('only_new', False))
+        cluster = bool(args.get('cluster', False))
+        rank = bool(args.get('rank', False))
+
+        # 预取在跑就直接读内存快照, 否则 (比如单独调试时) 现场抓取
+        if prefetcher.running and prefetcher.has_snapshot():
+            index = _get_snapshot_index()
+            errors, snapshot_age = prefetcher.status()
+        else:
+            all_trends, errors = await _fetch_trends_from_rss()
+            _ingest_trends(all_trends)
+            index = TrendIndex(all_trends)
+            snapshot_age = 0.0
+        print(f"DEBUG: Fetched {len(index)} trends, {len(errors)} source(s) failed")  # 调试信息
+
+        hotness = {}
+        if rank:
+            # 热度排名: 直接从排名堆里取前 offset + limit 个聚类, 不扫描全部历史
+            # 多取一条, 只用来判断是否还有下一页
+            ranked = _ranked_trends(offset + limit + 1, source, since, keyword, only_new)
+            hotness = {id(item): score for item, score in ranked}
+            matched_trends = [item for item, _ in ranked]
+            cluster = True
+        elif order == 'newest':
+            # 按时间从新到旧, 覆盖所有源和历史抓取
+            matched_trends = trend_timeline.query(since=since, source=source, keyword=keyword)
+        else:
+            matched = index.query(source=source, since=since, keyword=keyword)
+            matched_trends = None
+
+        # 同一新闻的不同标题只保留一条代表
+        if cluster and not rank:
+            if matched_trends is None:
+                matched_trends = index.take(matched)
+            matched_trends = [item for item, _ in headline_clusters.representatives(matched_trends)]
+
+        if only_new and not rank:
+            # offset 按过滤前的列表计数: 上一页刚标记为已读的条目不会让后面的条目错位
+            if matched_trends is None:
+                matched_trends = index.take(matched)
+            matched_count = len(matched_trends)
+            trends = []
+            next_offset = offset
+            for item in matched_trends[offset:]:
+                next_offset += 1
+                if not seen_index.is_seen(item):
+                    trends.append(item)
+                    if len(trends) == limit:
+                        break
+        elif matched_trends is not None:
+            matched_count = len(matched_trends)
+            trends = matched_trends[offset:offset + limit]
+            next_offset = offset + len(trends)
+        else:
+            matched_count = len(matched)
+            trends = index.take(matched[offset:offset + limit])
+            next_offset = offset + len(trends)
 
-        # 暂时先返回前几条 方便调试
-        trends = all_trends[:5]
+        # 记录本次返回的条目, 下次 only_new 时跳过
+        seen_index.mark_seen(trends)
 
         # 按照 SDK 要求的格式返回
         result = {
-            "total_count": len(all_trends),
+            "total_count": len(index),
+            # 排名模式下只知道是否还有更多, 不统计全部匹配数
+            "matched_count": None if rank else matched_count,
             "returned_count": len(trends),
-            "trends": trends
+            "offset": offset,
+            # 没有更多结果时为 None
+            "next_offset": next_offset if next_offset < matched_count else None,
+            "trends": [_trend_payload(trend, cluster, hotness.get(id(trend))) for trend in trends],
+            # 失败的源单独列出, 不影响其它源的结果
+            "failed_sources": errors,
+            # 熔断中的 host 及距离下次重试的秒数
+            "skipped_hosts": host_health.open_hosts(),
+            "snapshot_age_seconds": round(snapshot_age, 1) if snapshot_age is not None else None
         }
 
         # 注意啊，有标准形式 {"content": [{"type": "text", "text": "..."}]}
         return {
             "content": [{
                 "type": "text",
-                "text": json.dumps(result, ensure_ascii=False, indent=2)
+                # 紧凑格式, 少占模型的 token
+                "text": json.dumps(result, ensure_ascii=False, separators=(',', ':'))
             }]
         }
     except Exception as e:
@@ -64,11 +418,11 @@ topic_server = create_sdk_mcp_server(
 )
 
 if __name__ == "__main__":
-    import asyncio
     # trends = fetch_trends()
     # print(json.dumps(trends, ensure_ascii=False, indent=2))
 
-    trends = asyncio.run(_fetch_trends_from_rss())
+    trends, errors = asyncio.run(_fetch_trends_from_rss())
+    print(f"Failed sources: {errors}")
     for item in trends:
-        print(json.dumps(item, indent=4))
+        print(json.dumps(item.to_dict(), indent=4))
         break
\ No newline at end of file
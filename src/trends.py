@@ -0,0 +1,254 @@
+"""
+In-memory indexes over fetched trends.
+
+`TrendIndex` is built once per fetch (or prefetch snapshot) so the tool can
+answer source / time / keyword queries and page through results without
+rescanning every item on each call. Items are held column-wise in a
+TrendBatch; TrendItem records are only materialised for the returned page.
+
+`TrendTimeline` is the merged history across sources and fetches, kept
+sorted by publish time as new items arrive, for "newest N" and time-window
+queries over everything seen so far.
+"""
+import heapq
+import re
+from bisect import bisect_left
+from operator import itemgetter
+from typing import Iterable
+
+from models import TrendBatch, TrendItem
+
+# Word tokens used for keyword lookups (ASCII and CJK runs alike)
+TOKEN_PATTERN = re.compile(r'\w+')
+
+# Maximum number of items kept in the timeline; the oldest are dropped first
+TREND_HISTORY_LIMIT = 50_000
+
+# Up to this many new items are inserted one by one; larger batches are merged
+TIMELINE_INSORT_MAX = 32
+
+
+def tokenize(text: str) -> list[str]:
+    return TOKEN_PATTERN.findall((text or '').lower())
+
+
+# CJK text has no spaces, so a CJK word is usually part of a longer token
+CJK_PATTERN = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff]')
+
+
+def is_substring_word(word: str) -> bool:
+    """
+    Whether a keyword word matches anywhere inside a title (CJK) rather
+    than only as a whole token (everything else, so "ai" doesn't match "Spain").
+    """
+    return CJK_PATTERN.search(word) is not None
+
+
+def title_matches(title: str, words: list[str]) -> bool:
+    """
+    Whether `title` contains every keyword word (see is_substring_word).
+
+    TrendIndex._match_keyword applies the same rule through its postings.
+    """
+    lowered = (title or '').lower()
+    tokens = set(tokenize(lowered))
+    return all(word in lowered if is_substring_word(word) else word in tokens for word in words)
+
+
+class TrendIndex:
+    """
+    Query index over a batch of trend items.
+
+    Positions refer to the original item order, which is also the order in
+    which query results are returned unless `order="newest"` is requested.
+    """
+
+    def __init__(self, items: Iterable[TrendItem]):
+        self.batch = items if isinstance(items, TrendBatch) else TrendBatch(items)
+        self.postings: dict[str, set[int]] = {}
+
+        batch = self.batch
+        for pos in range(len(batch)):
+            for token in set(tokenize(batch.titles[pos])):
+                self.postings.setdefault(token, set()).add(pos)
+
+        # Dated positions sorted by publish time, for since / newest queries
+        published_ts = batch.published_ts
+        self.by_time = sorted(
+            (pos for pos in range(len(batch)) if published_ts[pos] == published_ts[pos]),
+            key=published_ts.__getitem__
+        )
+        self.sorted_ts = [published_ts[pos] for pos in self.by_time]
+
+    def __len__(self) -> int:
+        return len(self.batch)
+
+    @property
+    def sources(self) -> list[str]:
+        return sorted(self.batch.source_names)
+
+    def _match_keyword(self, keyword: str, candidates: set[int] | None) -> set[int]:
+        """
+        Positions whose title contains every word of `keyword`, by the same
+        rule as title_matches.
+
+        Whole words are answered from the postings; CJK words, which may be
+        part of a longer token, are found by a substring scan.
+        """
+        titles = self.batch.titles
+        matched = candidates
+        for word in tokenize(keyword):
+            if is_substring_word(word):
+                pool = matched if matched is not None else range(len(titles))
+                positions = {pos for pos in pool if word in titles[pos].lower()}
+            else:
+                positions = self.postings.get(word, set())
+            matched = positions if matched is None else matched & positions
+            if not matched:
+                break
+        return matched if matched is not None else set(range(len(titles)))
+
+    def query(
+        self,
+        source: str | None = None,
+        since: float | None = None,
+        keyword: str | None = None,
+        order: str = 'feed'
+    ) -> list[int]:
+        """
+        Select items matching all given filters.
+
+        Args:
+            source: Only items from this source
+            since: Only items published at or after this epoch time
+                (items without a parseable date are excluded)
+            keyword: Only items whose title contains every word of the keyword
+            order: 'feed' for original order, 'newest' for newest first
+                (undated items are excluded)
+
+        Returns:
+            Positions of matching items
+        """
+        candidates = None
+        if source:
+            candidates = set(self.batch.positions_for_source(source))
+
+        if since is not None:
+            recent = set(self.by_time[bisect_left(self.sorted_ts, since):])
+            candidates = recent if candidates is None else candidates & recent
+
+        if keyword and keyword.strip():
+            candidates = self._match_keyword(keyword, candidates)
+
+        if order == 'newest':
+            if candidates is None:
+                return self.by_time[::-1]
+            return [pos for pos in reversed(self.by_time) if pos in candidates]
+
+        if candidates is None:
+            return list(range(len(self.batch)))
+        return sorted(candidates)
+
+    def take(self, positions: Iterable[int]) -> list[TrendItem]:
+        return self.batch.take(positions)
+
+
+class TrendTimeline:
+    """
+    Merged, time-sorted history of trend items across all sources.
+
+    Items are deduplicated by TrendItem.key; undated items are skipped since
+    they can't be placed on the timeline. Small batches are inserted with
+    bisect, large ones are merged in a single linear pass.
+    """
+
+    def __init__(self, max_items: int = TREND_HISTORY_LIMIT):
+        self.max_items = max_items
+        self.timestamps: list[float] = []  # ascending
+        self.items: list[TrendItem] = []
+        self.keys: set[tuple[str, str]] = set()  # TrendItem.key of each item
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def insert_many(self, items: Iterable[TrendItem]) -> int:
+        """
+        Add new items to the timeline.
+
+        Args:
+            items: Items from a fetch; already known and undated ones are ignored
+
+        Returns:
+            Number of items actually inserted
+        """
+        new_items = []
+        for item in items:
+            key = item.key
+            if item.published_ts is None or key in self.keys:
+                continue
+            self.keys.add(key)
+            new_items.append(item)
+
+        if not new_items:
+            return 0
+
+        if len(new_items) <= TIMELINE_INSORT_MAX:
+            for item in new_items:
+                pos = bisect_left(self.timestamps, item.published_ts)
+                self.timestamps.insert(pos, item.published_ts)
+                self.items.insert(pos, item)
+        else:
+            new_items.sort(key=lambda item: item.published_ts)
+            merged = list(heapq.merge(
+                zip(self.timestamps, self.items),
+                ((item.published_ts, item) for item in new_items),
+                key=itemgetter(0)
+            ))
+            self.timestamps = [ts for ts, _ in merged]
+            self.items = [item for _, item in merged]
+
+        self._trim()
+        return len(new_items)
+
+    def _trim(self):
+        excess = len(self.items) - self.max_items
+        if excess <= 0:
+            return
+        for item in self.items[:excess]:
+            self.keys.discard(item.key)
+        del self.timestamps[:excess]
+        del self.items[:excess]
+
+    def newest(self, n: int) -> list[TrendItem]:
+        """
+        The `n` most recently published items across all sources, newest first.
+        """
+        return self.items[-n:][::-1] if n > 0 else []
+
+    def query(
+        self,
+        since: float | None = None,
+        source: str | None = None,
+        keyword: str | None = None
+    ) -> list[TrendItem]:
+        """
+        Items in the time window, newest first, optionally filtered.
+
+        Args:
+            since: Only items published at or after this epoch time
+            source: Only items from this source
+            keyword: Only items whose title contains every word of the keyword
+
+        Returns:
+            Matching items, newest first
+        """
+        start = bisect_left(self.timestamps, since) if since is not None else 0
+        window = self.items[start:]
+        window.reverse()
+
+        if source:
+            window = [item for item in window if item.source == source]
+        if keyword and keyword.strip():
+            words = tokenize(keyword)
+            window = [item for item in window if title_matches(item.title, words)]
+        return window
@@ -0,0 +1,286 @@
+"""
+Persistent caches of uploaded images.
+
+`UploadCache` maps (sha256 of the image bytes, app_token, parent_type) to the
+file_token Feishu returned, so identical bytes are never uploaded twice to
+the same Base. `UrlTokenCache` sits in front of the download: it maps a
+canonical image URL to the file_token it produced, for a limited time, so a
+repeated URL needs no network I/O at all. `PartialUploadStore` records the
+progress of chunked uploads so they can resume after a failure.
+
+All three are backed by SQLite and mirrored into dicts for O(1) lookups
+(the token caches with hit and miss counters for the current process).
+Writes are committed on a background thread (see SQLiteWriter), so recording
+an upload or an uploaded part never blocks the event loop.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from sqlite_writer import SQLiteWriter
+
+load_dotenv()
+
+UPLOAD_CACHE_PATH = os.getenv(
+    "UPLOAD_CACHE_PATH",
+    str(Path(__file__).resolve().parent.parent / ".cache" / "upload_cache.db")
+)
+
+# How long a URL keeps mapping to the same file_token (the image behind it may change)
+URL_TOKEN_TTL = float(os.getenv("URL_TOKEN_TTL", str(7 * 24 * 3600)))
+# Unfinished chunked uploads older than this are restarted rather than resumed
+PARTIAL_UPLOAD_TTL = float(os.getenv("PARTIAL_UPLOAD_TTL", str(24 * 3600)))
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class UploadCache:
+    """
+    file_tokens of uploaded images, keyed by content hash and upload target.
+    """
+
+    def __init__(self, path: str = UPLOAD_CACHE_PATH):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS uploaded_images ("
+            " sha256 TEXT NOT NULL,"
+            " app_token TEXT NOT NULL,"
+            " parent_type TEXT NOT NULL,"
+            " file_token TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " uploaded_at REAL NOT NULL,"
+            " PRIMARY KEY (sha256, app_token, parent_type))"
+        )
+
+        self.tokens: dict[tuple[str, str, str], str] = {
+            (sha256, app_token, parent_type): file_token
+            for sha256, app_token, parent_type, file_token in self.conn.execute(
+                "SELECT sha256, app_token, parent_type, file_token FROM uploaded_images"
+            )
+        }
+        self.hits = 0
+        self.misses = 0
+        self._writer = SQLiteWriter(self.conn, 'upload-cache')
+
+    def get(self, sha256: str, app_token: str, parent_type: str) -> str | None:
+        """
+        Look up the file_token of previously uploaded bytes, counting the hit or miss.
+
+        Args:
+            sha256: Hex SHA-256 of the image bytes
+            app_token: Base the image was uploaded to
+            parent_type: Upload point type
+
+        Returns:
+            file_token, or None if these bytes were never uploaded there
+        """
+        file_token = self.tokens.get((sha256, app_token, parent_type))
+        if file_token is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return file_token
+
+    def put(self, sha256: str, app_token: str, parent_type: str, file_token: str, size: int):
+        """
+        Record a successful upload, in memory at once and on disk in the background.
+        """
+        self.tokens[(sha256, app_token, parent_type)] = file_token
+        self._writer.execute(
+            "INSERT OR REPLACE INTO uploaded_images"
+            " (sha256, app_token, parent_type, file_token, size, uploaded_at)"
+            " VALUES (?, ?, ?, ?, ?, ?)",
+            (sha256, app_token, parent_type, file_token, size, time.time())
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.tokens)}
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        self.conn.close()
+
+
+class UrlTokenCache:
+    """
+    file_tokens by canonical image URL and upload target, expiring after `ttl` seconds.
+
+    Args:
+        path: SQLite database file (':memory:' for a throwaway cache)
+        ttl: Seconds an entry stays valid
+    """
+
+    def __init__(self, path: str = UPLOAD_CACHE_PATH, ttl: float = URL_TOKEN_TTL):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS url_tokens ("
+            " url TEXT NOT NULL,"
+            " app_token TEXT NOT NULL,"
+            " parent_type TEXT NOT NULL,"
+            " file_token TEXT NOT NULL,"
+            " cached_at REAL NOT NULL,"
+            " PRIMARY KEY (url, app_token, parent_type))"
+        )
+
+        # Expired rows are dropped on load rather than kept around
+        cutoff = time.time() - ttl
+        with self.conn:
+            self.conn.execute("DELETE FROM url_tokens WHERE cached_at < ?", (cutoff,))
+        self.tokens: dict[tuple[str, str, str], tuple[str, float]] = {
+            (url, app_token, parent_type): (file_token, cached_at)
+            for url, app_token, parent_type, file_token, cached_at in self.conn.execute(
+                "SELECT url, app_token, parent_type, file_token, cached_at FROM url_tokens"
+            )
+        }
+        self.hits = 0
+        self.misses = 0
+        self._writer = SQLiteWriter(self.conn, 'url-token-cache')
+
+    def get(self, url: str, app_token: str, parent_type: str) -> str | None:
+        """
+        Look up the file_token a canonical URL produced, if it hasn't expired.
+
+        Args:
+            url: Canonical image URL (see canonicalize_image_url)
+            app_token: Base the image was uploaded to
+            parent_type: Upload point type
+
+        Returns:
+            file_token, or None on a miss
+        """
+        entry = self.tokens.get((url, app_token, parent_type))
+        if entry is None or time.time() - entry[1] > self.ttl:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry[0]
+
+    def put(self, url: str, app_token: str, parent_type: str, file_token: str):
+        now = time.time()
+        self.tokens[(url, app_token, parent_type)] = (file_token, now)
+        self._writer.execute(
+            "INSERT OR REPLACE INTO url_tokens"
+            " (url, app_token, parent_type, file_token, cached_at)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (url, app_token, parent_type, file_token, now)
+        )
+
+    def stats(self) -> dict[str, int]:
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self.tokens)}
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        self.conn.close()
+
+
+@dataclass
+class PartialUpload:
+    upload_id: str
+    size: int
+    block_size: int
+    block_num: int
+    parts: set[int] = field(default_factory=set)  # seq numbers already uploaded
+
+
+class PartialUploadStore:
+    """
+    Progress of chunked uploads (upload_prepare/upload_part/upload_finish),
+    keyed like UploadCache, so an interrupted upload resumes with the parts
+    that are still missing instead of starting over.
+
+    Args:
+        path: SQLite database file (':memory:' for a throwaway store)
+        ttl: Seconds after which an unfinished upload is started afresh
+    """
+
+    def __init__(self, path: str = UPLOAD_CACHE_PATH, ttl: float = PARTIAL_UPLOAD_TTL):
+        if path != ':memory:':
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS partial_uploads ("
+            " sha256 TEXT NOT NULL,"
+            " app_token TEXT NOT NULL,"
+            " parent_type TEXT NOT NULL,"
+            " upload_id TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " block_size INTEGER NOT NULL,"
+            " block_num INTEGER NOT NULL,"
+            " parts TEXT NOT NULL,"
+            " started_at REAL NOT NULL,"
+            " PRIMARY KEY (sha256, app_token, parent_type))"
+        )
+        with self.conn:
+            self.conn.execute("DELETE FROM partial_uploads WHERE started_at < ?", (time.time() - ttl,))
+
+        self.uploads: dict[tuple[str, str, str], PartialUpload] = {
+            (sha256, app_token, parent_type): PartialUpload(upload_id, size, block_size, block_num, set(json.loads(parts)))
+            for sha256, app_token, parent_type, upload_id, size, block_size, block_num, parts in self.conn.execute(
+                "SELECT sha256, app_token, parent_type, upload_id, size, block_size, block_num, parts"
+                " FROM partial_uploads"
+            )
+        }
+        self._writer = SQLiteWriter(self.conn, 'partial-uploads')
+
+    def get(self, sha256: str, app_token: str, parent_type: str) -> PartialUpload | None:
+        """
+        Progress of an unfinished upload of these bytes to this target, if any.
+        """
+        return self.uploads.get((sha256, app_token, parent_type))
+
+    def start(self, sha256: str, app_token: str, parent_type: str, upload: PartialUpload):
+        self.uploads[(sha256, app_token, parent_type)] = upload
+        self._writer.execute(
+            "INSERT OR REPLACE INTO partial_uploads"
+            " (sha256, app_token, parent_type, upload_id, size, block_size, block_num, parts, started_at)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (sha256, app_token, parent_type, upload.upload_id, upload.size,
+             upload.block_size, upload.block_num, json.dumps(sorted(upload.parts)), time.time())
+        )
+
+    def mark_part(self, sha256: str, app_token: str, parent_type: str, upload: PartialUpload, seq: int):
+        """
+        Record that part `seq` of `upload` arrived.
+        """
+        upload.parts.add(seq)
+        self._writer.execute(
+            "UPDATE partial_uploads SET parts = ?"
+            " WHERE sha256 = ? AND app_token = ? AND parent_type = ? AND upload_id = ?",
+            (json.dumps(sorted(upload.parts)), sha256, app_token, parent_type, upload.upload_id)
+        )
+
+    def discard(self, sha256: str, app_token: str, parent_type: str):
+        """
+        Forget an upload, once finished or no longer resumable.
+        """
+        self.uploads.pop((sha256, app_token, parent_type), None)
+        self._writer.execute(
+            "DELETE FROM partial_uploads WHERE sha256 = ? AND app_token = ? AND parent_type = ?",
+            (sha256, app_token, parent_type)
+        )
+
+    def flush(self):
+        self._writer.flush()
+
+    def close(self):
+        self._writer.close()
+        self.conn.close()
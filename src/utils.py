@@ -1,138 +1,317 @@
 import xml.etree.ElementTree as ET
-from io import BytesIO
+import asyncio
+import contextlib
+import hashlib
 import os
+import random
+import tempfile
+import zlib
+from dataclasses import dataclass
 from pathlib import Path
-from urllib.parse import urlparse
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import AsyncIterator, Awaitable, BinaryIO, Callable, TypeVar
+from urllib.parse import parse_qsl, quote, unquote, urlencode, urlparse, urlunparse
 
 import httpx
 from dotenv import load_dotenv
 
+from byte_budget import ByteBudget
+from catalog import SourceSpec, resolve_source
+from extractors import get_extractor, parse_feed_content
+from feed_cache import FeedCache
+from host_health import parse_retry_after
+from http_client import get_http_client
+from image_transform import transform_enabled, transform_image
+from models import TrendItem
+from perceptual_index import PerceptualIndex, dedup_enabled, hamming_distance, perceptual_hash
+from process_pool import new_process_pool
+from rate_limit import TokenBucket
+from tenant_token import TenantTokenManager
+from upload_cache import PartialUpload, PartialUploadStore, UploadCache, UrlTokenCache, content_hash
+
 load_dotenv()
 
 
-async def parse_feeds(url: str, source: str) -> list[dict]:
+# Where feed XML is parsed: 'inline' on the event loop, 'thread' / 'process'
+# in a worker pool, or 'auto' to offload only payloads of at least
+# FEED_PARSE_OFFLOAD_BYTES (to the process pool when more than one core is available)
+FEED_PARSE_MODE = os.getenv('FEED_PARSE_MODE', 'auto')
+FEED_PARSE_OFFLOAD_BYTES = int(os.getenv('FEED_PARSE_OFFLOAD_BYTES', 256 * 1024))
+FEED_PARSE_WORKERS = int(os.getenv('FEED_PARSE_WORKERS', min(4, os.cpu_count() or 1)))
+
+# Worker pools, created on first use
+_parse_executors: dict[str, Executor] = {}
+
+
+async def parse_feeds(
+    url: str,
+    source: str,
+    cache: FeedCache | None = None,
+    ttl: float | None = None,
+    limit: int | None = None,
+    stream: bool = False,
+    spec: SourceSpec | None = None
+) -> list[TrendItem]:
     """
     Parse RSS/Atom feeds from different sources and extract items.
 
     Args:
         url: The RSS feed URL
-        source: The source type ('reddit' or 'google')
+        source: The source name
+        cache: Optional FeedCache used for conditional GETs and parsed items
+        ttl: Freshness window in seconds; within it the cache is returned without any request
+        limit: Maximum number of items to return (None for all)
+        stream: Parse the response incrementally while it downloads, and stop
+            reading the socket once `limit` items have been emitted. Only
+            pays off for callers that need just the head of a feed: without
+            a limit the body is read in full and parsed per FEED_PARSE_MODE,
+            as if not streaming (unless that mode is 'inline')
+        spec: Source declaration; looked up in the catalog by `source` if omitted
 
     Returns:
-        List of dictionaries containing feed items
+        List of TrendItem records
     """
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url)
-        response.raise_for_status()
-        content = response.content
-
-    # Parse XML from response content
-    tree = ET.parse(BytesIO(content))
-    root = tree.getroot()
-
-    items = []
-
-    if source == 'reddit':
-        # Atom namespace for Reddit feeds
-        ns = {'atom': 'http://www.w3.org/2005/Atom',
-              'media': 'http://search.yahoo.com/mrss/'}
-
-        # Find all entry elements
-        for entry in root.findall('atom:entry', ns):
-            # Extract title
-            title_elem = entry.find('atom:title', ns)
-            title = title_elem.text if title_elem is not None else ''
-
-            # Extract link (URL)
-            link_elem = entry.find('atom:link', ns)
-            url = link_elem.get('href') if link_elem is not None else ''
-
-            # Extract content as description (HTML)
-            content_elem = entry.find('atom:content', ns)
-            description = content_elem.text if content_elem is not None else ''
-
-            # Extract published date
-            published_elem = entry.find('atom:published', ns)
-            published = published_elem.text if published_elem is not None else ''
-
-            # Extract image URL from media:thumbnail or media:content
-            image_url = ''
-            media_thumbnail = entry.find('media:thumbnail', ns)
-            if media_thumbnail is not None:
-                image_url = media_thumbnail.get('url', '')
+    if cache is not None and cache.is_fresh(url, ttl):
+        return cache.items(url)[:limit]
+
+    spec = spec or resolve_source(source)
+
+    headers = cache.conditional_headers(url) if cache is not None else {}
+    client = get_http_client(url)
+
+    if stream:
+        async with client.stream('GET', url, headers=headers) as response:
+            # 304: feed unchanged, reuse the cached items without parsing again
+            if response.status_code == 304 and cache is not None and cache.get(url) is not None:
+                return cache.touch(url)[:limit]
+
+            response.raise_for_status()
+            if limit is None and FEED_PARSE_MODE != 'inline':
+                # Every item is needed anyway: read the body and let the pool parse it
+                items = await parse_feed_content_async(await response.aread(), source, spec=spec)
             else:
-                media_content = entry.find('media:content', ns)
-                if media_content is not None:
-                    image_url = media_content.get('url', '')
-
-            # Create unified item structure
-            item = {
-                'title': title,
-                'url': url,
-                # 'description': description,
-                'published': published,
-                'image_url': image_url
-            }
+                items = [item async for item in iter_feed_items(response, source, limit, spec)]
+
+        # A truncated feed must not replace the full cached entry
+        if cache is not None and (limit is None or len(items) < limit):
+            cache.store(
+                url,
+                items,
+                etag=response.headers.get('etag'),
+                last_modified=response.headers.get('last-modified')
+            )
+        return items
 
-            items.append(item)
-
-    elif source in ['google', 'tiktok', 'zhihu', 'nytimes']:
-        # RSS 2.0 format for Google News, TikTok, Zhihu, NYT, etc.
-        # Define namespaces for media elements
-        ns = {'media': 'http://search.yahoo.com/mrss/',
-              'content': 'http://purl.org/rss/1.0/modules/content/',
-              'dc': 'http://purl.org/dc/elements/1.1/'}
-
-        # Find all item elements (RSS 2.0 uses 'item' instead of 'entry')
-        for item_elem in root.findall('.//item'):
-            # Extract title
-            title_elem = item_elem.find('title')
-            title = title_elem.text if title_elem is not None else ''
-
-            # Extract link (URL)
-            link_elem = item_elem.find('link')
-            url = link_elem.text if link_elem is not None else ''
-
-            # Extract description (contains related articles in HTML)
-            desc_elem = item_elem.find('description')
-            description = desc_elem.text if desc_elem is not None else ''
-
-            # Extract published date (pubDate in RSS 2.0)
-            pub_date_elem = item_elem.find('pubDate')
-            published = pub_date_elem.text if pub_date_elem is not None else ''
-
-            # Extract image URL from multiple possible sources
-            image_url = ''
-
-            # Try media:thumbnail first
-            media_thumbnail = item_elem.find('media:thumbnail', ns)
-            if media_thumbnail is not None:
-                image_url = media_thumbnail.get('url', '')
-
-            # Try media:content if no thumbnail
-            if not image_url:
-                media_content = item_elem.find('media:content', ns)
-                if media_content is not None:
-                    image_url = media_content.get('url', '')
-
-            # Try enclosure tag (common in RSS 2.0)
-            if not image_url:
-                enclosure = item_elem.find('enclosure')
-                if enclosure is not None and enclosure.get('type', '').startswith('image/'):
-                    image_url = enclosure.get('url', '')
-
-            # Create unified item structure
-            item = {
-                'title': title,
-                'url': url,
-                # 'description': description,
-                'published': published,
-                'image_url': image_url
-            }
+    response = await client.get(url, headers=headers)
+
+    # 304: feed unchanged, reuse the cached items without parsing again
+    if response.status_code == 304 and cache is not None and cache.get(url) is not None:
+        return cache.touch(url)[:limit]
+
+    response.raise_for_status()
+    items = await parse_feed_content_async(response.content, source, spec=spec)
+
+    if cache is not None:
+        cache.store(
+            url,
+            items,
+            etag=response.headers.get('etag'),
+            last_modified=response.headers.get('last-modified')
+        )
+    return items[:limit]
+
+
+async def iter_feed_items(
+    response: httpx.Response,
+    source: str,
+    limit: int | None = None,
+    spec: SourceSpec | None = None
+) -> AsyncIterator[TrendItem]:
+    """
+    Incrementally parse a streaming feed response, yielding each item as soon
+    as its <item>/<entry> element closes.
+
+    Processed elements are detached from the tree so memory stays flat, and
+    iteration stops (leaving the rest of the body unread) once `limit` items
+    have been yielded.
+
+    Args:
+        response: An open streaming httpx response
+        source: The source name
+        limit: Maximum number of items to yield (None for all)
+        spec: Source declaration; looked up in the catalog by `source` if omitted
 
-            items.append(item)
+    Yields:
+        TrendItem for each feed item
+    """
+    extractor = get_extractor(spec or resolve_source(source))
+    item_tag, extract = extractor.item_tag, extractor.extract
+
+    parser = ET.XMLPullParser(events=('start', 'end'))
+    # Open elements, so a finished item can be removed from its parent
+    stack = []
+    count = 0
+
+    async for chunk in response.aiter_bytes():
+        parser.feed(chunk)
+        for event, elem in parser.read_events():
+            if event == 'start':
+                stack.append(elem)
+                continue
+
+            stack.pop()
+            if elem.tag != item_tag:
+                continue
+
+            yield extract(elem)
+            count += 1
+
+            # Drop the processed item so the tree doesn't grow with the feed
+            elem.clear()
+            if stack:
+                stack[-1].remove(elem)
+
+            if limit is not None and count >= limit:
+                return
+
+
+def _parse_mode(size: int, mode: str | None = None) -> str:
+    """
+    Resolve the parse mode for a payload of `size` bytes.
+    """
+    mode = mode or FEED_PARSE_MODE
+    if mode != 'auto':
+        return mode
+    if size < FEED_PARSE_OFFLOAD_BYTES:
+        return 'inline'
+    return 'process' if FEED_PARSE_WORKERS > 1 else 'thread'
+
+
+def _get_parse_executor(mode: str) -> Executor:
+    executor = _parse_executors.get(mode)
+    if executor is None:
+        if mode == 'process':
+            executor = new_process_pool(FEED_PARSE_WORKERS)
+        else:
+            executor = ThreadPoolExecutor(max_workers=FEED_PARSE_WORKERS, thread_name_prefix='feed-parse')
+        _parse_executors[mode] = executor
+    return executor
+
+
+async def parse_feed_content_async(
+    content: bytes,
+    source: str,
+    mode: str | None = None,
+    spec: SourceSpec | None = None
+) -> list[TrendItem]:
+    """
+    Parse a raw feed without blocking the event loop on large payloads.
+
+    Args:
+        content: Raw XML bytes of the feed
+        source: The source name
+        mode: Override FEED_PARSE_MODE ('inline', 'thread', 'process' or 'auto')
+        spec: Source declaration; looked up in the catalog by `source` if omitted
+
+    Returns:
+        List of TrendItem records
+    """
+    spec = spec or resolve_source(source)
+    mode = _parse_mode(len(content), mode)
+    if mode == 'inline':
+        return parse_feed_content(content, source, spec)
+    if mode not in ('thread', 'process'):
+        raise ValueError(f"Unknown feed parse mode: {mode!r}")
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_parse_executor(mode), parse_feed_content, content, source, spec)
+
+
+def shutdown_parse_pools():
+    """
+    Stop the feed parsing worker pools (call on application shutdown).
+    """
+    for executor in _parse_executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _parse_executors.clear()
 
-    return items
+
+# Query parameters that only track the click and never change the content
+TRACKING_PARAMS = {'fbclid', 'gclid', 'igshid', 'mc_cid', 'mc_eid', 'ref', 'smid', 'cmpid'}
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Normalise a URL so that equivalent spellings compare equal.
+
+    Lowercases scheme and host, drops default ports, fragments, trailing
+    slashes and tracking parameters (utm_*, fbclid, ...), and sorts the
+    remaining query parameters.
+
+    Args:
+        url: URL to normalise
+
+    Returns:
+        Canonical URL string
+    """
+    parsed = urlparse(url.strip())
+    scheme = parsed.scheme.lower()
+    host = (parsed.hostname or '').lower()
+
+    port = parsed.port
+    if port and not ((scheme == 'http' and port == 80) or (scheme == 'https' and port == 443)):
+        host = f"{host}:{port}"
+
+    path = parsed.path.rstrip('/') or '/'
+
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if not key.lower().startswith('utm_') and key.lower() not in TRACKING_PARAMS
+    )
+
+    return urlunparse((scheme, host, path, '', urlencode(query), ''))
+
+
+# Query parameters that only defeat caches and never change the image
+CACHE_BUSTER_PARAMS = {'_', 'cb', 'cachebuster', 'cache_buster', 'nocache', 'rand', 'ts', 'timestamp'}
+
+# Characters left unescaped when re-encoding a decoded path (RFC 3986 pchar and '/')
+PATH_SAFE_CHARS = "/:@!$&'()*+,;=~"
+
+
+def canonicalize_image_url(url: str) -> str:
+    """
+    Normalise an image URL for cache lookups.
+
+    On top of canonicalize_url, the path's percent-encoding is normalised
+    (models sometimes send `wp-content%2Fuploads%2F...` and sometimes the
+    decoded form), and cache-buster parameters are dropped: known names such
+    as `cb` or `_`, and bare values without a key such as `&1760956390`.
+
+    The URL is split before anything is decoded, so an encoded `?`, `&` or
+    `=` stays part of the path or value it belongs to. The one exception is
+    a query with no literal `=` that decodes to parameters
+    (`?quality%3D90%26`), which is a whole query string encoded once more.
+
+    Args:
+        url: Image URL as received
+
+    Returns:
+        Canonical URL string
+    """
+    parsed = urlparse(url.strip())
+    raw_query = parsed.query
+    if '=' not in raw_query and '=' in unquote(raw_query):
+        raw_query = unquote(raw_query)
+
+    query = [
+        (key, value)
+        for key, value in parse_qsl(raw_query, keep_blank_values=True)
+        if key.lower() not in CACHE_BUSTER_PARAMS and not (value == '' and (key == '' or key.isdigit()))
+    ]
+    path = quote(unquote(parsed.path), safe=PATH_SAFE_CHARS)
+    return canonicalize_url(urlunparse(parsed._replace(path=path, query=urlencode(query))))
 
 
 # Example usage
@@ -185,22 +364,112 @@ if __name__ == '__main__':
         # Print first 2 items
         for i, item in enumerate(google_items[:2], 1):
             print(f"--- Google News Item {i} ---")
-            print(f"Title: {item['title']}")
-            print(f"URL: {item['url'][:80]}...")
-            print(f"Published: {item['published']}")
-            print(f"Image URL: {item.get('image_url', 'No image')}")
+            print(f"Title: {item.title}")
+            print(f"URL: {item.url[:80]}...")
+            print(f"Published: {item.published}")
+            print(f"Image URL: {item.image_url or 'No image'}")
             print()
 
     asyncio.run(test_feeds())
 
 
+# Feishu allows 5 drive/v1/medias/upload_all calls per second per app
+FEISHU_UPLOAD_QPS = float(os.getenv("FEISHU_UPLOAD_QPS", "5"))
+# upload_all accepts files up to 20 MB; larger ones (bitable_file attachments) are uploaded in parts
+FEISHU_UPLOAD_ALL_MAX_BYTES = 20 * 1024 * 1024
+# Parts of one chunked upload sent at the same time
+FEISHU_UPLOAD_PART_CONCURRENCY = int(os.getenv("FEISHU_UPLOAD_PART_CONCURRENCY", "4"))
+
+# Upload rate limiters, one per APP_ID
+_upload_limiters: dict[str, TokenBucket] = {}
+
+
+def get_upload_limiter(app_id: str | None = None) -> TokenBucket:
+    """
+    The shared upload_all rate limiter for an app (defaults to env APP_ID).
+    """
+    app_id = app_id or os.getenv("APP_ID") or ''
+    limiter = _upload_limiters.get(app_id)
+    if limiter is None:
+        limiter = _upload_limiters[app_id] = TokenBucket(FEISHU_UPLOAD_QPS)
+    return limiter
+
+
+async def request_tenant_access_token(app_id: str, app_secret: str) -> tuple[str, float]:
+    """
+    Request a new tenant_access_token from Feishu (no caching).
+
+    Args:
+        app_id: Feishu app ID
+        app_secret: Feishu app secret
+
+    Returns:
+        Tuple of (tenant_access_token, seconds until it expires)
+
+    Raises:
+        httpx.HTTPError: If the request fails
+    """
+    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+
+    payload = {
+        "app_id": app_id,
+        "app_secret": app_secret
+    }
+
+    client = get_http_client(url)
+    response = await client.post(url, json=payload)
+    response.raise_for_status()
+    result = response.json()
+
+    if result.get("code") != 0:
+        raise Exception(f"Failed to get tenant_access_token: {result.get('msg')}")
+
+    return result["tenant_access_token"], float(result.get("expire", 7200))
+
+
+# Feishu error codes meaning the tenant_access_token is missing, invalid or expired
+FEISHU_TOKEN_ERROR_CODES = {99991661, 99991663, 99991677}
+# Request frequency limit exceeded
+FEISHU_RATE_LIMIT_CODES = {99991400}
+# Error codes worth retrying: internal error, "please retry", rate limit, stale token
+FEISHU_RETRYABLE_CODES = {1061001, 1061045} | FEISHU_RATE_LIMIT_CODES | FEISHU_TOKEN_ERROR_CODES
+
+
+class LarkAPIError(Exception):
+    """
+    A Feishu API call answered with a non-zero `code`.
+
+    Args:
+        code: Feishu error code (None if the response had none)
+        msg: Error message from the response
+        retry_after: Seconds the API asked us to wait, if it said so
+    """
+
+    def __init__(self, code: int | None, msg: str, retry_after: float | None = None):
+        super().__init__(f"Feishu API error {code}: {msg}")
+        self.code = code
+        self.msg = msg
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.code in FEISHU_RETRYABLE_CODES
+
+# Tokens cached per APP_ID and refreshed before they expire
+tenant_tokens = TenantTokenManager(fetch=request_tenant_access_token)
+
+
 async def get_tenant_access_token(app_id: str = None, app_secret: str = None) -> str:
     """
     Get Feishu tenant_access_token for API authentication.
 
+    The token is cached per app until shortly before it expires; concurrent
+    callers share one request.
+
     Args:
         app_id: Feishu app ID (defaults to env APP_ID)
-        app_secret: Feishu app secret (defaults to env APP_SECRET)
+        app_secret: Feishu app secret (defaults to the secret last used for
+            `app_id`, or env APP_SECRET if `app_id` is env APP_ID)
 
     Returns:
         tenant_access_token string
@@ -211,162 +480,996 @@ async def get_tenant_access_token(app_id: str = None, app_secret: str = None) ->
     if app_id is None:
         app_id = os.getenv("APP_ID")
     if app_secret is None:
-        app_secret = os.getenv("APP_SECRET")
+        # APP_SECRET belongs to APP_ID; another app needs its own secret
+        app_secret = tenant_tokens.secrets.get(app_id)
+        if app_secret is None and app_id == os.getenv("APP_ID"):
+            app_secret = os.getenv("APP_SECRET")
 
     if not app_id or not app_secret:
         raise ValueError("APP_ID and APP_SECRET must be provided or set in environment")
 
-    url = "https://open.feishu.cn/open-apis/auth/v3/tenant_access_token/internal"
+    return await tenant_tokens.get(app_id, app_secret)
 
-    payload = {
-        "app_id": app_id,
-        "app_secret": app_secret
-    }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
-        response.raise_for_status()
-        result = response.json()
+# Largest image downloaded (bitable_image uploads are capped at 20 MB)
+IMAGE_MAX_BYTES = int(os.getenv("IMAGE_MAX_BYTES", str(20 * 1024 * 1024)))
+# Largest video or image downloaded as a file attachment; over 20 MB they go through the chunked upload
+FILE_MAX_BYTES = int(os.getenv("FILE_MAX_BYTES", str(1024 * 1024 * 1024)))
+# Stream downloads so oversized or non-image payloads are aborted early
+IMAGE_STREAM_DOWNLOAD = os.getenv("IMAGE_STREAM_DOWNLOAD", "true").lower() in ("1", "true", "yes")
+
+# Images larger than this are spooled to a temporary file and streamed into the upload
+IMAGE_SPOOL_THRESHOLD = int(os.getenv("IMAGE_SPOOL_THRESHOLD", str(1024 * 1024)))
+# Read size when hashing a spooled image
+IMAGE_SPOOL_CHUNK = 64 * 1024
+# Bytes reserved against a transfer byte budget when the server sends no Content-Length
+IMAGE_UNKNOWN_SIZE_RESERVATION = int(os.getenv("IMAGE_UNKNOWN_SIZE_RESERVATION", str(2 * 1024 * 1024)))
+
+# Bytes needed to recognise every supported image and video format
+IMAGE_SNIFF_BYTES = 12
+
+# Content types that may still carry an image (checked by magic bytes)
+GENERIC_CONTENT_TYPES = {'', 'application/octet-stream', 'binary/octet-stream', 'application/binary'}
+
+
+class ImageRejectedError(ValueError):
+    """
+    Raised when a download is not a usable image or attachment (too large, or of the wrong type).
+    """
+
+
+def sniff_image_type(head: bytes) -> str | None:
+    """
+    Identify an image format from its first bytes.
+
+    Args:
+        head: At least IMAGE_SNIFF_BYTES leading bytes of the file
+
+    Returns:
+        File extension ('jpg', 'png', 'gif', 'webp', 'bmp', 'tiff', 'heic', 'avif'), or None
+    """
+    if head.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if head.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if head[:6] in (b'GIF87a', b'GIF89a'):
+        return 'gif'
+    if head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+        return 'webp'
+    if head.startswith(b'BM'):
+        return 'bmp'
+    if head[:4] in (b'II*\x00', b'MM\x00*'):
+        return 'tiff'
+    if head[4:8] == b'ftyp':
+        brand = head[8:12]
+        if brand in (b'heic', b'heix', b'mif1', b'msf1'):
+            return 'heic'
+        if brand in (b'avif', b'avis'):
+            return 'avif'
+    return None
+
+
+def sniff_video_type(head: bytes) -> str | None:
+    """
+    Identify a video format from its first bytes.
+
+    Args:
+        head: At least IMAGE_SNIFF_BYTES leading bytes of the file
+
+    Returns:
+        File extension ('mp4', 'mov', 'webm', 'avi'), or None
+    """
+    if head[4:8] == b'ftyp' and sniff_image_type(head) is None:
+        # ISO base media: the brand tells QuickTime from MP4/M4V/3GP (HEIC/AVIF are images)
+        return 'mov' if head[8:12] == b'qt  ' else 'mp4'
+    if head.startswith(b'\x1a\x45\xdf\xa3'):
+        return 'webm'
+    if head[:4] == b'RIFF' and head[8:12] == b'AVI ':
+        return 'avi'
+    return None
+
+
+def sniff_media_type(head: bytes) -> str | None:
+    """
+    Identify an image or video format from its first bytes (see sniff_image_type, sniff_video_type).
+    """
+    return sniff_image_type(head) or sniff_video_type(head)
+
+
+def _check_image_headers(
+    response: httpx.Response,
+    max_bytes: int,
+    content_types: tuple[str, ...] = ('image/',),
+    kind: str = "an image"
+):
+    """
+    Reject a response from its headers alone, before reading the body.
+
+    Raises:
+        ImageRejectedError: If Content-Length exceeds `max_bytes` or
+            Content-Type is clearly not one of `content_types`
+    """
+    content_length = response.headers.get('content-length')
+    if content_length and content_length.isdigit() and int(content_length) > max_bytes:
+        raise ImageRejectedError(f"Too large: {int(content_length)} bytes (limit {max_bytes})")
+
+    content_type = response.headers.get('content-type', '').split(';')[0].strip().lower()
+    if not content_type.startswith(content_types) and content_type not in GENERIC_CONTENT_TYPES:
+        raise ImageRejectedError(f"Not {kind}: Content-Type {content_type}")
+
+
+def _expected_size(response: httpx.Response) -> int:
+    """
+    Body size announced by Content-Length, or IMAGE_UNKNOWN_SIZE_RESERVATION.
+    """
+    content_length = response.headers.get('content-length')
+    if content_length and content_length.isdigit():
+        return int(content_length)
+    return IMAGE_UNKNOWN_SIZE_RESERVATION
+
+
+def _image_filename(url: str, image_type: str) -> str:
+    """
+    Filename from the URL, or image.<ext> if the URL has no extension.
+    """
+    filename = Path(urlparse(url).path).name
+    if not filename or '.' not in filename:
+        filename = f"image.{image_type}"
+    return filename
+
+
+@dataclass
+class DownloadedImage:
+    """
+    A downloaded image (or file attachment), in memory or spooled to a temporary file.
+
+    `data` is `bytes` for payloads up to the spool threshold and an open
+    temporary file (positioned anywhere) above it; call close() when done.
+    `reserved` is what the download took from its ByteBudget, if any.
+    """
+    data: bytes | BinaryIO
+    filename: str
+    size: int
+    sha256: str
+    reserved: int = 0
+
+    def close(self):
+        if not isinstance(self.data, bytes):
+            self.data.close()
+
+
+@dataclass(frozen=True)
+class _MediaKind:
+    """
+    What a download must turn out to be.
+    """
+    sniff: Callable[[bytes], str | None]
+    content_types: tuple[str, ...]
+    description: str
+
+
+_IMAGE = _MediaKind(sniff_image_type, ('image/',), "an image")
+_VIDEO_OR_IMAGE = _MediaKind(sniff_media_type, ('image/', 'video/'), "a video or image")
+
+
+class _BudgetShortfall(Exception):
+    """
+    The byte budget can't cover a download right now; `nbytes` more are needed.
+    """
 
-        if result.get("code") != 0:
-            raise Exception(f"Failed to get tenant_access_token: {result.get('msg')}")
+    def __init__(self, nbytes: int):
+        super().__init__(f"{nbytes} bytes over the byte budget")
+        self.nbytes = nbytes
 
-        return result["tenant_access_token"]
 
+async def download_image_spooled(
+    url: str,
+    timeout: float = 10.0,
+    max_bytes: int = IMAGE_MAX_BYTES,
+    spool_threshold: int = IMAGE_SPOOL_THRESHOLD,
+    byte_budget: ByteBudget | None = None,
+    download_semaphore: asyncio.Semaphore | None = None
+) -> DownloadedImage:
+    """
+    Stream an image from URL, spooling it to a temporary file once it grows past `spool_threshold`.
+
+    Headers are checked before the body is read, the format is sniffed from
+    the first chunk, the transfer is aborted as soon as the size cap is
+    exceeded, and the SHA-256 is computed as the bytes arrive, so a large
+    image is never held in memory as a whole.
+
+    A download slot is only held while bytes can flow: when the budget
+    can't cover the announced size right away, the response is closed and
+    the slot released while waiting for room, then the download starts over
+    with the bytes already reserved.
+
+    Args:
+        url: Image URL to download
+        timeout: Request timeout in seconds (default 10.0)
+        max_bytes: Largest accepted image (default: Feishu's 20 MB upload limit)
+        spool_threshold: Payloads larger than this are written to a temporary file
+        byte_budget: Budget to reserve the expected size from (Content-Length,
+            or IMAGE_UNKNOWN_SIZE_RESERVATION) before reading the body
+        download_semaphore: Optional semaphore bounding concurrent downloads
+
+    Returns:
+        DownloadedImage (the caller closes it and releases `reserved`)
+
+    Raises:
+        httpx.HTTPError: If download fails
+        ImageRejectedError: If the payload is too large or not an image
+    """
+    return await _download_spooled(
+        url, timeout, max_bytes, spool_threshold, byte_budget, download_semaphore, _IMAGE
+    )
+
+
+async def download_file_spooled(
+    url: str,
+    timeout: float = 30.0,
+    max_bytes: int = FILE_MAX_BYTES,
+    spool_threshold: int = IMAGE_SPOOL_THRESHOLD,
+    byte_budget: ByteBudget | None = None,
+    download_semaphore: asyncio.Semaphore | None = None
+) -> DownloadedImage:
+    """
+    Like download_image_spooled, but for a file attachment: a video or an image, up to FILE_MAX_BYTES.
 
-async def download_image(url: str, timeout: float = 10.0) -> tuple[bytes, str]:
+    Raises:
+        httpx.HTTPError: If download fails
+        ImageRejectedError: If the payload is too large or neither a video nor an image
+    """
+    return await _download_spooled(
+        url, timeout, max_bytes, spool_threshold, byte_budget, download_semaphore, _VIDEO_OR_IMAGE
+    )
+
+
+async def _download_spooled(
+    url: str,
+    timeout: float,
+    max_bytes: int,
+    spool_threshold: int,
+    byte_budget: ByteBudget | None,
+    download_semaphore: asyncio.Semaphore | None,
+    kind: _MediaKind
+) -> DownloadedImage:
+    reserved = 0
+    try:
+        while True:
+            try:
+                async with download_semaphore or contextlib.nullcontext():
+                    return await _stream_download(url, timeout, max_bytes, spool_threshold, byte_budget, reserved, kind)
+            except _BudgetShortfall as e:
+                reserved += await byte_budget.acquire(e.nbytes)
+    except BaseException:
+        if reserved:
+            await byte_budget.release(reserved)
+        raise
+
+
+async def _stream_download(
+    url: str,
+    timeout: float,
+    max_bytes: int,
+    spool_threshold: int,
+    byte_budget: ByteBudget | None,
+    reserved: int,
+    kind: _MediaKind
+) -> DownloadedImage:
+    """
+    One download attempt of _download_spooled, with `reserved` bytes already held.
+
+    Raises:
+        _BudgetShortfall: If the rest of the announced size doesn't fit in
+            the budget without waiting (nothing is left reserved by this call)
+    """
+    client = get_http_client(url)
+
+    chunks = []
+    spool = None
+    size = 0
+    head = b''
+    image_type = None
+    hasher = hashlib.sha256()
+    extra = 0
+    try:
+        async with client.stream('GET', url, timeout=timeout) as response:
+            response.raise_for_status()
+            _check_image_headers(response, max_bytes, kind.content_types, kind.description)
+            if byte_budget is not None:
+                needed = min(_expected_size(response), byte_budget.total) - reserved
+                if needed > 0:
+                    extra = byte_budget.try_acquire(needed)
+                    if extra is None:
+                        extra = 0
+                        raise _BudgetShortfall(needed)
+
+            async for chunk in response.aiter_bytes():
+                size += len(chunk)
+                if size > max_bytes:
+                    raise ImageRejectedError(f"Too large: over {max_bytes} bytes")
+                hasher.update(chunk)
+
+                # Sniff as soon as enough leading bytes have arrived
+                if image_type is None:
+                    head += chunk[:IMAGE_SNIFF_BYTES - len(head)]
+                    if len(head) >= IMAGE_SNIFF_BYTES:
+                        image_type = kind.sniff(head)
+                        if image_type is None:
+                            raise ImageRejectedError(f"Not {kind.description}: unrecognised data {head!r}")
+
+                if spool is not None:
+                    spool.write(chunk)
+                elif size > spool_threshold:
+                    # Named, so image workers can read it by path; deleted on close()
+                    spool = tempfile.NamedTemporaryFile(prefix='image-')
+                    spool.writelines(chunks)
+                    spool.write(chunk)
+                    chunks = []
+                else:
+                    chunks.append(chunk)
+
+        if image_type is None:
+            image_type = kind.sniff(head)
+            if image_type is None:
+                raise ImageRejectedError(f"Not {kind.description}: unrecognised data {head!r}")
+    except BaseException:
+        if spool is not None:
+            spool.close()
+        if extra:
+            await byte_budget.release(extra)
+        raise
+
+    data = spool if spool is not None else b''.join(chunks)
+    return DownloadedImage(data, _image_filename(url, image_type), size, hasher.hexdigest(), reserved + extra)
+
+
+async def download_image(
+    url: str,
+    timeout: float = 10.0,
+    max_bytes: int = IMAGE_MAX_BYTES,
+    stream: bool = IMAGE_STREAM_DOWNLOAD
+) -> tuple[bytes, str]:
     """
     Download image from URL.
 
+    In streaming mode, headers are checked before the body is read, the
+    format is sniffed from the first chunk, and the transfer is aborted as
+    soon as the size cap is exceeded.
+
     Args:
         url: Image URL to download
         timeout: Request timeout in seconds (default 10.0)
+        max_bytes: Largest accepted image (default: Feishu's 20 MB upload limit)
+        stream: Stream the body and reject bad payloads early
 
     Returns:
         Tuple of (image_data as bytes, filename)
 
     Raises:
         httpx.HTTPError: If download fails
+        ImageRejectedError: If the payload is too large or not an image
     """
-    async with httpx.AsyncClient(timeout=timeout) as client:
-        response = await client.get(url)
+    if stream:
+        # A threshold of max_bytes keeps the whole payload in memory
+        image = await download_image_spooled(url, timeout, max_bytes, spool_threshold=max_bytes)
+        return image.data, image.filename
+
+    client = get_http_client(url)
+    response = await client.get(url, timeout=timeout)
+    response.raise_for_status()
+    _check_image_headers(response, max_bytes)
+    data = response.content
+    if len(data) > max_bytes:
+        raise ImageRejectedError(f"Image too large: {len(data)} bytes (limit {max_bytes})")
+    image_type = sniff_image_type(data[:IMAGE_SNIFF_BYTES])
+    if image_type is None:
+        raise ImageRejectedError(f"Not an image: unrecognised data {data[:IMAGE_SNIFF_BYTES]!r}")
+    return data, _image_filename(url, image_type)
+
+
+def _payload_size(image_data: bytes | BinaryIO) -> int:
+    if isinstance(image_data, bytes):
+        return len(image_data)
+    return os.fstat(image_data.fileno()).st_size
+
+
+def _payload_source(image_data: bytes | BinaryIO) -> bytes | str:
+    """
+    The payload for an image worker: the bytes, or the path of the spooled file.
+    """
+    if isinstance(image_data, bytes):
+        return image_data
+    image_data.flush()
+    return image_data.name
+
+
+def _payload_hash(image_data: bytes | BinaryIO) -> str:
+    if isinstance(image_data, bytes):
+        return content_hash(image_data)
+    hasher = hashlib.sha256()
+    image_data.seek(0)
+    for block in iter(lambda: image_data.read(IMAGE_SPOOL_CHUNK), b''):
+        hasher.update(block)
+    return hasher.hexdigest()
+
+
+FEISHU_MEDIA_API = "https://open.feishu.cn/open-apis/drive/v1/medias"
+
+# Tokens Feishu rejected as invalid or expired; a caller passing one gets a fresh token instead
+_rejected_tokens: set[str] = set()
+
+
+async def _feishu_media_post(
+    endpoint: str,
+    app_id: str,
+    tenant_access_token: str = None,
+    app_secret: str = None,
+    **kwargs
+) -> dict:
+    """
+    POST to a drive/v1/medias endpoint, paced by the app's upload rate limiter.
+
+    Args:
+        endpoint: 'upload_all', 'upload_prepare', 'upload_part' or 'upload_finish'
+        app_id: Feishu app the call counts against
+        tenant_access_token: Authentication token (cached token of `app_id` if
+            not provided, or once Feishu has rejected this one)
+        app_secret: Secret of `app_id`, for fetching a token (see get_tenant_access_token)
+        **kwargs: Request body arguments for httpx (json=..., files=...)
+
+    Returns:
+        The response's `data` object
+
+    Raises:
+        httpx.HTTPError: If the request fails
+        LarkAPIError: If Feishu answers with a non-zero code
+    """
+    # Get token if not provided, or if the one provided has gone stale
+    if tenant_access_token is None or tenant_access_token in _rejected_tokens:
+        tenant_access_token = await get_tenant_access_token(app_id, app_secret)
+
+    url = f"{FEISHU_MEDIA_API}/{endpoint}"
+    headers = {
+        'Authorization': f'Bearer {tenant_access_token}'
+    }
+
+    # Stay under the per-app QPS limit when many uploads run concurrently
+    await get_upload_limiter(app_id).acquire()
+
+    client = get_http_client(url)
+    response = await client.post(url, headers=headers, timeout=30.0, **kwargs)
+    try:
+        result = response.json()
+    except ValueError:
+        result = {}
+
+    # Feishu reports most failures (rate limits included) as a JSON code, whatever the status
+    code = result.get("code")
+    if code is None:
         response.raise_for_status()
+    if code in FEISHU_TOKEN_ERROR_CODES:
+        # Let the next attempt fetch a fresh token, even if the caller passes this one again
+        tenant_tokens.invalidate(app_id)
+        _rejected_tokens.add(tenant_access_token)
+    if code != 0:
+        retry_after = parse_retry_after(
+            response.headers.get('retry-after') or response.headers.get('x-ogw-ratelimit-reset')
+        )
+        raise LarkAPIError(code, result.get('msg', 'unexpected response'), retry_after)
+
+    return result.get("data") or {}
+
+
+async def _post_image_upload(
+    image_data: bytes | BinaryIO,
+    filename: str,
+    app_token: str,
+    tenant_access_token: str = None,
+    parent_type: str = "bitable_image",
+    app_id: str = None,
+    app_secret: str = None
+) -> str:
+    """
+    Send one drive/v1/medias/upload_all request (no caching).
+
+    Arguments and return value are those of upload_image_to_lark.
+    """
+    app_id = app_id or os.getenv("APP_ID")
+
+    # Prepare multipart form data; a file object is streamed into the body in chunks
+    if not isinstance(image_data, bytes):
+        image_data.seek(0)
+    files = {
+        'file_name': (None, filename),
+        'parent_type': (None, parent_type),
+        'parent_node': (None, app_token),
+        'size': (None, str(_payload_size(image_data))),
+        'file': (filename, image_data, 'application/octet-stream')
+    }
+
+    data = await _feishu_media_post('upload_all', app_id, tenant_access_token, app_secret, files=files)
+    return data["file_token"]
+
+
+def _read_part(image_data: bytes | BinaryIO, offset: int, size: int) -> bytes:
+    if isinstance(image_data, bytes):
+        return image_data[offset:offset + size]
+    # No await between seek and read, so concurrent part uploads can share the file
+    image_data.seek(offset)
+    return image_data.read(size)
+
+
+async def _post_chunked_upload(
+    image_data: bytes | BinaryIO,
+    filename: str,
+    app_token: str,
+    tenant_access_token: str = None,
+    parent_type: str = "bitable_image",
+    app_id: str = None,
+    sha256: str = None,
+    app_secret: str = None
+) -> str:
+    """
+    Upload through upload_prepare / upload_part / upload_finish (no caching).
+
+    Parts are uploaded FEISHU_UPLOAD_PART_CONCURRENCY at a time, each with
+    its adler32 checksum, and only one part per worker is in memory.
+    Nothing is retried here: progress is recorded in `partial_uploads`, so
+    the caller's next attempt after a failure only sends the parts still
+    missing.
+
+    Arguments and return value are those of upload_image_to_lark; `sha256`
+    (required) identifies the upload to resume.
+    """
+    app_id = app_id or os.getenv("APP_ID")
+    key = (sha256, app_token, parent_type)
+    size = _payload_size(image_data)
+
+    upload = partial_uploads.get(*key)
+    if upload is None or upload.size != size:
+        data = await _feishu_media_post(
+            'upload_prepare', app_id, tenant_access_token, app_secret, json={
+                'file_name': filename,
+                'parent_type': parent_type,
+                'parent_node': app_token,
+                'size': size
+            }
+        )
+        upload = PartialUpload(data['upload_id'], size, int(data['block_size']), int(data['block_num']))
+        partial_uploads.start(*key, upload)
+    elif upload.parts:
+        print(f"Resuming upload of {filename}: {len(upload.parts)}/{upload.block_num} parts already sent")
+
+    semaphore = asyncio.Semaphore(FEISHU_UPLOAD_PART_CONCURRENCY)
+
+    async def send_part(seq: int):
+        async with semaphore:
+            part = _read_part(image_data, seq * upload.block_size, upload.block_size)
+            await _feishu_media_post(
+                'upload_part', app_id, tenant_access_token, app_secret, files={
+                    'upload_id': (None, upload.upload_id),
+                    'seq': (None, str(seq)),
+                    'size': (None, str(len(part))),
+                    'checksum': (None, str(zlib.adler32(part))),
+                    'file': (filename, part, 'application/octet-stream')
+                }
+            )
+            partial_uploads.mark_part(*key, upload, seq)
+
+    try:
+        # Let every part finish or fail before returning, so none outlives the caller's file
+        results = await asyncio.gather(
+            *(send_part(seq) for seq in range(upload.block_num) if seq not in upload.parts),
+            return_exceptions=True
+        )
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+
+        data = await _feishu_media_post(
+            'upload_finish', app_id, tenant_access_token, app_secret,
+            json={'upload_id': upload.upload_id, 'block_num': upload.block_num}
+        )
+    except LarkAPIError as e:
+        # The upload_id itself may be unusable now (expired, bad part); start over next time
+        if not e.retryable:
+            partial_uploads.discard(*key)
+        raise
 
-        # Extract filename from URL or generate one
-        parsed_url = urlparse(url)
-        filename = Path(parsed_url.path).name
+    partial_uploads.discard(*key)
+    return data["file_token"]
 
-        # If no filename or extension, generate one based on content type
-        if not filename or '.' not in filename:
-            content_type = response.headers.get('content-type', '')
-            ext = 'jpg'  # default
-            if 'png' in content_type:
-                ext = 'png'
-            elif 'jpeg' in content_type or 'jpg' in content_type:
-                ext = 'jpg'
-            elif 'gif' in content_type:
-                ext = 'gif'
-            elif 'webp' in content_type:
-                ext = 'webp'
-            filename = f"image.{ext}"
 
-        return response.content, filename
+# file_tokens of uploaded images by (sha256, app_token, parent_type), persisted to disk
+upload_cache = UploadCache()
+
+# file_tokens by canonical image URL, checked before downloading anything
+url_token_cache = UrlTokenCache()
+
+# Progress of chunked uploads, so a failed one resumes with the missing parts
+partial_uploads = PartialUploadStore()
+
+# Uploads in progress, so identical bytes uploaded concurrently share one request
+_uploads_in_flight: dict[tuple[str, str, str], asyncio.Task] = {}
 
 
 async def upload_image_to_lark(
-    image_data: bytes,
+    image_data: bytes | BinaryIO,
     filename: str,
     app_token: str,
     tenant_access_token: str = None,
-    parent_type: str = "bitable_image"
+    parent_type: str = "bitable_image",
+    app_id: str = None,
+    sha256: str = None,
+    app_secret: str = None
 ) -> str:
     """
     Upload image to Feishu/Lark and get file_token.
 
+    Bytes already uploaded to the same Base and upload point return the
+    cached file_token without any request. Payloads over
+    FEISHU_UPLOAD_ALL_MAX_BYTES go through the chunked upload API (in
+    practice bitable_file attachments, see download_and_upload_file, since
+    images are capped at IMAGE_MAX_BYTES).
+
     Args:
-        image_data: Image binary data
+        image_data: Image binary data, or a binary file (e.g. a spooled download)
+            that is streamed into the request body
         filename: Image filename
         app_token: Bitable app_token (used as parent_node)
-        tenant_access_token: Authentication token (will auto-fetch if not provided)
+        tenant_access_token: Authentication token (cached token of `app_id` if not provided)
         parent_type: Upload point type (default: "bitable_image")
+        app_id: Feishu app the upload counts against (defaults to env APP_ID)
+        sha256: Hex SHA-256 of the image, if already known (saves rereading a file)
+        app_secret: Secret of `app_id`, needed to fetch its token when `app_id`
+            is not env APP_ID (and not used with a secret before)
 
     Returns:
         file_token string that can be used in bitable attachment fields
 
     Raises:
-        httpx.HTTPError: If upload fails
+        httpx.HTTPError: If the request fails
+        LarkAPIError: If Feishu rejects the upload
     """
-    # Get token if not provided
-    if tenant_access_token is None:
-        tenant_access_token = await get_tenant_access_token()
+    key = (sha256 or _payload_hash(image_data), app_token, parent_type)
+    file_token = upload_cache.get(*key)
+    if file_token is not None:
+        return file_token
+
+    task = _uploads_in_flight.get(key)
+    if task is None:
+        if _payload_size(image_data) > FEISHU_UPLOAD_ALL_MAX_BYTES:
+            upload = _post_chunked_upload(
+                image_data, filename, app_token, tenant_access_token, parent_type, app_id, key[0], app_secret
+            )
+        else:
+            upload = _post_image_upload(
+                image_data, filename, app_token, tenant_access_token, parent_type, app_id, app_secret
+            )
+        task = asyncio.create_task(upload)
+        _uploads_in_flight[key] = task
+        task.add_done_callback(lambda _: _uploads_in_flight.pop(key, None))
 
-    url = "https://open.feishu.cn/open-apis/drive/v1/medias/upload_all"
+    file_token = await asyncio.shield(task)
+    upload_cache.put(*key, file_token, _payload_size(image_data))
+    return file_token
 
-    # Prepare multipart form data
-    files = {
-        'file_name': (None, filename),
-        'parent_type': (None, parent_type),
-        'parent_node': (None, app_token),
-        'size': (None, str(len(image_data))),
-        'file': (filename, image_data, 'application/octet-stream')
-    }
 
-    headers = {
-        'Authorization': f'Bearer {tenant_access_token}'
-    }
+async def shrink_downloaded_image(image: DownloadedImage) -> DownloadedImage:
+    """
+    Replace a downloaded image by a downscaled, re-encoded copy (see image_transform).
 
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(url, headers=headers, files=files)
-        response.raise_for_status()
-        result = response.json()
+    Returns the image unchanged if transforms are disabled, Pillow is
+    missing, the image is small already, or the transform fails or doesn't
+    make it smaller. Otherwise the original is closed and the copy keeps its
+    byte budget reservation. A spooled original is decoded by the worker
+    straight from its file.
+    """
+    if not transform_enabled():
+        return image
+
+    try:
+        result = await transform_image(_payload_source(image.data))
+    except Exception as e:
+        print(f"Image transform failed for {image.filename}, uploading the original: {e}")
+        return image
+    if result is None:
+        return image
 
-        if result.get("code") != 0:
-            raise Exception(f"Failed to upload image: {result.get('msg')}")
+    shrunk, extension = result
+    image.close()
+    filename = f"{Path(image.filename).stem}.{extension}"
+    return DownloadedImage(shrunk, filename, len(shrunk), content_hash(shrunk), image.reserved)
 
-        return result["data"]["file_token"]
+
+# Perceptual hashes of uploaded images, for near-duplicate lookups against history
+perceptual_index = PerceptualIndex()
+
+# Near-duplicate uploads in progress per (app_token, parent_type): (dHash, future file_token)
+_near_duplicates_in_flight: dict[tuple[str, str], list[tuple[int, asyncio.Future]]] = {}
+
+
+async def _claim_near_duplicate(
+    phash: int,
+    app_token: str,
+    parent_type: str
+) -> tuple[str | None, asyncio.Future | None]:
+    """
+    Find the file_token of a near-duplicate, uploaded before or being uploaded now.
+
+    Returns:
+        (file_token, None) on a match. Otherwise (None, claim): the caller
+        uploads the image and passes `claim` to _settle_near_duplicate, so
+        near-duplicates arriving meanwhile wait for its file_token instead
+        of uploading their own copy.
+    """
+    file_token = perceptual_index.find(phash, app_token, parent_type)
+    if file_token is not None:
+        return file_token, None
+
+    target = (app_token, parent_type)
+    for other, future in _near_duplicates_in_flight.get(target, ()):
+        if hamming_distance(phash, other) <= perceptual_index.max_distance:
+            file_token = await asyncio.shield(future)
+            if file_token is not None:
+                return file_token, None
+            break  # that upload failed; upload this one instead
+
+    claim = asyncio.get_running_loop().create_future()
+    _near_duplicates_in_flight.setdefault(target, []).append((phash, claim))
+    return None, claim
+
+
+def _settle_near_duplicate(
+    phash: int,
+    app_token: str,
+    parent_type: str,
+    claim: asyncio.Future,
+    file_token: str | None
+):
+    """
+    Publish the outcome of a claimed upload (file_token, or None if it failed).
+    """
+    pending = _near_duplicates_in_flight.get((app_token, parent_type), [])
+    if (phash, claim) in pending:
+        pending.remove((phash, claim))
+    if file_token is not None:
+        perceptual_index.add(phash, app_token, parent_type, file_token)
+    claim.set_result(file_token)
+
+
+# Backoff between attempts: full jitter over base * 2**attempt, capped
+IMAGE_RETRY_BASE_DELAY = float(os.getenv("IMAGE_RETRY_BASE_DELAY", "1"))
+IMAGE_RETRY_MAX_DELAY = float(os.getenv("IMAGE_RETRY_MAX_DELAY", "30"))
+
+# HTTP statuses worth retrying (besides other 5xx); other 4xx are final
+RETRYABLE_HTTP_STATUSES = {408, 425, 429}
+
+T = TypeVar('T')
+
+
+def _is_retryable(error: Exception) -> bool:
+    """
+    Whether another attempt could succeed: timeouts, connection errors,
+    5xx/429 and transient Feishu codes. A 404 or a rejected image is final.
+    """
+    if isinstance(error, ImageRejectedError):
+        return False
+    if isinstance(error, LarkAPIError):
+        return error.retryable
+    if isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+        return status in RETRYABLE_HTTP_STATUSES or status >= 500
+    return isinstance(error, (asyncio.TimeoutError, httpx.TransportError))
+
+
+def _error_retry_after(error: Exception) -> float | None:
+    """
+    Delay requested by the server (Retry-After or a Feishu rate limit), if any.
+    """
+    if isinstance(error, LarkAPIError):
+        return error.retry_after
+    if isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (429, 503):
+        return parse_retry_after(error.response.headers.get('retry-after'))
+    return None
+
+
+def _retry_delay(attempt: int, retry_after: float | None = None) -> float:
+    """
+    Seconds to wait before retry number `attempt` (0-based).
+
+    Full jitter keeps a batch that failed together from retrying in lockstep;
+    a server-requested delay is a lower bound.
+    """
+    delay = random.uniform(0, min(IMAGE_RETRY_MAX_DELAY, IMAGE_RETRY_BASE_DELAY * 2 ** attempt))
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, IMAGE_RETRY_BASE_DELAY))
+    return delay
+
+
+async def _with_retries(operation: Callable[[], Awaitable[T]], max_retries: int) -> T:
+    """
+    Await operation(), retrying retryable errors up to `max_retries` attempts in total.
+
+    Raises:
+        The last error, once it is final or attempts run out
+    """
+    for attempt in range(max_retries):
+        try:
+            return await operation()
+        except Exception as e:
+            if attempt == max_retries - 1 or not _is_retryable(e):
+                raise
+            await asyncio.sleep(_retry_delay(attempt, _error_retry_after(e)))
 
 
 async def download_and_upload_image(
     image_url: str,
     app_token: str,
     tenant_access_token: str = None,
-    max_retries: int = 3
+    max_retries: int = 3,
+    download_semaphore: asyncio.Semaphore | None = None,
+    byte_budget: ByteBudget | None = None
 ) -> str | None:
     """
     Download image from URL and upload to Feishu, with retry logic.
 
+    Download and upload are retried separately: a failed upload is retried
+    with the payload already downloaded, and only transient errors are
+    retried at all (see _is_retryable).
+
+    With IMAGE_PHASH_DEDUP, a near-duplicate of an image already uploaded
+    (or being uploaded) to the same Base reuses its file_token.
+
     Args:
         image_url: URL of image to download
         app_token: Bitable app_token
         tenant_access_token: Authentication token (will auto-fetch if not provided)
-        max_retries: Maximum number of retry attempts (default: 3)
+        max_retries: Maximum number of attempts per stage (default: 3)
+        download_semaphore: Optional semaphore bounding concurrent downloads
+            (uploads are paced separately by the upload rate limiter)
+        byte_budget: Optional budget the image's size is reserved from, from
+            the download until the upload finishes
 
     Returns:
         file_token string on success, None on failure
     """
-    for attempt in range(max_retries):
-        try:
-            # Download image
-            image_data, filename = await download_image(image_url)
-
-            # Upload to Lark
-            file_token = await upload_image_to_lark(
-                image_data=image_data,
-                filename=filename,
-                app_token=app_token,
-                tenant_access_token=tenant_access_token
+    # A URL processed before (in any spelling) needs no download or upload
+    cache_key = canonicalize_image_url(image_url)
+    file_token = url_token_cache.get(cache_key, app_token, "bitable_image")
+    if file_token is not None:
+        return file_token
+
+    try:
+        # Large images are spooled to disk rather than held in memory
+        image = await _with_retries(
+            lambda: download_image_spooled(
+                image_url, byte_budget=byte_budget, download_semaphore=download_semaphore
+            ),
+            max_retries
+        )
+    except ImageRejectedError as e:
+        print(f"Rejected image {image_url}: {e}")
+        return None
+    except Exception as e:
+        print(f"Failed to download image {image_url}: {e}")
+        return None
+
+    file_token = None
+    phash = None
+    claim = None
+    original_sha256, original_size = image.sha256, image.size
+    try:
+        # Bytes uploaded before skip hashing and transforming; upload_image_to_lark
+        # checks the cache itself when neither runs
+        if dedup_enabled() or transform_enabled():
+            file_token = upload_cache.get(original_sha256, app_token, "bitable_image")
+
+        # The same picture at another crop or compression reuses its file_token
+        if file_token is None and dedup_enabled():
+            phash = await perceptual_hash(_payload_source(image.data))
+        if phash is not None:
+            file_token, claim = await _claim_near_duplicate(phash, app_token, "bitable_image")
+
+        if file_token is None:
+            # Optionally upload a preview-sized copy instead of the original
+            image = await shrink_downloaded_image(image)
+
+            # Streams the body from the spooled file on every attempt
+            file_token = await _with_retries(
+                lambda: upload_image_to_lark(
+                    image_data=image.data,
+                    filename=image.filename,
+                    app_token=app_token,
+                    tenant_access_token=tenant_access_token,
+                    sha256=image.sha256
+                ),
+                max_retries
             )
+            if image.sha256 != original_sha256:
+                # The next download of the same original finds the copy's file_token
+                upload_cache.put(original_sha256, app_token, "bitable_image", file_token, original_size)
+    except Exception as e:
+        print(f"Failed to upload image {image_url}: {e}")
+        return None
+    finally:
+        image.close()
+        if image.reserved:
+            await byte_budget.release(image.reserved)
+        if claim is not None:
+            _settle_near_duplicate(phash, app_token, "bitable_image", claim, file_token)
+
+    url_token_cache.put(cache_key, app_token, "bitable_image", file_token)
+    return file_token
+
+
+async def download_and_upload_file(
+    file_url: str,
+    app_token: str,
+    tenant_access_token: str = None,
+    max_retries: int = 3,
+    download_semaphore: asyncio.Semaphore | None = None,
+    byte_budget: ByteBudget | None = None
+) -> str | None:
+    """
+    Download a video (or image) from URL and upload it to Feishu as a file attachment.
 
-            return file_token
+    Unlike download_and_upload_image, files up to FILE_MAX_BYTES are
+    accepted and uploaded as bitable_file; anything over 20 MB goes through
+    the resumable chunked upload, so a retry only sends the missing parts.
 
-        except Exception as e:
-            if attempt < max_retries - 1:
-                # Wait before retry (exponential backoff)
-                import asyncio
-                await asyncio.sleep(2 ** attempt)
-                continue
-            else:
-                # Log error and return None on final failure
-                print(f"Failed to download and upload image {image_url}: {e}")
-                return None
+    Args:
+        file_url: URL of the video or image to download
+        app_token: Bitable app_token
+        tenant_access_token: Authentication token (will auto-fetch if not provided)
+        max_retries: Maximum number of attempts per stage (default: 3)
+        download_semaphore: Optional semaphore bounding concurrent downloads
+        byte_budget: Optional budget the file's size is reserved from, from
+            the download until the upload finishes
 
+    Returns:
+        file_token string on success, None on failure
+    """
+    cache_key = canonicalize_image_url(file_url)
+    file_token = url_token_cache.get(cache_key, app_token, "bitable_file")
+    if file_token is not None:
+        return file_token
+
+    try:
+        # Files are spooled to disk and streamed into the upload in parts
+        file = await _with_retries(
+            lambda: download_file_spooled(
+                file_url, byte_budget=byte_budget, download_semaphore=download_semaphore
+            ),
+            max_retries
+        )
+    except ImageRejectedError as e:
+        print(f"Rejected file {file_url}: {e}")
+        return None
+    except Exception as e:
+        print(f"Failed to download file {file_url}: {e}")
+        return None
+
+    try:
+        file_token = await _with_retries(
+            lambda: upload_image_to_lark(
+                image_data=file.data,
+                filename=file.filename,
+                app_token=app_token,
+                tenant_access_token=tenant_access_token,
+                parent_type="bitable_file",
+                sha256=file.sha256
+            ),
+            max_retries
+        )
+    except Exception as e:
+        print(f"Failed to upload file {file_url}: {e}")
+        return None
+    finally:
+        file.close()
+        if file.reserved:
+            await byte_budget.release(file.reserved)
+
+    url_token_cache.put(cache_key, app_token, "bitable_file", file_token)
+    return file_token
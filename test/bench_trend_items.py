@@ -0,0 +1,92 @@
+"""
+Benchmark per-item dicts vs slotted TrendItem vs columnar TrendBatch.
+
+Measures the container overhead of holding a large trend history in memory
+(field strings are allocated up front and shared, so only the per-item
+containers are counted) and the cost of a source filter and a sort.
+
+Usage: python test/bench_trend_items.py [item_count]
+"""
+import sys
+import os
+import time
+import tracemalloc
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models import TrendBatch, TrendItem
+
+
+SOURCES = ["reddit", "google", "tiktok", "zhihu", "nytimes"]
+
+
+def make_fields(count: int) -> list[tuple[str, str, str, str, str, float]]:
+    return [
+        (
+            f"Headline number {i} about something",
+            f"https://example.com/articles/{i}",
+            f"2025-10-20T{i % 24:02d}:{i % 60:02d}:00+00:00",
+            f"https://example.com/images/{i}.jpg",
+            SOURCES[i % len(SOURCES)],
+            1760918400.0 + (i * 7919) % 86400,
+        )
+        for i in range(count)
+    ]
+
+
+def measure(build):
+    """Return (result, bytes allocated, seconds) for build()."""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size, elapsed
+
+
+def timed(fn, repeat: int = 5) -> float:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    fields = make_fields(count)
+
+    dicts, dict_bytes, dict_build = measure(lambda: [
+        {'title': t, 'url': u, 'published': p, 'image_url': i, 'source': s, 'published_ts': ts}
+        for t, u, p, i, s, ts in fields
+    ])
+    items, item_bytes, item_build = measure(lambda: [
+        TrendItem(title=t, url=u, published=p, image_url=i, source=s, published_ts=ts)
+        for t, u, p, i, s, ts in fields
+    ])
+    batch, batch_bytes, batch_build = measure(lambda: TrendBatch(items))
+
+    dict_filter = timed(lambda: [d for d in dicts if d['source'] == 'zhihu'])
+    item_filter = timed(lambda: [it for it in items if it.source == 'zhihu'])
+    batch_filter = timed(lambda: batch.positions_for_source('zhihu'))
+
+    dict_sort = timed(lambda: sorted(dicts, key=lambda d: d['published_ts']))
+    item_sort = timed(lambda: sorted(items, key=lambda it: it.published_ts))
+    published_ts = batch.published_ts
+    batch_sort = timed(lambda: sorted(range(len(batch)), key=published_ts.__getitem__))
+
+    print(f"Items: {count:,}")
+    print(f"{'':<14}{'memory':>12}{'build':>10}{'filter':>10}{'sort':>10}")
+    for name, size, build, flt, srt in [
+        ("list[dict]", dict_bytes, dict_build, dict_filter, dict_sort),
+        ("TrendItem", item_bytes, item_build, item_filter, item_sort),
+        ("TrendBatch", batch_bytes, batch_build, batch_filter, batch_sort),
+    ]:
+        print(f"{name:<14}{size / 1024 / 1024:>10.1f}MB{build * 1000:>8.0f}ms{flt * 1000:>8.1f}ms{srt * 1000:>8.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
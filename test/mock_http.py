@@ -0,0 +1,40 @@
+"""
+Shared setup for the tests that drive utils against a mocked HTTP server.
+"""
+import contextlib
+import sys
+import os
+from typing import AsyncIterator, Awaitable, Callable
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import utils
+from upload_cache import UploadCache, UrlTokenCache
+
+
+@contextlib.asynccontextmanager
+async def mock_http(
+    handler: Callable[[httpx.Request], Awaitable[httpx.Response]] | httpx.AsyncBaseTransport
+) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Route every utils request through `handler`, with empty in-memory upload caches.
+
+    Args:
+        handler: Request handler for httpx.MockTransport, or a transport to use as is
+
+    Yields:
+        The client that utils.get_http_client returns for every URL
+    """
+    transport = handler if isinstance(handler, httpx.AsyncBaseTransport) else httpx.MockTransport(handler)
+    client = httpx.AsyncClient(transport=transport)
+    utils.get_http_client = lambda url: client
+    utils.upload_cache = UploadCache(':memory:')
+    utils.url_token_cache = UrlTokenCache(':memory:')
+    try:
+        yield client
+    finally:
+        await utils.tenant_tokens.aclose()
+        await client.aclose()
@@ -0,0 +1,156 @@
+"""
+Test the byte budget for in-flight image transfers in byte_budget.py and utils.py.
+"""
+import asyncio
+import sys
+import os
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import utils
+from byte_budget import ByteBudget
+from mock_http import mock_http
+
+
+MB = 1024 * 1024
+uploads_in_progress = 0
+max_uploads_in_progress = 0
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global uploads_in_progress, max_uploads_in_progress
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+    if request.url.path.endswith("/medias/upload_all"):
+        uploads_in_progress += 1
+        max_uploads_in_progress = max(max_uploads_in_progress, uploads_in_progress)
+        await asyncio.sleep(0.3 if len(request.content) > 2 * MB else 0.05)
+        uploads_in_progress -= 1
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok{len(request.content)}"}})
+
+    # /huge-3.jpg -> 3 MB, /large-3.jpg -> 1 MB, /small-3.jpg -> 10 KB, /unknown-3.jpg -> 10 KB without Content-Length
+    name = request.url.path.strip("/")
+    size = {"huge": 3 * MB, "large": MB}.get(name.split("-")[0], 10 * 1024)
+    body = (b"\xff\xd8\xff" + name.encode()).ljust(size, b"\x00")
+    if name.startswith("unknown"):
+        async def stream():
+            yield body
+        return httpx.Response(200, content=stream(), headers={"content-type": "image/jpeg"})
+    return httpx.Response(200, content=body, headers={"content-type": "image/jpeg"})
+
+
+async def test_budget():
+    print("=" * 80)
+    print("TEST: ByteBudget admission")
+    print("=" * 80)
+
+    budget = ByteBudget(10)
+    held = await budget.acquire(8)
+    large = asyncio.create_task(budget.acquire(5))
+    await asyncio.sleep(0.01)
+    small = await asyncio.wait_for(budget.acquire(2), timeout=0.1)
+    if not large.done() and small == 2 and budget.in_use == 10:
+        print("  ✓ PASS: A small reservation passes a large one waiting for room")
+    else:
+        print(f"  ✗ FAIL: large done={large.done()} in_use={budget.in_use}")
+
+    await budget.release(held)
+    await budget.release(small)
+    await budget.release(await large)
+    async with budget.reserve(100) as capped:
+        in_block = budget.in_use
+    if capped == 10 and in_block == 10 and budget.in_use == 0:
+        print("  ✓ PASS: Oversized reservation capped at the total, released on exit")
+    else:
+        print(f"  ✗ FAIL: capped={capped} in_block={in_block} in_use={budget.in_use}")
+
+
+async def run_batch(prefix: str, count: int, budget: ByteBudget) -> list:
+    global max_uploads_in_progress
+    max_uploads_in_progress = 0
+    return await asyncio.gather(*(
+        utils.download_and_upload_image(f"https://img.example.com/{prefix}-{i}.jpg", "base_budget", byte_budget=budget)
+        for i in range(count)
+    ))
+
+
+async def test_transfers():
+    print("\n" + "=" * 80)
+    print("TEST: Transfers within the budget")
+    print("=" * 80)
+
+    budget = ByteBudget(3 * MB)
+    tokens = await run_batch("large", 10, budget)
+    if all(tokens) and budget.peak <= 3 * MB and max_uploads_in_progress <= 3 and budget.in_use == 0:
+        print(f"  ✓ PASS: 10 x 1 MB through a 3 MB budget, peak {budget.peak / MB:.1f} MB, "
+              f"{max_uploads_in_progress} at once")
+    else:
+        print(f"  ✗ FAIL: peak={budget.peak} at_once={max_uploads_in_progress} in_use={budget.in_use}")
+
+    # Small images aren't throttled: all of them fit at once (the upload QPS limit paces the rest)
+    budget = ByteBudget(3 * MB)
+    tokens = await run_batch("small", 20, budget)
+    if all(tokens) and budget.peak == 20 * 10 * 1024 and budget.in_use == 0:
+        print(f"  ✓ PASS: 20 x 10 KB admitted together ({20 * 10} KB reserved)")
+    else:
+        print(f"  ✗ FAIL: small batch peak={budget.peak} in_use={budget.in_use}")
+
+    budget = ByteBudget(100 * MB)
+    tokens = await run_batch("unknown", 3, budget)
+    if all(tokens) and budget.peak == 3 * utils.IMAGE_UNKNOWN_SIZE_RESERVATION:
+        print("  ✓ PASS: No Content-Length reserves IMAGE_UNKNOWN_SIZE_RESERVATION")
+    else:
+        print(f"  ✗ FAIL: unknown sizes peak={budget.peak}")
+
+
+async def test_mixed_sizes():
+    print("\n" + "=" * 80)
+    print("TEST: Large images waiting for budget don't hold download slots")
+    print("=" * 80)
+
+    budget = ByteBudget(4 * MB)
+    semaphore = asyncio.Semaphore(2)
+    finished = []
+
+    async def transfer(name: str):
+        token = await utils.download_and_upload_image(
+            f"https://img.example.com/{name}.jpg", "base_mixed",
+            download_semaphore=semaphore, byte_budget=budget
+        )
+        finished.append(name)
+        return token
+
+    # Only one 3 MB image fits; the other two wait for it while the small ones go through
+    names = [f"huge-{i}" for i in range(3)] + [f"small-mixed-{i}" for i in range(10)]
+    tokens = await asyncio.gather(*(transfer(name) for name in names))
+    first_huge = finished.index("huge-0")
+    if all(tokens) and all(name.startswith("small") for name in finished[:first_huge]) and first_huge == 10:
+        print(f"  ✓ PASS: All 10 small images finished while the first 3 MB upload was in flight "
+              f"(peak {budget.peak / MB:.2f} MB)")
+    else:
+        print(f"  ✗ FAIL: Finish order {finished}")
+
+    if budget.in_use == 0 and budget.peak <= 4 * MB:
+        print("  ✓ PASS: Budget fully released")
+    else:
+        print(f"  ✗ FAIL: in_use={budget.in_use} peak={budget.peak}")
+
+
+async def main():
+    async with mock_http(handler):
+        utils.FEISHU_UPLOAD_QPS = 1000
+        utils._upload_limiters.clear()
+
+        await test_budget()
+        await test_transfers()
+        await test_mixed_sizes()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
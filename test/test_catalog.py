@@ -0,0 +1,134 @@
+"""
+Test the source catalog, the pre-built extractors and the prioritised prefetch scheduler.
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from catalog import load_catalog, parse_catalog
+from prefetch import FeedPrefetcher
+import utils
+
+
+CUSTOM_FEED = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:x="https://example.com/ns">
+  <channel>
+    <item>
+      <headline>Custom headline</headline>
+      <link>https://example.com/1</link>
+      <x:date>2025-10-20T10:00:00Z</x:date>
+      <x:picture src="https://example.com/1.png"/>
+    </item>
+  </channel>
+</rss>
+"""
+
+
+def test_load_catalog():
+    """The bundled TOML loads, variants expand, and JSON catalogs work too."""
+    print("=" * 80)
+    print("TEST: Load catalog")
+    print("=" * 80)
+
+    catalog = load_catalog()
+    if catalog['reddit'].kind == 'atom' and catalog['nytimes'].priority == 10 and 'nyt-asiapacific' in catalog:
+        print(f"  ✓ PASS: {len(catalog)} sources from sources.toml")
+    else:
+        print(f"  ✗ FAIL: {list(catalog)}")
+
+    if catalog['nyt-europe'].url.endswith('/Europe.xml') and catalog['tiktok'].refresh_interval == 600:
+        print("  ✓ PASS: Variant URLs and per-source refresh")
+    else:
+        print(f"  ✗ FAIL: {catalog['nyt-europe']}")
+
+    with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as f:
+        json.dump({"sources": {"hn": {"url": "https://hnrss.org/frontpage", "refresh": 60}}}, f)
+    try:
+        hn = load_catalog(f.name)['hn']
+        if hn.kind == 'rss' and hn.refresh_interval == 60:
+            print("  ✓ PASS: JSON catalog")
+        else:
+            print(f"  ✗ FAIL: {hn}")
+    finally:
+        os.unlink(f.name)
+
+    try:
+        parse_catalog({"sources": {"bad": {"url": "https://example.com", "kind": "json"}}})
+        print("  ✗ FAIL: Unknown kind accepted")
+    except ValueError as e:
+        print(f"  ✓ PASS: {e}")
+
+
+def test_custom_extractor():
+    """Namespaces, paths and image rules from the catalog drive extraction."""
+    print("\n" + "=" * 80)
+    print("TEST: Catalog-driven extraction")
+    print("=" * 80)
+
+    spec = parse_catalog({"sources": {"custom": {
+        "url": "https://example.com/feed",
+        "namespaces": {"x": "https://example.com/ns"},
+        "paths": {"title": "headline", "published": "x:date"},
+        "image_rules": [{"tag": "x:picture", "attr": "src"}],
+    }}})['custom']
+
+    items = utils.parse_feed_content(CUSTOM_FEED, 'custom', spec)
+    item = items[0] if items else None
+    if item and item.title == 'Custom headline' and item.image_url == 'https://example.com/1.png' and item.published_ts:
+        print(f"  ✓ PASS: {item.title} / {item.image_url}")
+    else:
+        print(f"  ✗ FAIL: {items}")
+
+
+async def test_priority_scheduler():
+    """With one fetch slot, sources are fetched in priority order on their own cadence."""
+    print("\n" + "=" * 80)
+    print("TEST: Prioritised refresh scheduler")
+    print("=" * 80)
+
+    order = []
+
+    async def fetch(source: str, url: str) -> list:
+        order.append(source)
+        await asyncio.sleep(0.01)
+        return []
+
+    sources = {f"s{i}": f"https://example.com/{i}" for i in range(200)}
+    prefetcher = FeedPrefetcher(
+        sources,
+        fetch=fetch,
+        intervals={"s7": 0.05},
+        default_interval=60,
+        priorities={"s7": 5, "s150": 10},
+        max_concurrency=1
+    )
+    prefetcher.start()
+    await asyncio.sleep(0.5)
+    await prefetcher.stop()
+
+    if order[:2] == ["s150", "s7"]:
+        print(f"  ✓ PASS: Highest priorities first: {order[:3]}")
+    else:
+        print(f"  ✗ FAIL: Order {order[:5]}")
+
+    # s7 keeps being refreshed while the long-interval sources are fetched once
+    others = [source for source in order if source != "s7"]
+    if order.count("s7") > 1 and len(others) == len(set(others)):
+        print(f"  ✓ PASS: s7 refreshed {order.count('s7')}x, {len(others)} others once")
+    else:
+        print(f"  ✗ FAIL: s7 refreshed {order.count('s7')}x")
+
+
+async def main():
+    test_load_catalog()
+    test_custom_extractor()
+    await test_priority_scheduler()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,211 @@
+"""
+Test the chunked (prepare/part/finish) upload path and file attachments in utils.py, against a mock Feishu API.
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import zlib
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import utils
+from mock_http import mock_http
+from upload_cache import PartialUploadStore
+
+
+BLOCK_SIZE = 64 * 1024
+calls = []
+sessions: dict[str, dict] = {}
+parts_in_flight = 0
+max_parts_in_flight = 0
+# seq numbers whose upload_part requests fail (with a retryable error)
+failing_parts: set[int] = set()
+part_attempts: dict[int, int] = {}
+prepared_parent_types = []
+# Files served at https://cdn.example.com/<name>
+served: dict[str, bytes] = {}
+
+
+def form_fields(request: httpx.Request) -> dict[str, bytes]:
+    """Minimal multipart/form-data parser for the mock server."""
+    boundary = request.headers["content-type"].split("boundary=")[1].encode()
+    fields = {}
+    for section in request.content.split(b"--" + boundary)[1:-1]:
+        head, _, body = section[2:-2].partition(b"\r\n\r\n")
+        name = head.split(b'name="')[1].split(b'"')[0].decode()
+        fields[name] = body
+    return fields
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global parts_in_flight, max_parts_in_flight
+    endpoint = request.url.path.rsplit("/", 1)[-1]
+    if request.url.host == "cdn.example.com":
+        content_type = "video/mp4" if endpoint.endswith(".mp4") else "image/jpeg"
+        return httpx.Response(200, content=served[endpoint], headers={"content-type": content_type})
+    if endpoint == "internal":
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+    calls.append(endpoint)
+
+    if endpoint == "upload_all":
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": "tok-single"}})
+
+    if endpoint == "upload_prepare":
+        body = json.loads(request.content)
+        prepared_parent_types.append(body["parent_type"])
+        upload_id = f"up{len(sessions)}"
+        block_num = -(-body["size"] // BLOCK_SIZE)
+        sessions[upload_id] = {"size": body["size"], "parts": {}}
+        return httpx.Response(200, json={"code": 0, "data": {
+            "upload_id": upload_id, "block_size": BLOCK_SIZE, "block_num": block_num
+        }})
+
+    if endpoint == "upload_part":
+        fields = form_fields(request)
+        seq = int(fields["seq"])
+        part_attempts[seq] = part_attempts.get(seq, 0) + 1
+        parts_in_flight += 1
+        max_parts_in_flight = max(max_parts_in_flight, parts_in_flight)
+        await asyncio.sleep(0.02)
+        parts_in_flight -= 1
+        if seq in failing_parts:
+            return httpx.Response(500)
+        if int(fields["checksum"]) != zlib.adler32(fields["file"]) or int(fields["size"]) != len(fields["file"]):
+            return httpx.Response(200, json={"code": 1061002, "msg": "checksum mismatch"})
+        sessions[fields["upload_id"].decode()]["parts"][seq] = fields["file"]
+        return httpx.Response(200, json={"code": 0})
+
+    if endpoint == "upload_finish":
+        body = json.loads(request.content)
+        session = sessions[body["upload_id"]]
+        data = b"".join(session["parts"][seq] for seq in range(body["block_num"]))
+        if len(data) != session["size"]:
+            return httpx.Response(200, json={"code": 1061002, "msg": "missing parts"})
+        session["data"] = data
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok-{body['upload_id']}"}})
+    return httpx.Response(404)
+
+
+def make_file(size: int, seed: int):
+    """A temporary file of `size` pseudo-random bytes."""
+    file = tempfile.TemporaryFile()
+    file.write(b"\xff\xd8\xff" + bytes((i * seed) % 251 for i in range(size - 3)))
+    return file
+
+
+async def test_size_switch():
+    print("=" * 80)
+    print("TEST: Single-shot vs chunked by size")
+    print("=" * 80)
+
+    calls.clear()
+    small = await utils.upload_image_to_lark(b"\x89PNG small", "small.png", "base_chunk")
+    if small == "tok-single" and calls == ["upload_all"]:
+        print("  ✓ PASS: Small payload uses upload_all")
+    else:
+        print(f"  ✗ FAIL: {small} {calls}")
+
+    calls.clear()
+    file = make_file(10 * BLOCK_SIZE + 123, seed=7)
+    token = await utils.upload_image_to_lark(file, "large.jpg", "base_chunk")
+    file.seek(0)
+    session = sessions[token.removeprefix("tok-")]
+    if calls[0] == "upload_prepare" and calls[-1] == "upload_finish" and session["data"] == file.read():
+        print(f"  ✓ PASS: Large payload sent as {calls.count('upload_part')} checksummed parts, reassembled intact")
+    else:
+        print(f"  ✗ FAIL: {calls}")
+    file.close()
+
+    limit = utils.FEISHU_UPLOAD_PART_CONCURRENCY
+    if 1 < max_parts_in_flight <= limit:
+        print(f"  ✓ PASS: Up to {max_parts_in_flight} parts in flight (limit {limit})")
+    else:
+        print(f"  ✗ FAIL: {max_parts_in_flight} parts in flight (limit {limit})")
+
+
+async def test_resume():
+    print("\n" + "=" * 80)
+    print("TEST: Resuming a failed chunked upload")
+    print("=" * 80)
+
+    file = make_file(8 * BLOCK_SIZE, seed=11)
+    calls.clear()
+    failing_parts.add(5)
+    part_attempts.clear()
+    try:
+        await utils.upload_image_to_lark(file, "resume.jpg", "base_chunk")
+        print("  ✗ FAIL: Upload succeeded despite a failing part")
+    except httpx.HTTPStatusError:
+        if part_attempts[5] == 1:
+            print("  ✓ PASS: Failing part not retried inside the upload (the caller retries)")
+        else:
+            print(f"  ✗ FAIL: Part 5 sent {part_attempts[5]} times in one upload")
+
+    failing_parts.clear()
+    calls.clear()
+    token = await utils.upload_image_to_lark(file, "resume.jpg", "base_chunk")
+    file.seek(0)
+    if calls == ["upload_part", "upload_finish"] and sessions[token.removeprefix("tok-")]["data"] == file.read():
+        print("  ✓ PASS: Retry sent only the missing part, no new upload_prepare")
+    else:
+        print(f"  ✗ FAIL: {calls}")
+    file.close()
+
+
+async def test_file_attachment():
+    print("\n" + "=" * 80)
+    print("TEST: Videos over the single-shot limit as bitable_file attachments")
+    print("=" * 80)
+
+    video = b"\x00\x00\x00\x18ftypmp42" + bytes(i % 253 for i in range(6 * BLOCK_SIZE))
+    served["ad.mp4"] = video
+    prepared_parent_types.clear()
+    calls.clear()
+    token = await utils.download_and_upload_file("https://cdn.example.com/ad.mp4", "base_chunk")
+    session = sessions[token.removeprefix("tok-")]
+    if session["data"] == video and prepared_parent_types == ["bitable_file"] and "upload_all" not in calls:
+        print(f"  ✓ PASS: {len(video) // 1024} KB mp4 uploaded in {calls.count('upload_part')} parts as bitable_file")
+    else:
+        print(f"  ✗ FAIL: parent_types={prepared_parent_types} calls={calls}")
+
+    rejected = await utils.download_and_upload_image("https://cdn.example.com/ad.mp4", "base_chunk")
+    if rejected is None:
+        print("  ✓ PASS: The image path still rejects videos")
+    else:
+        print(f"  ✗ FAIL: Video uploaded as an image: {rejected}")
+
+    # Part 5 keeps failing: three upload attempts send it three times, not 3 x 3
+    served["other.mp4"] = b"\x00\x00\x00\x18ftypisom" + bytes(i % 241 for i in range(8 * BLOCK_SIZE))
+    failing_parts.add(5)
+    part_attempts.clear()
+    token = await utils.download_and_upload_file("https://cdn.example.com/other.mp4", "base_chunk")
+    failing_parts.clear()
+    if token is None and part_attempts[5] == 3:
+        print("  ✓ PASS: A failing part is sent once per upload attempt (3 in total)")
+    else:
+        print(f"  ✗ FAIL: token={token} part 5 attempts={part_attempts.get(5)}")
+
+
+async def main():
+    async with mock_http(handler):
+        utils.partial_uploads = PartialUploadStore(':memory:')
+        utils.FEISHU_UPLOAD_ALL_MAX_BYTES = 4 * BLOCK_SIZE
+        utils.IMAGE_RETRY_BASE_DELAY = 0.01
+        utils.FEISHU_UPLOAD_QPS = 1000
+        utils._upload_limiters.clear()
+
+        await test_size_switch()
+        await test_resume()
+        await test_file_attachment()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
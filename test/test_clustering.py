@@ -0,0 +1,118 @@
+"""
+Test near-duplicate headline clustering (MinHash + LSH) in clustering.py.
+"""
+import sys
+import os
+import random
+import string
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from clustering import HeadlineClusterer
+from models import TrendItem
+
+
+def make_item(title: str, source: str, url: str) -> TrendItem:
+    return TrendItem(title=title, url=url, published='', image_url='', source=source)
+
+
+def test_cross_source_duplicates():
+    """The same story from several feeds ends up in one cluster."""
+    print("=" * 80)
+    print("TEST: Cross-source near-duplicates")
+    print("=" * 80)
+
+    clusterer = HeadlineClusterer()
+    items = [
+        make_item("Israel and Hamas agree to ceasefire after weeks of talks in Cairo", "nytimes", "https://nyt.com/1"),
+        make_item("Israel, Hamas agree to ceasefire after weeks of talks in Cairo - Reuters", "google", "https://news.google.com/1"),
+        make_item("Israel and Hamas agree to ceasefire after weeks of talks in Cairo, officials say", "reddit", "https://reddit.com/1"),
+        make_item("Stock markets rally as Fed signals rate cut", "nytimes", "https://nyt.com/2"),
+    ]
+    clusterer.add_many(items)
+    groups = clusterer.representatives(items)
+
+    if len(groups) == 2 and groups[0][1].source_count == 3:
+        print(f"  ✓ PASS: {len(items)} items -> {len(groups)} clusters, first has 3 sources")
+    else:
+        print(f"  ✗ FAIL: {[(item.title, c.source_count) for item, c in groups]}")
+
+    # A story appears once per fetch, however many of its items a fetch holds
+    cluster = clusterer.cluster_of(items[0])
+    if cluster.appearances == 1 and cluster.size == 3:
+        print("  ✓ PASS: Three items in one batch count as one appearance")
+    else:
+        print(f"  ✗ FAIL: {cluster}")
+
+    for _ in range(5):
+        clusterer.add_many(items[:2])
+    if cluster.appearances == 6 and cluster.size == 3:
+        print("  ✓ PASS: Each refetch is one more appearance, without adding members")
+    else:
+        print(f"  ✗ FAIL: {cluster}")
+
+
+def test_linkless_items():
+    """Items without a link are told apart by their titles, not merged on the empty url."""
+    print("\n" + "=" * 80)
+    print("TEST: Link-less items")
+    print("=" * 80)
+
+    clusterer = HeadlineClusterer()
+    items = [
+        make_item("国产大飞机完成首次跨洋飞行", "zhihu", ""),
+        make_item("年轻人为什么开始流行存钱", "zhihu", ""),
+        make_item("国产大飞机完成首次跨洋飞行", "zhihu", ""),  # refetched
+    ]
+    clusters = clusterer.add_many(items)
+    representatives = clusterer.representatives(items)
+
+    if len(representatives) == 2 and clusters[0] is clusters[2] and clusters[0].appearances == 1:
+        print("  ✓ PASS: Two stories stay apart; the refetched one is recognised")
+    else:
+        print(f"  ✗ FAIL: {[(item.title, cluster.cluster_id) for item, cluster in representatives]}")
+
+
+def test_scaling():
+    """Tens of thousands of distinct headlines cluster in roughly linear time."""
+    print("\n" + "=" * 80)
+    print("TEST: Incremental clustering at scale")
+    print("=" * 80)
+
+    rng = random.Random(42)
+    words = [
+        "".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 9)))
+        for _ in range(5000)
+    ]
+    items = [
+        make_item(" ".join(rng.sample(words, 10)), "google", f"https://example.com/{i}")
+        for i in range(20_000)
+    ]
+
+    clusterer = HeadlineClusterer()
+    start = time.perf_counter()
+    clusterer.add_many(items[:10_000])
+    first_half = time.perf_counter() - start
+
+    start = time.perf_counter()
+    clusterer.add_many(items[10_000:])
+    second_half = time.perf_counter() - start
+
+    if len(clusterer) > 19_000:
+        print(f"  ✓ PASS: {len(clusterer)} clusters for {len(items)} distinct headlines")
+    else:
+        print(f"  ✗ FAIL: Only {len(clusterer)} clusters (too many false merges)")
+
+    # With LSH, adding against a larger history should not cost much more
+    if second_half < first_half * 2:
+        print(f"  ✓ PASS: 10k inserts took {first_half:.2f}s, next 10k took {second_half:.2f}s")
+    else:
+        print(f"  ✗ FAIL: Insert cost grew from {first_half:.2f}s to {second_half:.2f}s")
+
+
+if __name__ == "__main__":
+    test_cross_source_duplicates()
+    test_linkless_items()
+    test_scaling()
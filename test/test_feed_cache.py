@@ -0,0 +1,141 @@
+"""
+Test the conditional-GET feed cache used by parse_feeds, against a mock transport.
+"""
+import asyncio
+import sys
+import os
+import tempfile
+import threading
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import utils
+from feed_cache import FeedCache
+from mock_http import mock_http
+
+
+FEED_URL = "https://rss.example.com/World.xml"
+
+RSS_BODY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">
+  <channel>
+    <title>World</title>
+    <item>
+      <title>First headline</title>
+      <link>https://example.com/a</link>
+      <pubDate>Mon, 20 Oct 2025 10:00:00 +0000</pubDate>
+      <media:content url="https://example.com/a.jpg" medium="image"/>
+    </item>
+    <item>
+      <title>Second headline</title>
+      <link>https://example.com/b</link>
+      <pubDate>Mon, 20 Oct 2025 09:00:00 +0000</pubDate>
+    </item>
+  </channel>
+</rss>
+"""
+
+requests_seen = []
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    """Serve the feed with an ETag and answer 304 when it matches."""
+    requests_seen.append(request)
+    if request.headers.get('if-none-match') == '"v1"':
+        return httpx.Response(304)
+    return httpx.Response(200, content=RSS_BODY, headers={'ETag': '"v1"'})
+
+
+async def test_conditional_get():
+    """Second fetch sends If-None-Match and reuses cached items on 304."""
+    print("=" * 80)
+    print("TEST: Conditional GET with ETag")
+    print("=" * 80)
+
+    cache = FeedCache(path=None)
+    first = await utils.parse_feeds(FEED_URL, "nytimes", cache=cache)
+    second = await utils.parse_feeds(FEED_URL, "nytimes", cache=cache)
+
+    if len(first) == 2 and first == second:
+        print(f"  ✓ PASS: Same {len(second)} items returned after 304")
+    else:
+        print(f"  ✗ FAIL: first={first} second={second}")
+
+    if requests_seen[-1].headers.get('if-none-match') == '"v1"':
+        print("  ✓ PASS: If-None-Match sent on revalidation")
+    else:
+        print(f"  ✗ FAIL: Headers were {dict(requests_seen[-1].headers)}")
+
+
+async def test_ttl_skips_network():
+    """Within the TTL no request is made at all."""
+    print("\n" + "=" * 80)
+    print("TEST: TTL freshness window")
+    print("=" * 80)
+
+    cache = FeedCache(path=None)
+    await utils.parse_feeds(FEED_URL, "nytimes", cache=cache, ttl=60)
+    before = len(requests_seen)
+    items = await utils.parse_feeds(FEED_URL, "nytimes", cache=cache, ttl=60)
+
+    if len(requests_seen) == before and len(items) == 2:
+        print("  ✓ PASS: Fresh entry served without a request")
+    else:
+        print(f"  ✗ FAIL: {len(requests_seen) - before} extra request(s)")
+
+
+async def test_persistence():
+    """Entries written to disk are loaded by a new cache instance."""
+    print("\n" + "=" * 80)
+    print("TEST: Cache persistence")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "feeds.db")
+        cache = FeedCache(path=path)
+        writer_threads = []
+        save_entry = cache._save_entry
+
+        def recording_save(*args):
+            writer_threads.append(threading.current_thread())
+            save_entry(*args)
+
+        cache._save_entry = recording_save
+        await utils.parse_feeds(FEED_URL, "nytimes", cache=cache)
+        cache.store("https://rss.example.com/Other.xml", [], None, None)
+        cache.close()
+        reloaded = FeedCache(path=path)
+
+        if reloaded.conditional_headers(FEED_URL) == {'If-None-Match': '"v1"'} and len(reloaded.items(FEED_URL)) == 2:
+            print("  ✓ PASS: Validators and items reloaded from disk")
+        else:
+            print(f"  ✗ FAIL: Reloaded entries: {reloaded.entries}")
+
+        if len(writer_threads) == 2 and threading.main_thread() not in writer_threads:
+            print("  ✓ PASS: One row written per feed, off the event loop thread")
+        else:
+            print(f"  ✗ FAIL: Writes on {writer_threads}")
+
+        # An entry not refreshed within max_age is pruned on the next load
+        reloaded._writer.execute("UPDATE feed_entries SET fetched_at = 0 WHERE url = ?", (FEED_URL,))
+        reloaded.close()
+        pruned = FeedCache(path=path)
+        if list(pruned.entries) == ["https://rss.example.com/Other.xml"]:
+            print("  ✓ PASS: Stale entry pruned, fresh one kept")
+        else:
+            print(f"  ✗ FAIL: Entries after pruning: {list(pruned.entries)}")
+        pruned.close()
+
+
+async def main():
+    async with mock_http(handler):
+        await test_conditional_get()
+        await test_ttl_skips_network()
+        await test_persistence()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,178 @@
+"""
+Test buffered vs streaming feed parsing in utils.py, against a mock transport.
+"""
+import asyncio
+import sys
+import os
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import utils
+from mock_http import mock_http
+
+
+ITEM_COUNT = 500
+
+
+def build_rss(count: int) -> bytes:
+    """Build an RSS 2.0 document with `count` items."""
+    items = "".join(
+        f"""
+    <item>
+      <title>Headline {i}</title>
+      <link>https://example.com/{i}</link>
+      <pubDate>Mon, 20 Oct 2025 10:00:00 +0000</pubDate>
+      <enclosure url="https://example.com/{i}.jpg" type="image/jpeg"/>
+    </item>"""
+        for i in range(count)
+    )
+    return f"""<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:media="http://search.yahoo.com/mrss/">
+  <channel><title>Big feed</title>{items}
+  </channel>
+</rss>
+""".encode('utf-8')
+
+
+ATOM_BODY = b"""<?xml version="1.0" encoding="UTF-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom" xmlns:media="http://search.yahoo.com/mrss/">
+  <entry>
+    <title>Reddit post</title>
+    <link href="https://www.reddit.com/r/worldnews/comments/1"/>
+    <published>2025-10-20T10:00:00+00:00</published>
+    <media:thumbnail url="https://i.redd.it/1.jpg"/>
+  </entry>
+</feed>
+"""
+
+RSS_BODY = build_rss(ITEM_COUNT)
+CHUNK_SIZE = 1024
+chunks_served = 0
+
+
+async def chunked_body(body: bytes):
+    """Serve the body in small chunks, counting how many were read."""
+    global chunks_served
+    for i in range(0, len(body), CHUNK_SIZE):
+        chunks_served += 1
+        yield body[i:i + CHUNK_SIZE]
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    body = ATOM_BODY if 'reddit' in request.url.host else RSS_BODY
+    return httpx.Response(200, content=chunked_body(body))
+
+
+async def test_stream_matches_buffered():
+    """Streaming and buffered parsing produce the same items."""
+    print("=" * 80)
+    print("TEST: Streaming parser matches buffered parser")
+    print("=" * 80)
+
+    buffered = await utils.parse_feeds("https://rss.example.com/big.xml", "nytimes")
+    streamed = await utils.parse_feeds("https://rss.example.com/big.xml", "nytimes", stream=True)
+
+    if len(streamed) == ITEM_COUNT and streamed == buffered:
+        print(f"  ✓ PASS: {len(streamed)} identical items")
+    else:
+        print(f"  ✗ FAIL: buffered={len(buffered)} streamed={len(streamed)}")
+
+    reddit = await utils.parse_feeds("https://www.reddit.com/r/worldnews/.rss", "reddit", stream=True)
+    if reddit and reddit[0].image_url == "https://i.redd.it/1.jpg":
+        print("  ✓ PASS: Atom entries parsed in streaming mode")
+    else:
+        print(f"  ✗ FAIL: Atom items: {reddit}")
+
+
+async def test_early_cutoff():
+    """With a limit, the socket is not read past the last needed item."""
+    global chunks_served
+    print("\n" + "=" * 80)
+    print("TEST: Early cutoff")
+    print("=" * 80)
+
+    chunks_served = 0
+    items = await utils.parse_feeds("https://rss.example.com/big.xml", "nytimes", limit=5, stream=True)
+    total_chunks = -(-len(RSS_BODY) // CHUNK_SIZE)
+
+    if [item.title for item in items] == [f"Headline {i}" for i in range(5)]:
+        print("  ✓ PASS: First 5 items returned")
+    else:
+        print(f"  ✗ FAIL: Items: {items}")
+
+    if chunks_served < total_chunks / 10:
+        print(f"  ✓ PASS: Read {chunks_served}/{total_chunks} chunks")
+    else:
+        print(f"  ✗ FAIL: Read {chunks_served}/{total_chunks} chunks")
+
+
+async def count_loop_ticks(coro) -> tuple[object, int]:
+    """Run `coro` and count how often the event loop got to run another task meanwhile."""
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)  # let the ticker start
+    ticks = 0
+    result = await coro
+    counted = ticks
+    task.cancel()
+    return result, counted
+
+
+async def test_offloaded_parsing():
+    """Thread and process pools return the same items without stalling the loop."""
+    print("\n" + "=" * 80)
+    print("TEST: Parsing in a worker pool")
+    print("=" * 80)
+
+    body = build_rss(20_000)
+    # Start the worker processes up front so pool startup isn't measured
+    await utils.parse_feed_content_async(RSS_BODY, "nytimes", mode='process')
+    inline, inline_ticks = await count_loop_ticks(utils.parse_feed_content_async(body, "nytimes", mode='inline'))
+    threaded, thread_ticks = await count_loop_ticks(utils.parse_feed_content_async(body, "nytimes", mode='thread'))
+    processed, process_ticks = await count_loop_ticks(utils.parse_feed_content_async(body, "nytimes", mode='process'))
+
+    if inline == threaded == processed and len(processed) == 20_000:
+        print("  ✓ PASS: inline, thread and process modes agree")
+    else:
+        print(f"  ✗ FAIL: inline={len(inline)} thread={len(threaded)} process={len(processed)}")
+
+    # Inline parsing holds the loop for the whole parse; offloaded parsing lets other tasks run
+    if inline_ticks == 0 and thread_ticks > 0 and process_ticks > 0:
+        print(f"  ✓ PASS: Loop ran other tasks 0 times inline, {thread_ticks} threaded, {process_ticks} in a process")
+    else:
+        print(f"  ✗ FAIL: Loop ticks inline={inline_ticks} thread={thread_ticks} process={process_ticks}")
+
+    # Workers come from the fork server, not forked from this (multi-threaded) process
+    worker_parent = await asyncio.get_running_loop().run_in_executor(utils._get_parse_executor('process'), os.getppid)
+    if worker_parent != os.getpid():
+        print("  ✓ PASS: Parse workers are started by the fork server")
+    else:
+        print("  ✗ FAIL: Parse workers were forked from the application process")
+
+    if utils._parse_mode(1024, 'auto') == 'inline' and utils._parse_mode(len(body), 'auto') != 'inline':
+        print("  ✓ PASS: auto mode only offloads large payloads")
+    else:
+        print("  ✗ FAIL: auto mode thresholds")
+
+    utils.shutdown_parse_pools()
+
+
+async def main():
+    async with mock_http(handler):
+        await test_stream_matches_buffered()
+        await test_early_cutoff()
+        await test_offloaded_parsing()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Test concurrent RSS fetching in topic.py without hitting the network.
+"""
+import asyncio
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import topic
+from models import TrendItem
+
+
+FAKE_RSS_DICT = {
+    "fast": "https://example.com/fast.xml",
+    "slow": "https://example.com/slow.xml",
+    "broken": "https://example.com/broken.xml",
+    "hung": "https://example.com/hung.xml",
+}
+
+
+async def fake_parse_feeds(url: str, source: str, **kwargs) -> list[TrendItem]:
+    """Simulate feeds with different latencies and failures."""
+    if source == "fast":
+        await asyncio.sleep(0.1)
+    elif source == "slow":
+        await asyncio.sleep(0.5)
+    elif source == "broken":
+        raise RuntimeError("HTTP 503")
+    elif source == "hung":
+        await asyncio.sleep(60)
+
+    return [TrendItem(title=f"{source} headline", url=url, published='', image_url='', source=source)]
+
+
+async def test_partial_results():
+    """A failing and a hung source must not abort the healthy ones."""
+    print("=" * 80)
+    print("TEST: Concurrent fetch with partial results")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    trends, errors = await topic._fetch_trends_from_rss(concurrency=4, timeout=1.0)
+    elapsed = time.perf_counter() - start
+
+    titles = sorted(t.title for t in trends)
+    if titles == ["fast headline", "slow headline"]:
+        print(f"  ✓ PASS: Got trends from healthy sources: {titles}")
+    else:
+        print(f"  ✗ FAIL: Unexpected trends: {titles}")
+
+    if set(errors) == {"broken", "hung"}:
+        print(f"  ✓ PASS: Failed sources reported: {errors}")
+    else:
+        print(f"  ✗ FAIL: Unexpected errors: {errors}")
+
+    # Latency should be bounded by the timeout, not the sum of all feeds
+    if elapsed < 1.5:
+        print(f"  ✓ PASS: Finished in {elapsed:.2f}s")
+    else:
+        print(f"  ✗ FAIL: Took {elapsed:.2f}s")
+
+
+async def test_concurrency_limit():
+    """With concurrency=1 the healthy sources run one after another."""
+    print("\n" + "=" * 80)
+    print("TEST: Concurrency limit")
+    print("=" * 80)
+
+    start = time.perf_counter()
+    trends, errors = await topic._fetch_trends_from_rss(concurrency=1, timeout=1.0)
+    elapsed = time.perf_counter() - start
+
+    # fast (0.1) + slow (0.5) + broken (0) + hung (timeout 1.0)
+    if elapsed >= 1.5:
+        print(f"  ✓ PASS: Sequential fetch took {elapsed:.2f}s")
+    else:
+        print(f"  ✗ FAIL: Sources were not serialised ({elapsed:.2f}s)")
+
+
+async def main():
+    topic.RSS_DICT = FAKE_RSS_DICT
+    topic.parse_feeds = fake_parse_feeds
+
+    await test_partial_results()
+    await test_concurrency_limit()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
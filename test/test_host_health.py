@@ -0,0 +1,146 @@
+"""
+Test the per-host circuit breaker and how fetch_trends_from_rss reports skipped hosts.
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import topic
+from feed_cache import FeedCache
+from host_health import CircuitOpenError, HostHealth, parse_retry_after
+from models import TrendItem
+from seen_index import SeenIndex
+
+
+FAKE_RSS_DICT = {
+    "nytimes": "https://rss.example.com/nyt.xml",
+    "zhihu": "https://rsshub.example.com/zhihu/hot",
+}
+
+zhihu_calls = 0
+
+
+async def fake_parse_feeds(url: str, source: str, **kwargs) -> list[TrendItem]:
+    """zhihu's host rate-limits; nytimes is healthy."""
+    global zhihu_calls
+    if source == "zhihu":
+        zhihu_calls += 1
+        request = httpx.Request("GET", url)
+        response = httpx.Response(429, headers={"Retry-After": "120"}, request=request)
+        raise httpx.HTTPStatusError("429 Too Many Requests", request=request, response=response)
+    return [TrendItem(title="World news", url="https://nytimes.com/1", published='', image_url='', source=source)]
+
+
+def test_breaker_states():
+    """Threshold, cool-down, half-open probe and reset."""
+    print("=" * 80)
+    print("TEST: Circuit breaker states")
+    print("=" * 80)
+
+    health = HostHealth(failure_threshold=3, base_cooldown=0.2, jitter=0)
+    url = "https://down.example.com/feed"
+
+    for _ in range(2):
+        health.check(url)
+        health.record_failure(url)
+    health.check(url)  # still closed after 2 failures
+    health.record_failure(url)
+
+    try:
+        health.check(url)
+        print("  ✗ FAIL: Circuit still closed after 3 failures")
+    except CircuitOpenError as e:
+        print(f"  ✓ PASS: Opened after 3 failures ({e})")
+
+    time.sleep(0.25)
+    health.check(url)  # probe allowed
+    try:
+        health.check(url)
+        print("  ✗ FAIL: Second request let through during the probe")
+    except CircuitOpenError:
+        print("  ✓ PASS: Only one probe in half-open state")
+
+    # Failed probe re-opens with a doubled cool-down
+    health.record_failure(url)
+    retry_in = health.open_hosts()["down.example.com"]
+    if 0.3 < retry_in <= 0.4:
+        print(f"  ✓ PASS: Re-opened for {retry_in}s")
+    else:
+        print(f"  ✗ FAIL: Re-opened for {retry_in}s")
+
+    time.sleep(0.45)
+    health.check(url)
+    health.record_success(url)
+    if not health.open_hosts():
+        print("  ✓ PASS: Successful probe closes the circuit")
+    else:
+        print(f"  ✗ FAIL: {health.open_hosts()}")
+
+    if parse_retry_after("120") == 120 and parse_retry_after("bogus") is None:
+        print("  ✓ PASS: Retry-After parsing")
+    else:
+        print("  ✗ FAIL: Retry-After parsing")
+
+
+async def test_tool_skips_open_host():
+    """A 429 with Retry-After opens the circuit; later calls skip the host."""
+    print("\n" + "=" * 80)
+    print("TEST: Tool skips rate-limited host")
+    print("=" * 80)
+
+    first = json.loads((await topic.fetch_trends_from_rss.handler({}))['content'][0]['text'])
+    start = time.perf_counter()
+    second = json.loads((await topic.fetch_trends_from_rss.handler({}))['content'][0]['text'])
+    elapsed = time.perf_counter() - start
+
+    if first['returned_count'] == 1 and 'zhihu' in first['failed_sources']:
+        print(f"  ✓ PASS: First call: {first['failed_sources']}")
+    else:
+        print(f"  ✗ FAIL: First call: {first}")
+
+    skipped = second['skipped_hosts'].get('rsshub.example.com')
+    if zhihu_calls == 1 and skipped and skipped >= 100 and second['failed_sources']['zhihu'].startswith('Skipped'):
+        print(f"  ✓ PASS: Second call skipped the host in {elapsed * 1000:.1f}ms, retry in {skipped}s")
+    else:
+        print(f"  ✗ FAIL: calls={zhihu_calls} second={second}")
+
+
+async def test_fresh_cache_served_while_open():
+    """A still-fresh cached feed is served even though its host is cooling down."""
+    print("\n" + "=" * 80)
+    print("TEST: Fresh cache bypasses an open circuit")
+    print("=" * 80)
+
+    url = FAKE_RSS_DICT["zhihu"]
+    cached = [TrendItem(title="知乎热榜", url="https://zhihu.com/1", published='', image_url='', source="zhihu")]
+    topic.feed_cache.store(url, cached, None, None)
+    result = json.loads((await topic.fetch_trends_from_rss.handler({}))['content'][0]['text'])
+
+    titles = [item['title'] for item in result['trends']]
+    if "知乎热榜" in titles and 'zhihu' not in result['failed_sources'] and zhihu_calls == 1:
+        print(f"  ✓ PASS: Cached zhihu items served without a request: {titles}")
+    else:
+        print(f"  ✗ FAIL: calls={zhihu_calls} result={result}")
+
+
+async def main():
+    topic.RSS_DICT = FAKE_RSS_DICT
+    topic.parse_feeds = fake_parse_feeds
+    topic.seen_index = SeenIndex(':memory:')
+    topic.host_health = HostHealth()
+    topic.feed_cache = FeedCache(':memory:')
+
+    test_breaker_states()
+    await test_tool_skips_open_host()
+    await test_fresh_cache_served_while_open()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
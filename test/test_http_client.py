@@ -0,0 +1,119 @@
+"""
+Test the pooled per-host httpx clients (http_client.py): LRU cap, idle eviction and closing.
+"""
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from http_client import HttpClientManager
+
+
+async def test_reuse_and_cap():
+    print("=" * 80)
+    print("TEST: One client per host, least recently used evicted beyond the cap")
+    print("=" * 80)
+
+    manager = HttpClientManager(max_clients=3, close_grace=0.05)
+    a = manager.get("https://a.example.com/feed.xml")
+    same = manager.get("https://A.example.com/other.jpg")
+    if a is same:
+        print("  ✓ PASS: Same host shares one client")
+    else:
+        print("  ✗ FAIL: Same host got two clients")
+
+    b = manager.get("https://b.example.com/")
+    manager.get("https://c.example.com/")
+    manager.get("https://a.example.com/")  # a is now the most recently used
+    d = manager.get("https://d.example.com/")
+    if len(manager) == 3 and manager.evictions == 1 and manager.get("https://a.example.com/") is a:
+        print("  ✓ PASS: Cap of 3 evicted the least recently used host (b), kept a")
+    else:
+        print(f"  ✗ FAIL: {len(manager)} clients, {manager.evictions} evictions")
+
+    if not b.is_closed:
+        print("  ✓ PASS: Evicted client stays open during its grace period")
+    else:
+        print("  ✗ FAIL: Evicted client closed at once")
+    await asyncio.sleep(0.1)
+    if b.is_closed and not d.is_closed:
+        print("  ✓ PASS: Evicted client closed after the grace period")
+    else:
+        print(f"  ✗ FAIL: evicted closed={b.is_closed}, kept closed={d.is_closed}")
+
+    await manager.aclose()
+
+
+async def test_idle_eviction():
+    print("\n" + "=" * 80)
+    print("TEST: Idle clients are evicted")
+    print("=" * 80)
+
+    manager = HttpClientManager(idle_timeout=0.05, close_grace=0)
+    idle = manager.get("https://idle.example.com/")
+    await asyncio.sleep(0.1)
+    manager.get("https://busy.example.com/")
+    await asyncio.sleep(0)
+    if len(manager) == 1 and idle.is_closed:
+        print("  ✓ PASS: Client unused past the idle timeout was evicted and closed")
+    else:
+        print(f"  ✗ FAIL: {len(manager)} clients, idle closed={idle.is_closed}")
+
+    await manager.aclose()
+
+
+async def test_aclose():
+    print("\n" + "=" * 80)
+    print("TEST: aclose closes pooled and evicted clients")
+    print("=" * 80)
+
+    manager = HttpClientManager(max_clients=1, close_grace=3600)
+    evicted = manager.get("https://a.example.com/")
+    pooled = manager.get("https://b.example.com/")
+    await manager.aclose()
+    if evicted.is_closed and pooled.is_closed and len(manager) == 0:
+        print("  ✓ PASS: Both closed without waiting out the grace period")
+    else:
+        print(f"  ✗ FAIL: evicted closed={evicted.is_closed}, pooled closed={pooled.is_closed}")
+    await manager.aclose()
+
+
+def test_loop_shutdown():
+    print("\n" + "=" * 80)
+    print("TEST: Clients are closed with their event loop")
+    print("=" * 80)
+
+    manager = HttpClientManager(max_clients=1, close_grace=3600)
+    clients = []
+
+    async def use():
+        clients.append(manager.get("https://a.example.com/"))
+        clients.append(manager.get("https://b.example.com/"))  # evicts a
+
+    asyncio.run(use())
+    if all(client.is_closed for client in clients) and len(manager) == 0:
+        print("  ✓ PASS: Pooled and evicted clients closed when asyncio.run returned")
+    else:
+        print(f"  ✗ FAIL: closed={[client.is_closed for client in clients]}, {len(manager)} left")
+
+    async def reuse():
+        return manager.get("https://b.example.com/")
+
+    fresh = asyncio.run(reuse())
+    if fresh is not clients[1] and fresh.is_closed:
+        print("  ✓ PASS: A new loop gets a new client, closed with that loop too")
+    else:
+        print("  ✗ FAIL: Client reused across loops")
+
+
+async def main():
+    await test_reuse_and_cap()
+    await test_idle_eviction()
+    await test_aclose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
+    test_loop_shutdown()
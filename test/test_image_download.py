@@ -0,0 +1,114 @@
+"""
+Test streaming image downloads with early size/type rejection in utils.py, against a mock transport.
+"""
+import asyncio
+import sys
+import os
+import time
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import utils
+from mock_http import mock_http
+from utils import ImageRejectedError
+
+
+PNG = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+CHUNK_SIZE = 64 * 1024
+chunks_served = 0
+
+
+async def slow_body(head: bytes, total: int):
+    """Serve `total` bytes starting with `head`, slowly, counting chunks."""
+    global chunks_served
+    sent = 0
+    while sent < total:
+        chunk = (head if sent == 0 else b"") + b"\x00" * (CHUNK_SIZE - (len(head) if sent == 0 else 0))
+        chunks_served += 1
+        sent += len(chunk)
+        await asyncio.sleep(0.01)
+        yield chunk
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    path = request.url.path
+    if path == "/ok.png":
+        return httpx.Response(200, content=PNG, headers={"content-type": "image/png"})
+    if path == "/noext":
+        return httpx.Response(200, content=PNG, headers={"content-type": "application/octet-stream"})
+    if path == "/error.jpg":
+        return httpx.Response(200, content=b"<html>Access denied</html>", headers={"content-type": "text/html"})
+    if path == "/lying.jpg":
+        # Claims to be an image but is an HTML page, served slowly
+        return httpx.Response(200, content=slow_body(b"<!DOCTYPE html>", 50 * CHUNK_SIZE),
+                              headers={"content-type": "image/jpeg"})
+    if path == "/declared-huge.jpg":
+        return httpx.Response(200, content=slow_body(b"\xff\xd8\xff", 50 * CHUNK_SIZE),
+                              headers={"content-type": "image/jpeg", "content-length": str(50 * 1024 * 1024)})
+    if path == "/chunked-huge.jpg":
+        # No Content-Length: the cap has to be enforced while streaming
+        return httpx.Response(200, content=slow_body(b"\xff\xd8\xff", 50 * CHUNK_SIZE),
+                              headers={"content-type": "image/jpeg"})
+    return httpx.Response(404)
+
+
+async def expect_rejected(url: str, **kwargs) -> tuple[str, float, int]:
+    global chunks_served
+    chunks_served = 0
+    start = time.perf_counter()
+    try:
+        await utils.download_image(url, **kwargs)
+        return "accepted", time.perf_counter() - start, chunks_served
+    except ImageRejectedError as e:
+        return str(e), time.perf_counter() - start, chunks_served
+
+
+async def test_accepts_images():
+    print("=" * 80)
+    print("TEST: Valid images")
+    print("=" * 80)
+
+    data, filename = await utils.download_image("https://img.example.com/ok.png")
+    _, noext_name = await utils.download_image("https://img.example.com/noext")
+    if data == PNG and filename == "ok.png" and noext_name == "image.png":
+        print(f"  ✓ PASS: {filename}, {noext_name} (type sniffed from magic bytes)")
+    else:
+        print(f"  ✗ FAIL: {filename} {noext_name}")
+
+
+async def test_rejects_early():
+    print("\n" + "=" * 80)
+    print("TEST: Early rejection")
+    print("=" * 80)
+
+    cases = [
+        ("HTML error page", "https://img.example.com/error.jpg", {}),
+        ("HTML behind image/jpeg", "https://img.example.com/lying.jpg", {}),
+        ("Content-Length over cap", "https://img.example.com/declared-huge.jpg", {}),
+        ("Streamed past cap", "https://img.example.com/chunked-huge.jpg", {'max_bytes': 4 * CHUNK_SIZE}),
+    ]
+    for name, url, kwargs in cases:
+        message, elapsed, chunks = await expect_rejected(url, **kwargs)
+        if message != "accepted" and chunks <= 5:
+            print(f"  ✓ PASS: {name}: {message} ({elapsed * 1000:.0f}ms, {chunks} chunk(s) read)")
+        else:
+            print(f"  ✗ FAIL: {name}: {message} after {chunks} chunks")
+
+    message, _, _ = await expect_rejected("https://img.example.com/error.jpg", stream=False)
+    if message.startswith("Not an image"):
+        print("  ✓ PASS: Buffered mode applies the same checks")
+    else:
+        print(f"  ✗ FAIL: Buffered mode: {message}")
+
+
+async def main():
+    async with mock_http(handler):
+        await test_accepts_images()
+        await test_rejects_early()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,122 @@
+"""
+Test that large images are spooled to disk and streamed into the upload body, keeping peak memory bounded.
+"""
+import asyncio
+import sys
+import os
+import tracemalloc
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import utils
+from mock_http import mock_http
+from upload_cache import UploadCache, UrlTokenCache
+
+
+IMAGE_SIZE = 8 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+IMAGES = 6
+uploaded_sizes = []
+
+
+async def image_body(index: int):
+    """An IMAGE_SIZE JPEG, generated chunk by chunk so the server side holds no copy."""
+    yield b"\xff\xd8\xff" + bytes([index]) * (CHUNK_SIZE - 3)
+    for _ in range(IMAGE_SIZE // CHUNK_SIZE - 1):
+        yield bytes([index]) * CHUNK_SIZE
+
+
+class StreamingTransport(httpx.AsyncBaseTransport):
+    """
+    Like httpx.MockTransport, but consumes request bodies as a stream
+    instead of reading them into memory first.
+    """
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.path.endswith("/tenant_access_token/internal"):
+            return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+        if request.url.path.endswith("/medias/upload_all"):
+            received = 0
+            async for chunk in request.stream:
+                received += len(chunk)
+            uploaded_sizes.append(received)
+            return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok{len(uploaded_sizes)}"}})
+        index = int(request.url.path.strip("/").split(".")[0].split("-")[1])
+        return httpx.Response(200, content=image_body(index), headers={"content-type": "image/jpeg"})
+
+
+async def upload_batch(prefix: str, spooled: bool) -> tuple[list, int]:
+    """Upload IMAGES large images concurrently; return the tokens and the peak traced memory."""
+    utils.upload_cache = UploadCache(':memory:')
+    utils.url_token_cache = UrlTokenCache(':memory:')
+
+    async def buffered(url: str) -> str:
+        data, filename = await utils.download_image(url)
+        return await utils.upload_image_to_lark(data, filename, "base_spool")
+
+    urls = [f"https://img.example.com/{prefix}-{i}.jpg" for i in range(IMAGES)]
+    tracemalloc.start()
+    if spooled:
+        tokens = await asyncio.gather(*(utils.download_and_upload_image(url, "base_spool") for url in urls))
+    else:
+        tokens = await asyncio.gather(*(buffered(url) for url in urls))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return tokens, peak
+
+
+async def test_bounded_memory():
+    print("=" * 80)
+    print(f"TEST: Peak memory for {IMAGES} concurrent {IMAGE_SIZE // (1024 * 1024)} MB uploads")
+    print("=" * 80)
+
+    # Warm up the token cache so it isn't part of the measurement
+    await utils.get_tenant_access_token()
+
+    uploaded_sizes.clear()
+    tokens, spooled_peak = await upload_batch("spool", spooled=True)
+    bodies_ok = len(uploaded_sizes) == IMAGES and all(size > IMAGE_SIZE for size in uploaded_sizes)
+    if all(tokens) and bodies_ok:
+        print(f"  ✓ PASS: {IMAGES} images uploaded from spooled files, full bodies received")
+    else:
+        print(f"  ✗ FAIL: tokens={tokens} bodies={uploaded_sizes}")
+
+    _, buffered_peak = await upload_batch("buffered", spooled=False)
+    print(f"  Peak memory: spooled {spooled_peak / 2**20:.1f} MB, buffered {buffered_peak / 2**20:.1f} MB")
+
+    # Spooled: at most the spool threshold per image in memory, not the image itself
+    if spooled_peak < IMAGES * utils.IMAGE_SPOOL_THRESHOLD + 4 * 2**20 and spooled_peak < buffered_peak / 4:
+        print("  ✓ PASS: Peak memory stays bounded independent of image size")
+    else:
+        print("  ✗ FAIL: Spooled uploads held the images in memory")
+
+
+async def test_small_images_stay_in_memory():
+    print("\n" + "=" * 80)
+    print("TEST: Small images are not spooled")
+    print("=" * 80)
+
+    image = await utils.download_image_spooled("https://img.example.com/small-1.jpg", spool_threshold=IMAGE_SIZE)
+    spooled = await utils.download_image_spooled("https://img.example.com/large-1.jpg")
+    if isinstance(image.data, bytes) and not isinstance(spooled.data, bytes) and image.sha256 == spooled.sha256:
+        print("  ✓ PASS: In memory below the threshold, temporary file above it (same sha256)")
+    else:
+        print(f"  ✗ FAIL: {type(image.data)} {type(spooled.data)}")
+    image.close()
+    spooled.close()
+
+
+async def main():
+    async with mock_http(StreamingTransport()):
+        await test_bounded_memory()
+        await test_small_images_stay_in_memory()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,195 @@
+"""
+Test the optional downscale/re-encode stage (image_transform.py) before upload.
+"""
+import asyncio
+import contextlib
+import io
+import sys
+import os
+import time
+from io import BytesIO
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import image_transform
+import utils
+from mock_http import mock_http
+
+
+uploaded = {}
+
+
+def make_photo() -> bytes:
+    """A 3000x2000 PNG with photo-like detail (a few MB)."""
+    from PIL import Image
+    gradient = Image.linear_gradient('L').resize((3000, 2000))
+    noise = Image.effect_noise((3000, 2000), 40)
+    fractal = Image.effect_mandelbrot((3000, 2000), (-2.0, -1.2, 1.0, 1.2), 60)
+    out = BytesIO()
+    Image.merge('RGB', (gradient, noise, fractal)).save(out, format='PNG')
+    return out.getvalue()
+
+
+PHOTO = make_photo() if image_transform.PIL_AVAILABLE else b""
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+    if request.url.path.endswith("/medias/upload_all"):
+        token = f"tok{len(uploaded)}"
+        uploaded[token] = request.content
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": token}})
+    return httpx.Response(200, content=PHOTO, headers={"content-type": "image/png"})
+
+
+async def test_transform():
+    print("=" * 80)
+    print("TEST: Downscale and re-encode before upload")
+    print("=" * 80)
+
+    from PIL import Image
+
+    image_transform.IMAGE_TRANSFORM = False
+    original_token = await utils.download_and_upload_image("https://img.example.com/original.png", "base_t")
+
+    image_transform.IMAGE_TRANSFORM = True
+    start = time.perf_counter()
+    # Another Base: in "base_t" the same original bytes would be served from the upload cache
+    token = await utils.download_and_upload_image("https://img.example.com/collage.png", "base_t2")
+    elapsed = time.perf_counter() - start
+
+    original_body = uploaded[original_token]
+    body = uploaded[token]
+    jpeg = body[body.index(b"\xff\xd8\xff"):body.rindex(b"\xff\xd9") + 2]
+    with Image.open(BytesIO(jpeg)) as image:
+        size = image.size
+    if max(size) == image_transform.IMAGE_TRANSFORM_MAX_DIM and b'filename="collage.jpg"' in body:
+        print(f"  ✓ PASS: 3000x2000 PNG uploaded as {size[0]}x{size[1]} collage.jpg ({elapsed:.2f}s)")
+    else:
+        print(f"  ✗ FAIL: size={size}")
+
+    ratio = len(original_body) / len(body)
+    if ratio > 5:
+        print(f"  ✓ PASS: Upload body {len(original_body) // 1024} KB -> {len(body) // 1024} KB ({ratio:.0f}x smaller)")
+    else:
+        print(f"  ✗ FAIL: Only {ratio:.1f}x smaller")
+
+
+async def test_spool_and_cache():
+    print("\n" + "=" * 80)
+    print("TEST: Workers read spooled files; originals hit the cache before transforming")
+    print("=" * 80)
+
+    image_transform.IMAGE_TRANSFORM = True
+    sources = []
+    run_in_image_pool = image_transform.run_in_image_pool
+
+    async def recording_pool(func, *args):
+        sources.append(args[0])
+        return await run_in_image_pool(func, *args)
+
+    image_transform.run_in_image_pool = recording_pool
+    try:
+        uploads_before = len(uploaded)
+        first = await utils.download_and_upload_image("https://img.example.com/banner.png", "base_spool")
+        # Same original bytes at another URL: the URL cache misses, the content cache doesn't
+        second = await utils.download_and_upload_image("https://img.example.com/banner-copy.png", "base_spool")
+    finally:
+        image_transform.run_in_image_pool = run_in_image_pool
+
+    if len(sources) == 1 and isinstance(sources[0], str):
+        print(f"  ✓ PASS: The {len(PHOTO) // 1024} KB original went to the worker as a file path")
+    else:
+        print(f"  ✗ FAIL: Worker arguments {[type(source).__name__ for source in sources]}")
+
+    if first == second and len(uploaded) == uploads_before + 1:
+        print("  ✓ PASS: Repeat original found by its own hash, no second transform or upload")
+    else:
+        print(f"  ✗ FAIL: first={first} second={second} uploads={len(uploaded) - uploads_before}")
+
+
+async def test_event_loop_free():
+    print("\n" + "=" * 80)
+    print("TEST: Encoding runs off the event loop")
+    print("=" * 80)
+
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    await asyncio.gather(*(image_transform.transform_image(PHOTO, quality=70 + i) for i in range(4)))
+    elapsed = time.perf_counter() - start
+    task.cancel()
+
+    # The ticker keeps running while four images are encoded in the pool
+    if ticks >= elapsed / 0.01 / 3:
+        print(f"  ✓ PASS: {ticks} loop ticks during {elapsed:.2f}s of encoding")
+    else:
+        print(f"  ✗ FAIL: Only {ticks} ticks in {elapsed:.2f}s")
+
+
+async def test_small_images_untouched():
+    print("\n" + "=" * 80)
+    print("TEST: Small images are uploaded as they are")
+    print("=" * 80)
+
+    small = b"\x89PNG\r\n\x1a\n" + b"\x00" * 1000
+    if await image_transform.transform_image(small) is None:
+        print("  ✓ PASS: Below IMAGE_TRANSFORM_MIN_BYTES, no transform")
+    else:
+        print("  ✗ FAIL: Small image transformed")
+
+
+def test_missing_pillow_warning():
+    """Enabling the transform without Pillow warns once instead of silently doing nothing."""
+    print("\n" + "=" * 80)
+    print("TEST: Transform enabled without Pillow")
+    print("=" * 80)
+
+    saved = image_transform.PIL_AVAILABLE, image_transform.IMAGE_TRANSFORM
+    image_transform.PIL_AVAILABLE, image_transform.IMAGE_TRANSFORM = False, True
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            enabled = [image_transform.transform_enabled() for _ in range(3)]
+    finally:
+        image_transform.PIL_AVAILABLE, image_transform.IMAGE_TRANSFORM = saved
+        image_transform._pillow_warnings.discard('IMAGE_TRANSFORM')
+
+    warnings = output.getvalue().splitlines()
+    if enabled == [False] * 3 and len(warnings) == 1 and "'pillow' extra" in warnings[0]:
+        print(f"  ✓ PASS: Disabled with one warning: {warnings[0]}")
+    else:
+        print(f"  ✗ FAIL: enabled={enabled} warnings={warnings}")
+
+
+async def main():
+    test_missing_pillow_warning()
+    if not image_transform.PIL_AVAILABLE:
+        print("Pillow is not installed; the transform stage is a no-op")
+        return
+
+    async with mock_http(handler):
+        await test_transform()
+        await test_spool_and_cache()
+        await test_event_loop_free()
+        await test_small_images_untouched()
+
+        image_transform.shutdown_transform_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
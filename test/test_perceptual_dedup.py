@@ -0,0 +1,217 @@
+"""
+Test perceptual-hash deduplication of near-identical images (perceptual_index.py and utils.py).
+"""
+import asyncio
+import contextlib
+import io
+import random
+import sys
+import os
+import tempfile
+import time
+from io import BytesIO
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import image_transform
+import perceptual_index
+import utils
+from mock_http import mock_http
+from perceptual_index import PerceptualIndex, dhash, hamming_distance
+
+
+images: dict[str, bytes] = {}
+upload_calls = 0
+
+
+def encode(image, fmt: str = 'JPEG', **kwargs) -> bytes:
+    out = BytesIO()
+    image.save(out, format=fmt, **kwargs)
+    return out.getvalue()
+
+
+def make_images():
+    """One photo in several crops/sizes/qualities, plus an unrelated one."""
+    from PIL import Image
+    size = (1200, 800)
+    photo = Image.merge('RGB', (
+        Image.effect_mandelbrot(size, (-2.0, -1.2, 1.0, 1.2), 80),
+        Image.linear_gradient('L').resize(size),
+        Image.effect_mandelbrot(size, (-1.8, -1.0, 0.8, 1.0), 40),
+    ))
+    other = Image.merge('RGB', (
+        Image.effect_mandelbrot(size, (-0.8, -0.3, -0.5, 0.0), 120),
+        Image.linear_gradient('L').rotate(90).resize(size),
+        Image.effect_noise(size, 60),
+    ))
+    images["/original.jpg"] = encode(photo, quality=95)
+    images["/small.jpg"] = encode(photo.resize((600, 400)), quality=60)
+    images["/cropped.jpg"] = encode(photo.crop((20, 12, 1180, 788)), quality=85)
+    images["/recompressed.webp"] = encode(photo, 'WEBP', quality=50)
+    images["/thumb.png"] = encode(photo.resize((300, 200)), 'PNG')
+    images["/tight-crop.jpg"] = encode(photo.crop((300, 200, 1200, 800)), quality=90)
+    images["/other.jpg"] = encode(other, quality=90)
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global upload_calls
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+    if request.url.path.endswith("/medias/upload_all"):
+        upload_calls += 1
+        token = f"tok{upload_calls}"
+        await asyncio.sleep(0.2)  # uploads are far slower than hashing
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": token}})
+    data = images.get(request.url.path)
+    if data is None:
+        return httpx.Response(404)
+    content_type = "image/webp" if request.url.path.endswith(".webp") else "image/jpeg"
+    return httpx.Response(200, content=data, headers={"content-type": content_type})
+
+
+def test_hash_distances():
+    print("=" * 80)
+    print("TEST: dHash distances")
+    print("=" * 80)
+
+    original = dhash(images["/original.jpg"])
+    threshold = perceptual_index.IMAGE_PHASH_MAX_DISTANCE
+    variants = {name: hamming_distance(original, dhash(data)) for name, data in images.items()
+                if name not in ("/other.jpg", "/tight-crop.jpg")}
+    unrelated = hamming_distance(original, dhash(images["/other.jpg"]))
+    if all(d <= threshold for d in variants.values()) and unrelated > threshold:
+        print(f"  ✓ PASS: Variants within {threshold} bits {variants}, unrelated image at {unrelated}")
+    else:
+        print(f"  ✗ FAIL: variants={variants} unrelated={unrelated}")
+
+    # Documented limit: dHash sees the whole frame, so a tight crop is a different picture
+    cropped = hamming_distance(original, dhash(images["/tight-crop.jpg"]))
+    if cropped > threshold:
+        print(f"  ✓ PASS: A 25% crop is not matched ({cropped} bits)")
+    else:
+        print(f"  ✗ FAIL: Tight crop within {cropped} bits")
+
+
+async def test_hash_from_file():
+    print("\n" + "=" * 80)
+    print("TEST: Spooled images are hashed from their file")
+    print("=" * 80)
+
+    with tempfile.NamedTemporaryFile(suffix=".jpg") as file:
+        file.write(images["/original.jpg"])
+        file.flush()
+        from_path = await perceptual_index.perceptual_hash(file.name)
+    if from_path == dhash(images["/original.jpg"]):
+        print("  ✓ PASS: Hash of the file path matches the hash of the bytes")
+    else:
+        print(f"  ✗ FAIL: {from_path}")
+
+
+def test_banded_lookup():
+    print("\n" + "=" * 80)
+    print("TEST: Banded index matches a brute-force scan")
+    print("=" * 80)
+
+    rng = random.Random(7)
+    index = PerceptualIndex(':memory:', max_distance=6)
+    stored = [rng.getrandbits(64) for _ in range(2000)]
+    for i, phash in enumerate(stored):
+        index.add(phash, "base", "bitable_image", f"tok{i}")
+
+    mismatches = 0
+    for _ in range(300):
+        query = rng.choice(stored)
+        for bit in rng.sample(range(64), rng.randint(0, 9)):
+            query ^= 1 << bit
+        best = min(range(len(stored)), key=lambda i: hamming_distance(query, stored[i]))
+        expected = f"tok{best}" if hamming_distance(query, stored[best]) <= 6 else None
+        if index.find(query, "base", "bitable_image") != expected:
+            mismatches += 1
+
+    if mismatches == 0:
+        print(f"  ✓ PASS: 300 lookups agree with brute force ({index.stats()['hits']} hits)")
+    else:
+        print(f"  ✗ FAIL: {mismatches} mismatches")
+
+
+async def test_batch_dedup():
+    print("\n" + "=" * 80)
+    print("TEST: Near-duplicates in a batch and against history")
+    print("=" * 80)
+
+    urls = [f"https://img.example.com{path}" for path in
+            ("/original.jpg", "/small.jpg", "/cropped.jpg", "/recompressed.webp", "/other.jpg")]
+    start = time.perf_counter()
+    tokens = await asyncio.gather(*(utils.download_and_upload_image(url, "base_dedup") for url in urls))
+    elapsed = time.perf_counter() - start
+
+    if len(set(tokens[:4])) == 1 and tokens[4] != tokens[0] and upload_calls == 2:
+        print(f"  ✓ PASS: 5 images, 4 of one photo -> {upload_calls} uploads ({elapsed:.2f}s)")
+    else:
+        print(f"  ✗ FAIL: tokens={tokens} uploads={upload_calls}")
+
+    # A later batch (after a restart) still finds the photo through the on-disk index
+    utils.perceptual_index.close()
+    utils.perceptual_index = PerceptualIndex(index_path)
+    thumb = await utils.download_and_upload_image("https://img.example.com/thumb.png", "base_dedup")
+    elsewhere = await utils.download_and_upload_image("https://img.example.com/thumb.png", "base_other")
+    if thumb == tokens[0] and elsewhere != thumb and upload_calls == 3:
+        print("  ✓ PASS: History match after reload, scoped to the Base")
+    else:
+        print(f"  ✗ FAIL: thumb={thumb} elsewhere={elsewhere} uploads={upload_calls}")
+
+
+def test_missing_pillow_warning():
+    print("\n" + "=" * 80)
+    print("TEST: Dedup enabled without Pillow")
+    print("=" * 80)
+
+    saved = image_transform.PIL_AVAILABLE, perceptual_index.IMAGE_PHASH_DEDUP
+    image_transform.PIL_AVAILABLE, perceptual_index.IMAGE_PHASH_DEDUP = False, True
+    output = io.StringIO()
+    try:
+        with contextlib.redirect_stdout(output):
+            enabled = [perceptual_index.dedup_enabled() for _ in range(3)]
+    finally:
+        image_transform.PIL_AVAILABLE, perceptual_index.IMAGE_PHASH_DEDUP = saved
+        image_transform._pillow_warnings.discard('IMAGE_PHASH_DEDUP')
+
+    warnings = output.getvalue().splitlines()
+    if enabled == [False] * 3 and len(warnings) == 1 and "IMAGE_PHASH_DEDUP" in warnings[0]:
+        print(f"  ✓ PASS: Disabled with one warning: {warnings[0]}")
+    else:
+        print(f"  ✗ FAIL: enabled={enabled} warnings={warnings}")
+
+
+async def main():
+    global index_path
+    test_missing_pillow_warning()
+    if not image_transform.PIL_AVAILABLE:
+        print("Pillow is not installed; perceptual dedup is disabled")
+        return
+    make_images()
+
+    async with mock_http(handler):
+        perceptual_index.IMAGE_PHASH_DEDUP = True
+
+        with tempfile.TemporaryDirectory() as tmp:
+            index_path = os.path.join(tmp, "upload_cache.db")
+            utils.perceptual_index = PerceptualIndex(index_path)
+
+            test_hash_distances()
+            test_banded_lookup()
+            await test_hash_from_file()
+            await test_batch_dedup()
+            utils.perceptual_index.close()
+
+        image_transform.shutdown_transform_pool()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
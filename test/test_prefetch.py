@@ -0,0 +1,93 @@
+"""
+Test the background feed prefetcher and the snapshot path of fetch_trends_from_rss.
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import topic
+from models import TrendItem
+from prefetch import FeedPrefetcher
+from seen_index import SeenIndex
+
+
+fetch_counts = {}
+
+
+async def fake_fetch(source: str, url: str) -> list[TrendItem]:
+    """Slow fake fetch so the snapshot path is clearly faster."""
+    fetch_counts[source] = fetch_counts.get(source, 0) + 1
+    await asyncio.sleep(0.3)
+    if source == "broken":
+        raise RuntimeError("HTTP 503")
+    return [TrendItem(title=f"{source} #{fetch_counts[source]}", url=url, published='', image_url='', source=source)]
+
+
+async def test_refresh_intervals():
+    """Each source refreshes on its own interval; failures keep running."""
+    print("=" * 80)
+    print("TEST: Per-source refresh intervals")
+    print("=" * 80)
+
+    fetch_counts.clear()
+    prefetcher = FeedPrefetcher(
+        {"fast": "https://example.com/fast", "slow": "https://example.com/slow", "broken": "https://example.com/x"},
+        fetch=fake_fetch,
+        intervals={"fast": 0.1, "slow": 10},
+    )
+    prefetcher.start()
+    await asyncio.sleep(1.5)
+    items, errors, age = prefetcher.snapshot()
+    await prefetcher.stop()
+
+    if fetch_counts["fast"] > fetch_counts["slow"] == 1:
+        print(f"  ✓ PASS: Refresh counts {fetch_counts}")
+    else:
+        print(f"  ✗ FAIL: Refresh counts {fetch_counts}")
+
+    if set(errors) == {"broken"} and age is not None:
+        print(f"  ✓ PASS: Failed source reported, snapshot age {age:.2f}s")
+    else:
+        print(f"  ✗ FAIL: errors={errors} age={age}")
+
+    if not prefetcher.running:
+        print("  ✓ PASS: Stopped cleanly")
+    else:
+        print("  ✗ FAIL: Tasks still running after stop()")
+
+
+async def test_tool_reads_snapshot():
+    """The tool answers from the snapshot without waiting on the network."""
+    print("\n" + "=" * 80)
+    print("TEST: Tool answers from snapshot")
+    print("=" * 80)
+
+    topic.seen_index = SeenIndex(':memory:')
+    topic.prefetcher = FeedPrefetcher({"nytimes": "https://example.com/nyt"}, fetch=fake_fetch)
+    topic.prefetcher.start()
+    await asyncio.sleep(0.5)
+
+    start = time.perf_counter()
+    result = await topic.fetch_trends_from_rss.handler({})
+    elapsed = time.perf_counter() - start
+    await topic.prefetcher.stop()
+
+    payload = json.loads(result['content'][0]['text'])
+    if payload['returned_count'] == 1 and elapsed < 0.05:
+        print(f"  ✓ PASS: Answered in {elapsed * 1000:.1f}ms, age {payload['snapshot_age_seconds']}s")
+    else:
+        print(f"  ✗ FAIL: {payload} in {elapsed:.2f}s")
+
+
+async def main():
+    await test_refresh_intervals()
+    await test_tool_reads_snapshot()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,162 @@
+"""
+Test incremental hotness ranking (recency decay, source count, appearances) in ranking.py.
+"""
+import sys
+import os
+import random
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from clustering import HeadlineClusterer
+from models import TrendItem
+from ranking import TrendRanker
+
+
+NOW = 1760961600.0  # 2025-10-20T12:00:00Z
+
+
+def make_item(title: str, source: str, url: str, age_hours: float) -> TrendItem:
+    return TrendItem(title=title, url=url, published='', image_url='', source=source,
+                     published_ts=NOW - age_hours * 3600)
+
+
+def ingest(clusterer: HeadlineClusterer, ranker: TrendRanker, items: list[TrendItem]):
+    for cluster, item in zip(clusterer.add_many(items), items):
+        ranker.update(cluster, item)
+
+
+def test_ranking_signals():
+    """Multi-source stories outrank single-source ones; old stories decay."""
+    print("=" * 80)
+    print("TEST: Ranking signals")
+    print("=" * 80)
+
+    clusterer = HeadlineClusterer()
+    ranker = TrendRanker(half_life_hours=6)
+    ingest(clusterer, ranker, [
+        make_item("Stock markets rally as Fed signals rate cut", "nytimes", "https://nyt.com/1", 1),
+        make_item("Israel and Hamas agree to ceasefire after weeks of talks", "nytimes", "https://nyt.com/2", 2),
+        make_item("Israel, Hamas agree to ceasefire after weeks of talks - Reuters", "google", "https://g.com/2", 2),
+        make_item("Israel and Hamas agree to ceasefire after weeks of talks, officials say", "reddit", "https://r.com/2", 2),
+        make_item("Volcano erupts in Iceland for the fifth time this year", "google", "https://g.com/3", 30),
+    ])
+
+    top = ranker.top(3, now=NOW)
+    titles = [cluster.representative.title for cluster, _ in top]
+    if titles[0].startswith("Israel and Hamas") and titles[-1].startswith("Volcano"):
+        print(f"  ✓ PASS: Order {[t[:20] for t in titles]}")
+    else:
+        print(f"  ✗ FAIL: Unexpected order {titles}")
+
+    # A story that keeps reappearing gets hotter, once per fetch
+    stocks = clusterer.cluster_of(make_item("", "nytimes", "https://nyt.com/1", 0))
+    stock_item = make_item("Stock markets rally as Fed signals rate cut", "nytimes", "https://nyt.com/1", 1)
+    before = ranker.hotness(stocks.cluster_id, now=NOW)
+    ingest(clusterer, ranker, [stock_item, stock_item, stock_item])
+    once = ranker.hotness(stocks.cluster_id, now=NOW)
+    ingest(clusterer, ranker, [stock_item])
+    after = ranker.hotness(stocks.cluster_id, now=NOW)
+    if before < once < after and stocks.appearances == 3 and stocks.size == 1:
+        print(f"  ✓ PASS: Reappearances raised hotness {before:.3f} -> {once:.3f} -> {after:.3f}")
+    else:
+        print(f"  ✗ FAIL: Hotness {before:.3f} -> {once:.3f} -> {after:.3f}, {stocks.appearances} appearances")
+
+    # Half-life: six hours later the score halves
+    later = ranker.hotness(stocks.cluster_id, now=NOW + 6 * 3600)
+    if abs(later - after / 2) < 1e-9:
+        print("  ✓ PASS: Hotness halves after one half-life")
+    else:
+        print(f"  ✗ FAIL: {after:.4f} -> {later:.4f}")
+
+    filtered = ranker.top(5, predicate=lambda cluster: "google" in cluster.sources, now=NOW)
+    if len(filtered) == 2 and all("google" in cluster.sources for cluster, _ in filtered):
+        print("  ✓ PASS: Predicate filters ranked clusters")
+    else:
+        print(f"  ✗ FAIL: {[(c.representative.title, c.sources) for c, _ in filtered]}")
+
+
+def test_undated_items():
+    """Undated items count as published when first seen, not on every fetch."""
+    print("\n" + "=" * 80)
+    print("TEST: Undated items")
+    print("=" * 80)
+
+    clusterer = HeadlineClusterer()
+    ranker = TrendRanker(half_life_hours=6)
+    undated = TrendItem(title="Volcano erupts in Iceland for the fifth time this year", url="https://g.com/3",
+                        published='', image_url='', source="google")
+    ingest(clusterer, ranker, [undated])
+    cluster = clusterer.cluster_of(undated)
+    first_seen = ranker.newest_ts[cluster.cluster_id]
+
+    # Fetched again later, alongside a story published after the first sighting
+    time.sleep(0.01)
+    newer = TrendItem(title="Stock markets rally as Fed signals rate cut", url="https://nyt.com/1",
+                      published='', image_url='', source="nytimes", published_ts=first_seen + 6 * 3600)
+    ingest(clusterer, ranker, [undated, newer])
+
+    top = [c.representative.title for c, _ in ranker.top(2, now=first_seen + 7 * 3600)]
+    if ranker.newest_ts[cluster.cluster_id] == first_seen and top[0].startswith("Stock"):
+        print("  ✓ PASS: Re-fetched undated item kept its first-seen time and ranks below newer news")
+    else:
+        print(f"  ✗ FAIL: newest_ts moved or order {top}")
+
+    # Link-less items of one source each get their own first-seen time
+    first = TrendItem(title="Earthquake hits the coast of Chile", url='', published='', image_url='', source="zhihu")
+    ingest(clusterer, ranker, [first])
+    time.sleep(0.01)
+    second = TrendItem(title="New museum opens in central Tokyo", url='', published='', image_url='', source="zhihu")
+    ingest(clusterer, ranker, [first, second])
+    first_ts = ranker.newest_ts[clusterer.cluster_of(first).cluster_id]
+    second_ts = ranker.newest_ts[clusterer.cluster_of(second).cluster_id]
+    if second_ts > first_ts:
+        print("  ✓ PASS: Link-less items are first seen separately")
+    else:
+        print(f"  ✗ FAIL: first={first_ts} second={second_ts}")
+
+
+def test_incremental_topk():
+    """Top-k stays cheap and correct as clusters keep updating."""
+    print("\n" + "=" * 80)
+    print("TEST: Incremental top-k")
+    print("=" * 80)
+
+    rng = random.Random(7)
+    clusterer = HeadlineClusterer()
+    ranker = TrendRanker()
+    items = [
+        make_item(f"story {i} " + " ".join(str(rng.random()) for _ in range(4)), "google",
+                  f"https://example.com/{i}", rng.uniform(0, 48))
+        for i in range(5000)
+    ]
+    ingest(clusterer, ranker, items)
+
+    # Re-ingest a random subset many times to create stale heap entries
+    for _ in range(20):
+        ingest(clusterer, ranker, rng.sample(items, 200))
+
+    start = time.perf_counter()
+    top = ranker.top(10, now=NOW)
+    elapsed = time.perf_counter() - start
+
+    expected = sorted(
+        (ranker.hotness(cid, now=NOW) for cid in ranker.clusters), reverse=True
+    )[:10]
+    if [round(score, 9) for _, score in top] == [round(score, 9) for score in expected]:
+        print(f"  ✓ PASS: Top-10 matches a full rescore ({elapsed * 1000:.2f}ms)")
+    else:
+        print("  ✗ FAIL: Top-10 differs from a full rescore")
+
+    # Asking again returns the same answer (entries are pushed back)
+    if [c.cluster_id for c, _ in ranker.top(10, now=NOW)] == [c.cluster_id for c, _ in top]:
+        print("  ✓ PASS: Repeated top-k is stable")
+    else:
+        print("  ✗ FAIL: Repeated top-k changed")
+
+
+if __name__ == "__main__":
+    test_ranking_signals()
+    test_undated_items()
+    test_incremental_topk()
@@ -0,0 +1,108 @@
+"""
+Test the persistent seen-item index used by fetch_trends_from_rss(only_new=True).
+"""
+import sys
+import os
+import tempfile
+import threading
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from models import TrendItem
+from seen_index import SeenIndex
+
+
+ITEMS = [
+    TrendItem(title='Storm hits coast', url='https://example.com/storm?utm_source=rss', published='', image_url='', source='nytimes'),
+    TrendItem(title='Markets rally', url='https://example.com/markets', published='', image_url='', source='nytimes'),
+]
+
+
+def test_filter_and_persist():
+    """Seen items are filtered out, also after reopening the index."""
+    print("=" * 80)
+    print("TEST: Seen index filtering and persistence")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "seen.db")
+
+        index = SeenIndex(path)
+        writer_threads = set()
+        index.conn.set_trace_callback(lambda sql: writer_threads.add(threading.current_thread()))
+        index.mark_seen(ITEMS[:1])
+        index.close()
+
+        reopened = SeenIndex(path)
+        new_items = reopened.filter_new(ITEMS)
+        reopened.close()
+
+    if [item.title for item in new_items] == ['Markets rally']:
+        print("  ✓ PASS: Previously seen item filtered after reopening")
+    else:
+        print(f"  ✗ FAIL: Got {new_items}")
+
+    if writer_threads and threading.current_thread() not in writer_threads:
+        print("  ✓ PASS: mark_seen committed off the calling thread")
+    else:
+        print(f"  ✗ FAIL: Written from {[t.name for t in writer_threads]}")
+
+
+def test_equivalent_keys():
+    """Canonical URL and title hash both identify an item."""
+    print("\n" + "=" * 80)
+    print("TEST: Equivalent URL / title matching")
+    print("=" * 80)
+
+    index = SeenIndex(':memory:')
+    index.mark_seen(ITEMS)
+
+    same_url = TrendItem(title='Totally different', url='https://EXAMPLE.com/storm/#top', published='', image_url='', source='google')
+    same_title = TrendItem(title='storm hits coast!', url='https://news.google.com/articles/xyz', published='', image_url='', source='google')
+    fresh = TrendItem(title='New story', url='https://example.com/new', published='', image_url='', source='google')
+
+    results = [index.is_seen(same_url), index.is_seen(same_title), index.is_seen(fresh)]
+    if results == [True, True, False]:
+        print("  ✓ PASS: URL and title variants recognised")
+    else:
+        print(f"  ✗ FAIL: Got {results}")
+
+
+def test_empty_keys():
+    """An empty link or title never matches another item."""
+    print("\n" + "=" * 80)
+    print("TEST: Empty link / title")
+    print("=" * 80)
+
+    no_link = TrendItem(title='Storm hits coast', url='', published='', image_url='', source='reddit')
+    no_title = TrendItem(title='', url='https://example.com/markets', published='', image_url='', source='reddit')
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "seen.db")
+        index = SeenIndex(path)
+        index.mark_seen([no_link, no_title])
+        index.close()
+        index = SeenIndex(path)
+
+        other_no_link = TrendItem(title='Markets rally', url='', published='', image_url='', source='reddit')
+        other_no_title = TrendItem(title='?!', url='https://example.com/new', published='', image_url='', source='reddit')
+        results = [index.is_seen(other_no_link), index.is_seen(other_no_title),
+                   index.is_seen(no_link), index.is_seen(no_title)]
+        batch = index.filter_new([
+            other_no_link,
+            TrendItem(title='Another story', url=' ', published='', image_url='', source='reddit'),
+            other_no_title,
+            TrendItem(title='', url='https://example.com/other', published='', image_url='', source='reddit'),
+        ])
+        index.close()
+
+    if results == [False, False, True, True] and len(batch) == 4:
+        print("  ✓ PASS: Items are only matched on the keys they actually have")
+    else:
+        print(f"  ✗ FAIL: seen={results} batch={[(item.title, item.url) for item in batch]}")
+
+
+if __name__ == "__main__":
+    test_filter_and_persist()
+    test_equivalent_keys()
+    test_empty_keys()
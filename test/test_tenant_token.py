@@ -0,0 +1,84 @@
+"""
+Test the cached, single-flight tenant_access_token manager in tenant_token.py.
+"""
+import asyncio
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from tenant_token import TenantTokenManager
+
+
+issued = []
+
+
+async def fake_fetch(app_id: str, app_secret: str) -> tuple[str, float]:
+    """Slow token endpoint issuing numbered tokens that expire after 1s."""
+    await asyncio.sleep(0.1)
+    issued.append(app_id)
+    return f"{app_id}-token-{len(issued)}", 1.0
+
+
+async def test_single_flight():
+    """Concurrent callers share one request; later callers hit the cache."""
+    print("=" * 80)
+    print("TEST: Single-flight and caching")
+    print("=" * 80)
+
+    manager = TenantTokenManager(fake_fetch, refresh_margin=0.5, min_ttl=0.1)
+    tokens = await asyncio.gather(*(manager.get("app_a", "secret") for _ in range(20)))
+
+    if len(set(tokens)) == 1 and manager.requests == 1:
+        print(f"  ✓ PASS: 20 concurrent callers, 1 request ({tokens[0]})")
+    else:
+        print(f"  ✗ FAIL: {manager.requests} requests, tokens {set(tokens)}")
+
+    cached = await manager.get("app_a", "secret")
+    other = await manager.get("app_b", "secret")
+    if cached == tokens[0] and other.startswith("app_b") and manager.requests == 2:
+        print("  ✓ PASS: Cache hit for app_a, separate token for app_b")
+    else:
+        print(f"  ✗ FAIL: cached={cached} other={other} requests={manager.requests}")
+
+    await manager.aclose()
+
+
+async def test_background_refresh():
+    """The token is replaced before it expires, without a caller waiting."""
+    print("\n" + "=" * 80)
+    print("TEST: Proactive refresh")
+    print("=" * 80)
+
+    manager = TenantTokenManager(fake_fetch, refresh_margin=0.5, min_ttl=0.1)
+    first = await manager.get("app_c", "secret")
+    await asyncio.sleep(0.75)  # refresh fires at 0.5s, before the 1s expiry
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    second = await manager.get("app_c", "secret")
+    waited = loop.time() - start
+
+    if second != first and waited < 0.01:
+        print(f"  ✓ PASS: Token refreshed in the background ({first} -> {second})")
+    else:
+        print(f"  ✗ FAIL: first={first} second={second} waited={waited:.3f}s")
+
+    manager.invalidate("app_c")
+    third = await manager.get("app_c", "secret")
+    if third != second:
+        print("  ✓ PASS: Invalidated token is requested again")
+    else:
+        print("  ✗ FAIL: Invalidated token still served")
+
+    await manager.aclose()
+
+
+async def main():
+    await test_single_flight()
+    await test_background_refresh()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""
+Test the query arguments (limit, offset, source, since, keyword) of fetch_trends_from_rss.
+"""
+import asyncio
+import json
+import random
+import sys
+import os
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import topic
+from models import TrendItem, parse_published
+from seen_index import SeenIndex
+from trends import TrendIndex, TrendTimeline
+
+
+FAKE_RSS_DICT = {
+    "nytimes": "https://example.com/nyt.xml",
+    "zhihu": "https://example.com/zhihu.xml",
+}
+
+
+async def fake_parse_feeds(url: str, source: str, **kwargs) -> list[TrendItem]:
+    if source == "zhihu":
+        return [
+            TrendItem(title='如何看待今年的双十一', url='https://zhihu.com/q/1', published='Mon, 20 Oct 2025 12:00:00 +0000', image_url='', source=source,
+                      published_ts=parse_published('Mon, 20 Oct 2025 12:00:00 +0000')),
+        ]
+    return [
+        TrendItem(title=f"World news {i}" + (" election" if i % 3 == 0 else ""),
+                  url=f"https://nytimes.com/{i}",
+                  published=f"Mon, 20 Oct 2025 {i:02d}:00:00 +0000",
+                  image_url='',
+                  source=source,
+                  published_ts=parse_published(f"Mon, 20 Oct 2025 {i:02d}:00:00 +0000"))
+        for i in range(12)
+    ]
+
+
+async def call_tool(args: dict) -> dict:
+    result = await topic.fetch_trends_from_rss.handler(args)
+    return json.loads(result['content'][0]['text'])
+
+
+async def test_paging():
+    """limit/offset walk through all matches without overlap."""
+    print("=" * 80)
+    print("TEST: limit / offset paging")
+    print("=" * 80)
+
+    titles = []
+    offset = 0
+    while offset is not None:
+        page = await call_tool({'limit': 5, 'offset': offset})
+        titles.extend(t['title'] for t in page['trends'])
+        offset = page['next_offset']
+
+    if len(titles) == 13 and len(set(titles)) == 13:
+        print(f"  ✓ PASS: Paged through all {len(titles)} trends")
+    else:
+        print(f"  ✗ FAIL: Got {len(titles)} titles")
+
+
+async def test_only_new_paging():
+    """Paging with only_new returns every unseen trend once, without skipping any."""
+    print("\n" + "=" * 80)
+    print("TEST: only_new paging")
+    print("=" * 80)
+
+    topic.seen_index = SeenIndex(':memory:')
+    titles = []
+    offset = 0
+    while offset is not None:
+        page = await call_tool({'limit': 5, 'offset': offset, 'only_new': True})
+        titles.extend(t['title'] for t in page['trends'])
+        offset = page['next_offset']
+
+    again = await call_tool({'limit': 5, 'only_new': True})
+    if len(titles) == 13 and len(set(titles)) == 13 and again['returned_count'] == 0:
+        print(f"  ✓ PASS: Paged through all {len(titles)} new trends, none left afterwards")
+    else:
+        print(f"  ✗ FAIL: Got {len(titles)} titles, {again['returned_count']} on the next call")
+
+
+async def test_filters():
+    """source, since and keyword filters combine."""
+    print("\n" + "=" * 80)
+    print("TEST: source / since / keyword filters")
+    print("=" * 80)
+
+    by_source = await call_tool({'source': 'zhihu'})
+    since = await call_tool({'source': 'nytimes', 'since': '2025-10-20T09:00:00Z', 'limit': 50})
+    keyword = await call_tool({'keyword': 'ELECTION', 'since': '2025-10-20T05:00:00Z'})
+    cjk = await call_tool({'keyword': '双十一'})
+
+    checks = [
+        ("source", by_source['matched_count'] == 1),
+        ("since", since['matched_count'] == 3),
+        ("keyword + since", [t['title'] for t in keyword['trends']] == ["World news 6 election", "World news 9 election"]),
+        ("CJK substring", cjk['matched_count'] == 1),
+    ]
+    for name, ok in checks:
+        print(f"  {'✓ PASS' if ok else '✗ FAIL'}: {name}")
+
+
+async def test_newest_across_sources():
+    """order=newest merges sources by publish time."""
+    print("\n" + "=" * 80)
+    print("TEST: order=newest")
+    print("=" * 80)
+
+    newest = await call_tool({'order': 'newest', 'limit': 3})
+    titles = [t['title'] for t in newest['trends']]
+    if titles == ['如何看待今年的双十一', 'World news 11', 'World news 10']:
+        print(f"  ✓ PASS: Newest first across sources: {titles}")
+    else:
+        print(f"  ✗ FAIL: Got {titles}")
+
+    recent = await call_tool({'order': 'newest', 'since_hours': 1})
+    if recent['matched_count'] == 0:
+        print("  ✓ PASS: since_hours excludes old trends")
+    else:
+        print(f"  ✗ FAIL: Got {recent['matched_count']} recent trends")
+
+
+async def test_rank():
+    """rank=true pages through the hottest clusters with a hotness score."""
+    print("\n" + "=" * 80)
+    print("TEST: rank")
+    print("=" * 80)
+
+    first = await call_tool({'rank': True, 'limit': 2})
+    second = await call_tool({'rank': True, 'limit': 2, 'offset': first['next_offset']})
+    ranked = first['trends'] + second['trends']
+    titles = [t['title'] for t in ranked]
+    if len(set(titles)) == len(titles) == 4 and all('hotness' in t and 'source_count' in t for t in ranked):
+        print(f"  ✓ PASS: One entry per cluster across pages: {titles}")
+    else:
+        print(f"  ✗ FAIL: Got {ranked}")
+
+    zhihu = await call_tool({'rank': True, 'source': 'zhihu'})
+    if [t['source'] for t in zhihu['trends']] == ['zhihu'] and zhihu['next_offset'] is None:
+        print("  ✓ PASS: Ranked results respect source filter")
+    else:
+        print(f"  ✗ FAIL: Got {zhihu['trends']}")
+
+
+def test_keyword_consistency():
+    """A keyword matches the same items in feed order, newest order and the timeline."""
+    print("\n" + "=" * 80)
+    print("TEST: Keyword matching across query paths")
+    print("=" * 80)
+
+    items = [
+        TrendItem(title=title, url=f"https://example.com/{i}", published='', image_url='', source='s', published_ts=float(i))
+        for i, title in enumerate(["New AI chip unveiled", "Spain wins the final", "聊聊人工智能的未来"])
+    ]
+    index = TrendIndex(items)
+    timeline = TrendTimeline()
+    timeline.insert_many(items)
+
+    for keyword, expected in (("ai", ["New AI chip unveiled"]), ("人工智能", ["聊聊人工智能的未来"])):
+        feed = [item.title for item in index.take(index.query(keyword=keyword))]
+        newest = [item.title for item in index.take(index.query(keyword=keyword, order='newest'))]
+        history = [item.title for item in timeline.query(keyword=keyword)]
+        if feed == newest == history == expected:
+            print(f"  ✓ PASS: {keyword!r} -> {expected} on every path")
+        else:
+            print(f"  ✗ FAIL: {keyword!r}: feed={feed} newest={newest} timeline={history}")
+
+
+def test_timeline_inserts():
+    """Single and bulk inserts keep the timeline sorted and deduplicated."""
+    print("\n" + "=" * 80)
+    print("TEST: TrendTimeline inserts")
+    print("=" * 80)
+
+    timeline = TrendTimeline(max_items=100)
+    items = [
+        TrendItem(title=f"t{i}", url=f"https://example.com/{i}", published='', image_url='', source='s', published_ts=float(ts))
+        for i, ts in enumerate(random.sample(range(1000), 150))
+    ]
+    timeline.insert_many(items[:10])      # bisect path
+    timeline.insert_many(items[5:150])    # merge path, with duplicates
+    timeline.insert_many(items[:10])      # all duplicates
+
+    expected = sorted(item.published_ts for item in items)[-100:]
+    if timeline.timestamps == expected and len(timeline) == 100:
+        print("  ✓ PASS: Sorted, deduplicated and capped")
+    else:
+        print(f"  ✗ FAIL: {len(timeline)} items")
+
+    window = timeline.query(since=expected[-5])
+    if [item.published_ts for item in window] == expected[-5:][::-1]:
+        print("  ✓ PASS: Time window query")
+    else:
+        print("  ✗ FAIL: Time window query")
+
+    # Hot lists without links: each headline is its own item, a refetch is still a duplicate
+    linkless = [
+        TrendItem(title=f"热榜 {i}", url='', published='', image_url='', source='zhihu', published_ts=2000.0 + i)
+        for i in range(3)
+    ]
+    inserted = timeline.insert_many(linkless) + timeline.insert_many(linkless)
+    if inserted == 3 and [item.title for item in timeline.newest(3)] == ["热榜 2", "热榜 1", "热榜 0"]:
+        print("  ✓ PASS: Link-less items kept apart by title")
+    else:
+        print(f"  ✗ FAIL: {inserted} link-less items inserted")
+
+
+async def main():
+    topic.RSS_DICT = FAKE_RSS_DICT
+    topic.parse_feeds = fake_parse_feeds
+    topic.seen_index = SeenIndex(':memory:')
+
+    await test_paging()
+    await test_only_new_paging()
+    await test_filters()
+    await test_newest_across_sources()
+    await test_rank()
+    test_keyword_consistency()
+    test_timeline_inserts()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,192 @@
+"""
+Test the upload caches (image bytes -> file_token, image URL -> file_token) in upload_cache.py and utils.py.
+"""
+import asyncio
+import json
+import sys
+import os
+import tempfile
+import threading
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import lark
+import utils
+from mock_http import mock_http
+from upload_cache import PartialUpload, PartialUploadStore, UploadCache, UrlTokenCache, content_hash
+
+
+upload_calls = 0
+requests_sent = 0
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global upload_calls, requests_sent
+    requests_sent += 1
+    if request.url.host == "www.thesun.co.uk":
+        return httpx.Response(200, content=b"\xff\xd8\xff" + request.url.path.encode(), headers={"content-type": "image/jpeg"})
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+    if request.url.path.endswith("/medias/upload_all"):
+        upload_calls += 1
+        await asyncio.sleep(0.05)
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok{upload_calls}"}})
+    return httpx.Response(404)
+
+
+def test_persistence():
+    """Entries survive a reopen and are scoped by app_token and parent_type."""
+    print("=" * 80)
+    print("TEST: Persistent cache")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload_cache.db")
+        digest = content_hash(b"hero image")
+
+        cache = UploadCache(path)
+        cache.put(digest, "base_a", "bitable_image", "tok_a", 10)
+        cache.close()
+
+        cache = UploadCache(path)
+        hit = cache.get(digest, "base_a", "bitable_image")
+        other_base = cache.get(digest, "base_b", "bitable_image")
+        other_type = cache.get(digest, "base_a", "bitable_file")
+        cache.close()
+
+    if hit == "tok_a" and other_base is None and other_type is None:
+        print("  ✓ PASS: Reloaded from disk, keyed by (sha256, app_token, parent_type)")
+    else:
+        print(f"  ✗ FAIL: hit={hit} other_base={other_base} other_type={other_type}")
+
+    if cache.stats() == {"hits": 1, "misses": 2, "entries": 1}:
+        print(f"  ✓ PASS: Counters {cache.stats()}")
+    else:
+        print(f"  ✗ FAIL: Counters {cache.stats()}")
+
+
+async def test_upload_dedup():
+    """Identical bytes are uploaded once, even when requested concurrently."""
+    print("\n" + "=" * 80)
+    print("TEST: Upload deduplication")
+    print("=" * 80)
+
+    image = b"\x89PNG same hero image"
+    tokens = await asyncio.gather(*(
+        utils.upload_image_to_lark(image, f"copy{i}.png", "base_a") for i in range(5)
+    ))
+    again = await utils.upload_image_to_lark(image, "later.png", "base_a")
+    other_base = await utils.upload_image_to_lark(image, "hero.png", "base_b")
+
+    if len(set(tokens)) == 1 and again == tokens[0] and other_base != tokens[0] and upload_calls == 2:
+        print(f"  ✓ PASS: 7 uploads of the same bytes -> {upload_calls} requests (one per Base)")
+    else:
+        print(f"  ✗ FAIL: tokens={tokens} again={again} other={other_base} calls={upload_calls}")
+
+    print(f"  Cache stats: {utils.upload_cache.stats()}")
+
+
+async def test_url_cache():
+    """A repeated batch, in another URL spelling, needs no network I/O."""
+    global requests_sent
+    print("\n" + "=" * 80)
+    print("TEST: URL -> file_token cache")
+    print("=" * 80)
+
+    encoded = [
+        "https://www.thesun.co.uk/wp-content%2Fuploads%2F2025%2F10%2FMM-OFF-PLATFORM-strand.jpg?quality%3D90%26",
+        "https://www.thesun.co.uk/wp-content%2Fuploads%2F2025%2F10%2Fcrop-37070567.jpg?quality%3D90%26",
+    ]
+    decoded = [
+        "https://www.thesun.co.uk/wp-content/uploads/2025/10/MM-OFF-PLATFORM-strand.jpg?quality=90&1760956390",
+        "https://www.thesun.co.uk/wp-content/uploads/2025/10/crop-37070567.jpg?quality=90&",
+    ]
+
+    first = await lark.upload_images_to_lark.handler({'urls': encoded, 'app_token': 'base_url'})
+    requests_sent = 0
+    second = await lark.upload_images_to_lark.handler({'urls': decoded, 'app_token': 'base_url'})
+
+    first_tokens = list(json.loads(first['content'][0]['text']).values())
+    second_tokens = list(json.loads(second['content'][0]['text']).values())
+    if first_tokens == second_tokens and all(first_tokens) and requests_sent == 0:
+        print(f"  ✓ PASS: Repeat batch served from cache with {requests_sent} requests")
+    else:
+        print(f"  ✗ FAIL: first={first_tokens} second={second_tokens} requests={requests_sent}")
+
+    # Encoded separators are data, not structure
+    distinct = [
+        ("https://img.example.com/a.jpg?id=1%262", "https://img.example.com/a.jpg?id=1"),
+        ("https://img.example.com/a.jpg?id=1%3D2", "https://img.example.com/a.jpg?id=1&2="),
+        ("https://img.example.com/a%3Fb.jpg?x=1", "https://img.example.com/a.jpg?b.jpg&x=1"),
+    ]
+    collisions = [pair for pair in distinct if utils.canonicalize_image_url(pair[0]) == utils.canonicalize_image_url(pair[1])]
+    kept = utils.canonicalize_image_url("https://img.example.com/a%3Fb.jpg?x=1")
+    if not collisions and kept == "https://img.example.com/a%3Fb.jpg?x=1":
+        print("  ✓ PASS: Encoded &, = and ? keep their meaning")
+    else:
+        print(f"  ✗ FAIL: collisions={collisions} path={kept}")
+
+    expired = UrlTokenCache(':memory:', ttl=0)
+    expired.put("https://example.com/a.jpg", "base", "bitable_image", "tok")
+    if expired.get("https://example.com/a.jpg", "base", "bitable_image") is None:
+        print("  ✓ PASS: Expired entries are ignored")
+    else:
+        print("  ✗ FAIL: Expired entry returned")
+
+
+def test_background_writes():
+    """Writes are committed off the calling thread and are on disk after close."""
+    print("\n" + "=" * 80)
+    print("TEST: Background writes")
+    print("=" * 80)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "upload_cache.db")
+        digest = content_hash(b"big video")
+        key = (digest, "base", "bitable_file")
+
+        store = PartialUploadStore(path)
+        writer_threads = set()
+        store.conn.set_trace_callback(lambda sql: writer_threads.add(threading.current_thread()))
+        upload = PartialUpload("up-1", 30, 10, 3)
+        store.start(*key, upload)
+        store.mark_part(*key, upload, 0)
+        store.mark_part(*key, upload, 2)
+        in_memory = store.get(*key)
+        store.close()
+
+        store = PartialUploadStore(path)
+        reloaded = store.get(*key)
+        store.discard(*key)
+        store.close()
+        store = PartialUploadStore(path)
+        discarded = store.get(*key)
+        store.close()
+
+    if writer_threads and threading.current_thread() not in writer_threads:
+        print(f"  ✓ PASS: Committed on {', '.join(t.name for t in writer_threads)}")
+    else:
+        print(f"  ✗ FAIL: Written from {[t.name for t in writer_threads]}")
+
+    if in_memory is upload and reloaded is not None and reloaded.parts == {0, 2} and discarded is None:
+        print("  ✓ PASS: Parts readable at once, reloaded after close, gone after discard")
+    else:
+        print(f"  ✗ FAIL: in_memory={in_memory} reloaded={reloaded} discarded={discarded}")
+
+
+async def main():
+    async with mock_http(handler):
+        test_persistence()
+        test_background_writes()
+        await test_upload_dedup()
+        await test_url_cache()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
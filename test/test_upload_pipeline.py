@@ -0,0 +1,103 @@
+"""
+Test the concurrent download/upload pipeline of upload_images_to_lark against a mock transport.
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import lark
+import utils
+from mock_http import mock_http
+from rate_limit import TokenBucket
+
+
+IMAGE_COUNT = 12
+DOWNLOAD_DELAY = 0.3
+UPLOAD_QPS = 10
+
+upload_times = []
+token_requests = 0
+active_downloads = 0
+max_active_downloads = 0
+
+
+async def handler(request: httpx.Request) -> httpx.Response:
+    global active_downloads, max_active_downloads, token_requests
+    if request.url.host == "img.example.com":
+        active_downloads += 1
+        max_active_downloads = max(max_active_downloads, active_downloads)
+        await asyncio.sleep(DOWNLOAD_DELAY)
+        active_downloads -= 1
+        # Distinct bytes per image, so the upload cache doesn't collapse them
+        return httpx.Response(200, content=b"\x89PNG\r\n\x1a\n" + request.url.path.encode(), headers={"content-type": "image/png"})
+
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        token_requests += 1
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": "t-123", "expire": 7200})
+
+    if request.url.path.endswith("/medias/upload_all"):
+        upload_times.append(time.monotonic())
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok{len(upload_times)}"}})
+
+    return httpx.Response(404)
+
+
+async def test_pipeline():
+    """Downloads overlap, uploads are paced, results keep input order."""
+    print("=" * 80)
+    print("TEST: Concurrent upload pipeline")
+    print("=" * 80)
+
+    urls = [f"https://img.example.com/{i}.png" for i in range(IMAGE_COUNT)]
+    start = time.perf_counter()
+    result = await lark.upload_images_to_lark.handler({'urls': urls, 'app_token': 'app'})
+    elapsed = time.perf_counter() - start
+    tokens = json.loads(result['content'][0]['text'])
+
+    if list(tokens) == urls and all(tokens.values()):
+        print(f"  ✓ PASS: {len(tokens)} tokens in input order")
+    else:
+        print(f"  ✗ FAIL: {tokens}")
+
+    sequential = IMAGE_COUNT * DOWNLOAD_DELAY
+    if elapsed < sequential / 2:
+        print(f"  ✓ PASS: Batch took {elapsed:.2f}s (sequential would be >{sequential:.1f}s)")
+    else:
+        print(f"  ✗ FAIL: Batch took {elapsed:.2f}s")
+
+    if max_active_downloads <= lark.IMAGE_DOWNLOAD_CONCURRENCY:
+        print(f"  ✓ PASS: At most {max_active_downloads} downloads at once")
+    else:
+        print(f"  ✗ FAIL: {max_active_downloads} concurrent downloads")
+
+    gaps = [b - a for a, b in zip(upload_times, upload_times[1:])]
+    if min(gaps) >= 1 / UPLOAD_QPS * 0.9:
+        print(f"  ✓ PASS: Uploads spaced at least {min(gaps) * 1000:.0f}ms apart")
+    else:
+        print(f"  ✗ FAIL: Minimum upload gap {min(gaps) * 1000:.0f}ms")
+
+    if token_requests == 1:
+        print("  ✓ PASS: One tenant_access_token request for the whole batch")
+    else:
+        print(f"  ✗ FAIL: {token_requests} token requests")
+
+
+async def main():
+    async with mock_http(handler):
+        utils._upload_limiters[os.environ["APP_ID"]] = TokenBucket(UPLOAD_QPS)
+
+        await test_pipeline()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,185 @@
+"""
+Test the stage-aware retry policy of download_and_upload_image in utils.py, against a mock transport.
+"""
+import asyncio
+import json
+import sys
+import os
+import time
+from collections import Counter
+
+import httpx
+
+# Add parent directory to path
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+os.environ.setdefault("APP_ID", "cli_test")
+os.environ.setdefault("APP_SECRET", "secret")
+
+import utils
+from mock_http import mock_http
+
+
+downloads = Counter()
+uploads = Counter()
+# Scripted upload_all answers per image, consumed in order; success once exhausted
+upload_script: dict[str, list[httpx.Response]] = {}
+# (app_id, app_secret) of every token request, and the token of every upload
+token_requests = []
+upload_tokens = []
+
+
+def handler(request: httpx.Request) -> httpx.Response:
+    if request.url.path.endswith("/tenant_access_token/internal"):
+        body = json.loads(request.content)
+        token_requests.append((body["app_id"], body["app_secret"]))
+        return httpx.Response(200, json={"code": 0, "tenant_access_token": f"t-{body['app_id']}", "expire": 7200})
+    if request.url.path.endswith("/medias/upload_all"):
+        token = request.headers["authorization"].removeprefix("Bearer ")
+        upload_tokens.append(token)
+        if token == "t-stale":
+            return feishu_error(99991663, "tenant access token invalid", status=400)
+        # The image name is the body of the file part
+        name = next(n for n in upload_script if f"/{n}.jpg".encode() in request.content)
+        uploads[name] += 1
+        script = upload_script[name]
+        if script:
+            return script.pop(0)
+        return httpx.Response(200, json={"code": 0, "data": {"file_token": f"tok-{name}"}})
+
+    path = request.url.path
+    downloads[path] += 1
+    if path == "/missing.jpg":
+        return httpx.Response(404)
+    if path == "/huge.jpg":
+        return httpx.Response(200, content=b"\xff\xd8\xff",
+                              headers={"content-type": "image/jpeg", "content-length": str(50 * 1024 * 1024)})
+    if path == "/flaky-origin.jpg" and downloads[path] == 1:
+        return httpx.Response(503)
+    return httpx.Response(200, content=b"\xff\xd8\xff" + path.encode(), headers={"content-type": "image/jpeg"})
+
+
+def feishu_error(code: int, msg: str, status: int = 200, headers: dict = None) -> httpx.Response:
+    return httpx.Response(status, json={"code": code, "msg": msg}, headers=headers)
+
+
+async def test_upload_retry_keeps_payload():
+    print("=" * 80)
+    print("TEST: Upload retries reuse the downloaded payload")
+    print("=" * 80)
+
+    upload_script["busy"] = [feishu_error(1061045, "can retry"), httpx.Response(502)]
+    token = await utils.download_and_upload_image("https://img.example.com/busy.jpg", "base_retry")
+    if token == "tok-busy" and uploads["busy"] == 3 and downloads["/busy.jpg"] == 1:
+        print("  ✓ PASS: 3 upload attempts, 1 download")
+    else:
+        print(f"  ✗ FAIL: token={token} uploads={uploads['busy']} downloads={downloads['/busy.jpg']}")
+
+    upload_script["flaky-origin"] = []
+    token = await utils.download_and_upload_image("https://img.example.com/flaky-origin.jpg", "base_retry")
+    if token and downloads["/flaky-origin.jpg"] == 2 and uploads["flaky-origin"] == 1:
+        print("  ✓ PASS: A 503 from the origin retries the download only")
+    else:
+        print(f"  ✗ FAIL: token={token} downloads={downloads['/flaky-origin.jpg']}")
+
+
+async def test_fatal_errors():
+    print("\n" + "=" * 80)
+    print("TEST: Fatal errors are not retried")
+    print("=" * 80)
+
+    for name in ("missing", "huge"):
+        token = await utils.download_and_upload_image(f"https://img.example.com/{name}.jpg", "base_retry")
+        if token is None and downloads[f"/{name}.jpg"] == 1:
+            print(f"  ✓ PASS: {name}.jpg given up after 1 download")
+        else:
+            print(f"  ✗ FAIL: {name}.jpg downloaded {downloads[f'/{name}.jpg']} times")
+
+    upload_script["invalid"] = [feishu_error(1061002, "params error", status=400)]
+    token = await utils.download_and_upload_image("https://img.example.com/invalid.jpg", "base_retry")
+    if token is None and uploads["invalid"] == 1:
+        print("  ✓ PASS: Feishu params error given up after 1 upload")
+    else:
+        print(f"  ✗ FAIL: params error uploaded {uploads['invalid']} times")
+
+
+async def test_rate_limit():
+    print("\n" + "=" * 80)
+    print("TEST: Rate-limit responses are honoured")
+    print("=" * 80)
+
+    upload_script["limited"] = [
+        feishu_error(99991400, "request trigger frequency limit", status=400, headers={"x-ogw-ratelimit-reset": "1"})
+    ]
+    start = time.perf_counter()
+    token = await utils.download_and_upload_image("https://img.example.com/limited.jpg", "base_retry")
+    elapsed = time.perf_counter() - start
+    if token == "tok-limited" and elapsed >= 1.0 and downloads["/limited.jpg"] == 1:
+        print(f"  ✓ PASS: Waited {elapsed:.2f}s for the rate-limit reset, then succeeded")
+    else:
+        print(f"  ✗ FAIL: token={token} elapsed={elapsed:.2f}s")
+
+
+async def test_tokens():
+    print("\n" + "=" * 80)
+    print("TEST: Stale and per-app tokens")
+    print("=" * 80)
+
+    upload_script["stale"] = []
+    upload_tokens.clear()
+    token = await utils.download_and_upload_image(
+        "https://img.example.com/stale.jpg", "base_retry", tenant_access_token="t-stale"
+    )
+    if token == "tok-stale" and upload_tokens == ["t-stale", "t-cli_test"]:
+        print("  ✓ PASS: A rejected caller token is replaced by a fresh one on retry")
+    else:
+        print(f"  ✗ FAIL: token={token} upload tokens={upload_tokens}")
+
+    upload_script["other-app"] = []
+    token_requests.clear()
+    await utils.upload_image_to_lark(
+        b"\xff\xd8\xff/other-app.jpg", "other-app.jpg", "base_retry", app_id="cli_other", app_secret="other-secret"
+    )
+    if token_requests == [("cli_other", "other-secret")] and upload_tokens[-1] == "t-cli_other":
+        print("  ✓ PASS: Another app's token is fetched with that app's secret")
+    else:
+        print(f"  ✗ FAIL: token requests {token_requests}")
+
+    try:
+        await utils.get_tenant_access_token("cli_unknown")
+        print("  ✗ FAIL: Unknown app got a token with APP_SECRET")
+    except ValueError:
+        print("  ✓ PASS: APP_SECRET is never sent for another app")
+
+
+def test_jitter():
+    print("\n" + "=" * 80)
+    print("TEST: Jittered backoff")
+    print("=" * 80)
+
+    delays = [utils._retry_delay(2) for _ in range(100)]
+    cap = utils.IMAGE_RETRY_BASE_DELAY * 4
+    if all(0 <= d <= cap for d in delays) and len(set(delays)) > 90:
+        print(f"  ✓ PASS: Attempt 2 delays spread over [0, {cap:.2f}]s")
+    else:
+        print(f"  ✗ FAIL: {min(delays)}..{max(delays)}")
+
+    if utils._retry_delay(0, retry_after=5.0) >= 5.0:
+        print("  ✓ PASS: Retry-After is a lower bound")
+    else:
+        print("  ✗ FAIL: Retry-After ignored")
+
+
+async def main():
+    async with mock_http(handler):
+        utils.IMAGE_RETRY_BASE_DELAY = 0.05
+
+        await test_upload_retry_keeps_payload()
+        await test_fatal_errors()
+        await test_rate_limit()
+        await test_tokens()
+        test_jitter()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())